@@ -1,8 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import CustomUser, CodeVerify
+from .models import CustomUser, CodeVerify, AdTokenLedger
 from .forms import CustomUserCreationAdminForm, CustomUserChangeForm
+from .revocation import revoke_user_tokens
 
 
 @admin.register(CustomUser)
@@ -45,6 +46,38 @@ class CustomUserAdmin(UserAdmin):
 
         return super().save_form(request, form, change)
 
+    def save_model(self, request, obj, form, change):
+        if not change:
+            super().save_model(request, obj, form, change)
+            return
+
+        # Only the edited columns are written. The balance is changed by the difference staff entered, with the
+        # ledger, so a purchase or use of a token while the form was open is not overwritten.
+        concrete_fields = {field.name for field in obj._meta.concrete_fields}
+        fields = [name for name in form.changed_data if name in concrete_fields and name != 'ad_token']
+        if fields:
+            obj.save(update_fields=fields)
+
+        if 'ad_token' in form.changed_data:
+            obj.add_ad_tokens(obj.ad_token - (form.initial.get('ad_token') or 0), 'admin')
+
+        # A blocked user can not use the tokens issued before.
+        if 'is_active' in form.changed_data and not obj.is_active:
+            revoke_user_tokens(obj)
+
+
+@admin.register(AdTokenLedger)
+class AdTokenLedgerAdmin(admin.ModelAdmin):
+    list_display = ('user', 'change', 'reason', 'order', 'datetime_created')
+    list_filter = ('reason', )
+    readonly_fields = ('user', 'change', 'reason', 'order', 'datetime_created')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
 
 @admin.register(CodeVerify)
 class CodeVerifyAdmin(admin.ModelAdmin):
@@ -0,0 +1,122 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.utils.functional import SimpleLazyObject
+from django.utils.translation import gettext_lazy as _
+
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .revocation import is_token_revoked
+
+
+class UserRefreshToken(RefreshToken):
+    """
+    A refresh token with the claims ClaimsUser reads without a query. Its access tokens copy them.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token['is_staff'] = user.is_staff
+        return token
+
+
+def load_user(user_id):
+    try:
+        user = get_user_model().objects.get(**{api_settings.USER_ID_FIELD: user_id})
+    except get_user_model().DoesNotExist:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+
+    return user
+
+
+class ClaimsUser(SimpleLazyObject):
+    """
+    The user of a verified access token. pk, id and is_authenticated come from the claims of the token; the first
+    access to another attribute loads the CustomUser, so a view that only needs the pk costs no query.
+
+    A staff claim is checked against the loaded user, a user who is not staff anymore does not keep the permissions
+    of staff until the token expires. Tokens without the claim, from before it was added, load the user too.
+    """
+
+    def __init__(self, validated_token):
+        self.__dict__['token'] = validated_token
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        super().__init__(lambda: load_user(user_id))
+
+    @property
+    def pk(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    id = pk
+
+    @property
+    def is_authenticated(self):
+        return True
+
+    @property
+    def is_anonymous(self):
+        return False
+
+    @property
+    def is_staff(self):
+        if not self.token.get('is_staff', True):
+            return False
+        return self.__getattr__('is_staff')
+
+    def __bool__(self):
+        # IsAuthenticated checks `request.user and ...`, it should not load the user.
+        return True
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication without the query of the user, see ClaimsUser.
+
+    Verified tokens are kept in a cache of the process for JWT_VERIFIED_TOKEN_CACHE_SECONDS, the next requests
+    with the same token skip the signature check. The cache keeps up to JWT_VERIFIED_TOKEN_CACHE_SIZE tokens,
+    the oldest are dropped first. Revoked tokens are refused, the cached ones too, see accounts.revocation.
+    """
+    verified_tokens = {}
+
+    def get_validated_token(self, raw_token):
+        validated_token = self.verify_token(raw_token)
+
+        if is_token_revoked(validated_token):
+            raise InvalidToken(_('Token is revoked'))
+
+        return validated_token
+
+    def verify_token(self, raw_token):
+        now = time.time()
+        cached = self.verified_tokens.get(raw_token)
+        if cached is not None and now < cached[1]:
+            return cached[0]
+
+        validated_token = super().get_validated_token(raw_token)
+
+        # A token is not kept after it expires.
+        expires = min(now + settings.JWT_VERIFIED_TOKEN_CACHE_SECONDS, validated_token['exp'])
+        self.verified_tokens.pop(raw_token, None)
+        while len(self.verified_tokens) >= settings.JWT_VERIFIED_TOKEN_CACHE_SIZE:
+            try:
+                del self.verified_tokens[next(iter(self.verified_tokens))]
+            except (KeyError, StopIteration, RuntimeError):
+                # Another thread changed the cache.
+                break
+        self.verified_tokens[raw_token] = (validated_token, expires)
+
+        return validated_token
+
+    def get_user(self, validated_token):
+        if api_settings.USER_ID_CLAIM not in validated_token:
+            return super().get_user(validated_token)
+
+        return ClaimsUser(validated_token)
@@ -2,20 +2,12 @@ from django.contrib.auth.backends import ModelBackend
 from django.contrib import messages
 
 from .models import CustomUser
-
-import phonenumbers
+from .phone import normalize_phone_number
 
 
 def validate_ir_phone_number(phone_number, request):
     if type(phone_number) is str:
-        try:
-            parsed_number = phonenumbers.parse(phone_number, "IR")
-            if phonenumbers.is_valid_number(parsed_number):
-                return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164), True
-            else:
-                return None, False
-        except phonenumbers.NumberParseException:
-            return None, False
+        return normalize_phone_number(phone_number, 'IR')
 
     if phone_number is not None:
         messages.error(request, 'Type Error')
@@ -28,12 +20,8 @@ class UsernameOrPhoneModelBackend(ModelBackend):
         phone_number = kwargs.get('phone_number')
         number, validate = validate_ir_phone_number(phone_number, request)
         if validate:
-            user_query_phone = {'phone_number': number}
-            try:
-                user = CustomUser.objects.get(**user_query_phone)
-                return user
-            except CustomUser.DoesNotExist:
-                return CustomUser.objects.create_user(phone=phone_number)
+            user, created = CustomUser.objects.provision_user(number)
+            return user
 
         password = kwargs.get('password')
         username = kwargs.get('username')
@@ -1,4 +1,5 @@
 from django.contrib.auth.models import BaseUserManager
+from django.db import IntegrityError, transaction
 
 
 class UserManager(BaseUserManager):
@@ -29,6 +30,27 @@ class UserManager(BaseUserManager):
         user.save()
         return user
 
+    def provision_user(self, phone):
+        """
+        Gets the user of a phone number, or creates it on its first login. The user and its CodeVerify, from the
+        post_save signal with DatabaseOTP, are inserted in one transaction. Two concurrent first logins of a phone
+        get one user.
+
+        :param phone: The phone number in E.164.
+        :return: A (user, created) tuple.
+        """
+        try:
+            return self.get(phone_number=phone), False
+        except self.model.DoesNotExist:
+            pass
+
+        try:
+            with transaction.atomic(using=self.db):
+                return self.create_user(phone=phone), True
+        except IntegrityError:
+            # Another request created the user after the get.
+            return self.get(phone_number=phone), False
+
     def create_superuser(self, username, password=None, **extra_fields):
         """
         Creates and saves a superuser with the given username and password.
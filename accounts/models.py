@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F
 from django.contrib import messages
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.conf import settings
@@ -10,6 +12,7 @@ from phonenumber_field.modelfields import PhoneNumberField
 import secrets
 
 from .managers import UserManager
+from .throttling import login_lockout
 import ads
 
 
@@ -20,9 +23,6 @@ class CustomUser(AbstractUser):
     ad_token = models.PositiveIntegerField(blank=True, default=0, verbose_name=_('ad token'))
     token_activated = models.BooleanField(blank=True, default=False, verbose_name=_('token used'))
 
-    count_login = models.PositiveIntegerField(blank=True, default=0, verbose_name=_('count login'))
-    block_time = models.DateTimeField(null=True, blank=True, verbose_name=_('block time'))
-
     objects = UserManager()
 
     def __str__(self):
@@ -47,110 +47,212 @@ class CustomUser(AbstractUser):
         """
         Determine user's action eligibility based on rate limiting.
 
+        The successful logins are counted in the cache, see accounts.throttling.login_lockout. MAX_LOGIN logins
+        in LOGIN_SUCCESS_CHECK_PERIOD_MINUTE block the user for BLOCK_TIME_MAX_LOGIN_MINUTE.
+
         :param: login_success: Whether a successful login has occurred. Default is False.
         :return: True if action is allowed; False if blocked due to rate limiting.
         """
-        # Check if there is a recorded last login time for the user
-        if self.last_login:
-            setting_period_check_login = settings.LOGIN_SUCCESS_CHECK_PERIOD_MINUTE
-            reset_time_login = timezone.timedelta(minutes=setting_period_check_login)
-            time_since_last_login = timezone.now() - self.last_login
+        lockout = login_lockout(self.phone_number)
 
-            if login_success:
-                # Increment the login attempt counter if a successful login
-                self.count_login += 1
+        if login_success:
+            return not lockout.hit()
 
-            elif reset_time_login < time_since_last_login:
-                # Reset counters if enough time has passed since the last login
-                self.count_login = 0
-                self.block_time = None
+        return not lockout.is_blocked()
 
-            if settings.MAX_LOGIN <= self.count_login:
-                setting_block_time = settings.BLOCK_TIME_MAX_LOGIN_MINUTE
-                # Apply rate limiting if the maximum allowed login attempts is reached
-                self.block_time = timezone.now() + timezone.timedelta(minutes=setting_block_time)
+    @property
+    def block_time(self):
+        """
+        The time the login block of the user ends, or None.
+        """
+        return login_lockout(self.phone_number).blocked_until()
 
-            self.save()
+    def last_login_for_month(self):
+        result = timezone.timedelta(days=30) <= timezone.now() - self.last_login
+        return result
 
-            # Check if the user is currently blocked due to rate limiting
-            if self.block_time is None:
-                return True
+    def free_ad_quota(self, refresh=False):
+        """
+        Count the free ads the user created within the last 30 days.
 
-            return False
+        The result is cached until the oldest of these ads leaves the window, or for FREE_AD_QUOTA_CACHE_SECONDS.
+        Creating a free ad updates the cached count, see record_free_ad.
 
-        # If there is no recorded last login time, allow the login action
-        return True
+        :param refresh: Count the ads in the database even if the count is cached, like after lock_ad_quota.
 
-    def last_login_for_month(self):
-        result = timezone.timedelta(days=30) <= timezone.now() - self.last_login
-        return result
+        :return: A (count, reset_time) tuple. reset_time is when the oldest counted ad leaves the window,
+            or None if there is no free ad in the window. The count is not more than FREE_ADS_MONTHLY_QUOTA.
+        """
+        count_key, reset_key = free_ad_quota_keys(self.pk)
+        if not refresh:
+            cached = cache.get_many([count_key, reset_key])
+            if count_key in cached:
+                return cached[count_key], cached.get(reset_key)
 
-    def has_free_ad_quota(self):
-        # Get the current date
-        current_date = timezone.now()
-        # Calculate the date 30 days ago
-        thirty_days_ago = current_date - timezone.timedelta(days=30)
+        window = timezone.timedelta(days=30)
+        now = timezone.now()
 
-        # Count the user's ads created within the last 30 days
-        ads_within_last_30_days = ads.models.Ad.objects.filter(author=self, datetime_created__gte=thirty_days_ago,
-                                                               is_use_ad_token=False).count()
+        # Only the oldest ads up to the quota matter, the composite index on the Ad table serves this query.
+        datetimes_created = list(ads.models.Ad.objects.filter(
+            author=self, is_use_ad_token=False, datetime_created__gte=now - window,
+        ).order_by('datetime_created').values_list('datetime_created', flat=True)[:settings.FREE_ADS_MONTHLY_QUOTA])
 
-        return ads_within_last_30_days < settings.FREE_ADS_MONTHLY_QUOTA
+        count = len(datetimes_created)
+        reset_time = datetimes_created[0] + window if datetimes_created else None
+
+        timeout = settings.FREE_AD_QUOTA_CACHE_SECONDS
+        if reset_time is not None:
+            timeout = max(1, min(timeout, int((reset_time - now).total_seconds())))
+
+        cache.set_many({count_key: count, reset_key: reset_time}, timeout=timeout)
+        return count, reset_time
+
+    def has_free_ad_quota(self, refresh=False):
+        count, reset_time = self.free_ad_quota(refresh)
+        return count < settings.FREE_ADS_MONTHLY_QUOTA
+
+    def lock_ad_quota(self):
+        """
+        Lock the row of the user until the end of the transaction, before its free ads are counted and created.
+        Concurrent ad creations of the user wait for the lock, and then count the ads created before them
+        with free_ad_quota(refresh=True), so they can not all take the last free ad.
+        """
+        list(CustomUser.objects.select_for_update().filter(pk=self.pk).values_list('pk', flat=True))
 
     def try_using_ad_token(self, can_use):
         """
         Use an ad token if 'can_use' is 'True' and tokens are available.
 
+        The balance is decreased with a conditional UPDATE of the token columns only, so concurrent
+        requests can not spend the same token twice.
+
         :param can_use: 'True' if the user intends to use the ad token, 'False' otherwise.
         :return: True if a token was used, False otherwise.
         """
         if self.token_activated:
             return True
 
-        if can_use == 'True' and self.ad_token:
-            self.ad_token -= 1
-            self.token_activated = True
-            self.save()
+        if can_use != 'True':
+            return False
+
+        with transaction.atomic():
+            used = CustomUser.objects.filter(pk=self.pk, ad_token__gt=0).update(
+                ad_token=F('ad_token') - 1, token_activated=True)
+            if used:
+                AdTokenLedger.objects.create(user=self, change=-1, reason='use')
+
+        if used:
+            self.refresh_from_db(fields=('ad_token', 'token_activated'))
             return True
 
         return False
 
+    def consume_activated_token(self):
+        """
+        Spend the activated ad token on the ad being created.
 
-class CodeVerify(models.Model):
-    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, verbose_name=_('user'))
-    code = models.PositiveIntegerField(default=0, verbose_name=_('code'))
-    expiration_timestamp = models.DateTimeField(null=True, blank=True, verbose_name=_('expiration timestamp'))
+        :return: False if the token was already spent by a concurrent request.
+        """
+        consumed = CustomUser.objects.filter(pk=self.pk, token_activated=True).update(token_activated=False)
+        if consumed:
+            self.token_activated = False
 
-    count_otp = models.PositiveIntegerField(blank=True, default=1, verbose_name=_('count otp'))
-    limit_time = models.DateTimeField(null=True, blank=True, verbose_name=_('limit time'))
-    # is_limit = models.BooleanField(blank=True, default=False, verbose_name=_('is limit'))
+        return bool(consumed)
 
-    def __str__(self):
-        return self.user.username
+    def use_ad_tokens(self, quantity):
+        """
+        Spend 'quantity' ad tokens at once, for ads created in bulk.
 
-    def create_code(self):
+        :return: False if the user does not have enough tokens, nothing is spent then.
         """
-        Generates a new verification code and sets the expiration timestamp.
+        with transaction.atomic():
+            used = CustomUser.objects.filter(pk=self.pk, ad_token__gte=quantity).update(
+                ad_token=F('ad_token') - quantity)
+            if used:
+                AdTokenLedger.objects.create(user=self, change=-quantity, reason='use')
 
-        This method generates a new random verification code using the TOTP algorithm.
-        The code is stored in the 'code' attribute of the CodeVerify instance.
-        The expiration timestamp is set to the current time plus a duration of 2 minutes.
-        The updated CodeVerify instance is saved to the database.
+        if used:
+            self.refresh_from_db(fields=('ad_token', ))
+
+        return bool(used)
+
+    def add_ad_tokens(self, quantity, reason, order=None):
         """
-        secret_key = secrets.token_hex(16)
-        secret_key_byte = secret_key.encode('utf-8')
-        totp_obj = TOTP(key=secret_key_byte, digits=7)
-        self.code = totp_obj.token()
+        Increase the balance of ad tokens and record it in the ledger.
+        """
+        with transaction.atomic():
+            CustomUser.objects.filter(pk=self.pk).update(ad_token=F('ad_token') + quantity)
+            AdTokenLedger.objects.create(user=self, change=quantity, reason=reason, order=order)
+
+        self.refresh_from_db(fields=('ad_token', ))
+
+
+class AdTokenLedger(models.Model):
+    """
+    Append-only record of every change to the ad token balance of a user.
+    The balance in CustomUser.ad_token is the sum of the changes of the user.
+    """
+    REASON_CHOICES = (
+        ('purchase', 'Purchase'),
+        ('use', 'Use'),
+        ('admin', 'Admin'),
+    )
+
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='ad_token_ledger',
+                             verbose_name=_('user'))
+    change = models.IntegerField(verbose_name=_('change'))
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES, verbose_name=_('reason'))
+    order = models.ForeignKey('payment.Order', on_delete=models.SET_NULL, null=True, blank=True,
+                              related_name='ad_token_ledger', verbose_name=_('order'))
+    datetime_created = models.DateTimeField(auto_now_add=True, verbose_name=_('datetime created'))
+
+    def __str__(self):
+        return f'{self.user}: {self.change:+}'
+
+
+def free_ad_quota_keys(user_pk):
+    return f'free_ads:{user_pk}:count', f'free_ads:{user_pk}:reset'
+
+
+def record_free_ad(user_pk):
+    """
+    Counts a new free ad in the cached quota of a user, if it is cached.
+    """
+    count_key, reset_key = free_ad_quota_keys(user_pk)
+    try:
+        if cache.incr(count_key) == 1:
+            # The first ad in the window also sets the reset time, let the next read compute it.
+            cache.delete_many([count_key, reset_key])
+    except ValueError:
+        pass
+
+
+# A code can be used for this long after it is sent.
+OTP_CODE_LIFETIME = timezone.timedelta(minutes=2)
+
+
+def generate_otp_code():
+    """
+    Generates a random 7 digit code with the TOTP algorithm.
+    """
+    secret_key = secrets.token_hex(16)
+    secret_key_byte = secret_key.encode('utf-8')
+    totp_obj = TOTP(key=secret_key_byte, digits=7)
+    return totp_obj.token()
 
-        self.expiration_timestamp = timezone.now() + timezone.timedelta(minutes=2)
-        self.save()
+
+class OTPState:
+    """
+    Checks of the OTP state of a user, shared by CodeVerify and accounts.otp.CacheOTP.
+    They have the code, expiration_timestamp, count_otp and limit_time attributes.
+    """
 
     def get_remaining_time_pass(self):
         """
         Calculates and returns the remaining time in minutes and seconds until the expiration of the verification code.
         """
         time_pass = self.expiration_timestamp - timezone.now()
-        if time_pass.seconds < timezone.timedelta(minutes=2).seconds:
+        if time_pass.seconds < OTP_CODE_LIFETIME.seconds:
             minutes, seconds = divmod(time_pass.seconds, 60)
         else:
             minutes = seconds = 0
@@ -162,6 +264,52 @@ class CodeVerify(models.Model):
         """
         return self.expiration_timestamp < timezone.now()
 
+    def code_time_validity(self):
+        """
+        Checks the validity of the verification code's expiration timestamp.
+        """
+        return (self.expiration_timestamp is None) or (self.is_expired())
+
+    def can_start_again(self):
+        if self.expiration_timestamp is not None:
+            setting_reset_time_otp = settings.RESET_TIME_OTP_MINUTE
+            time_reset = self.expiration_timestamp + timezone.timedelta(minutes=setting_reset_time_otp)
+
+            result = time_reset < timezone.now()
+            return result
+
+        return False
+
+
+class CodeVerify(OTPState, models.Model):
+    """
+    The OTP state of a user in the database, used with OTP_BACKEND = 'accounts.otp.DatabaseOTP'.
+    """
+    user = models.OneToOneField(CustomUser, on_delete=models.CASCADE, verbose_name=_('user'))
+    code = models.PositiveIntegerField(default=0, verbose_name=_('code'))
+    expiration_timestamp = models.DateTimeField(null=True, blank=True, verbose_name=_('expiration timestamp'))
+
+    count_otp = models.PositiveIntegerField(blank=True, default=1, verbose_name=_('count otp'))
+    limit_time = models.DateTimeField(null=True, blank=True, verbose_name=_('limit time'))
+    # is_limit = models.BooleanField(blank=True, default=False, verbose_name=_('is limit'))
+
+    def __str__(self):
+        return self.user.username
+
+    def create_code(self):
+        """
+        Generates a new verification code and sets the expiration timestamp.
+
+        This method generates a new random verification code using the TOTP algorithm.
+        The code is stored in the 'code' attribute of the CodeVerify instance.
+        The expiration timestamp is set to the current time plus a duration of 2 minutes.
+        The updated CodeVerify instance is saved to the database.
+        """
+        self.code = generate_otp_code()
+
+        self.expiration_timestamp = timezone.now() + OTP_CODE_LIFETIME
+        self.save()
+
     def send_code(self, request=None):
         """
         Sends the verification code if needed. Generates a new code if the current code has expired.
@@ -194,11 +342,12 @@ class CodeVerify(models.Model):
         self.save()
         return True
 
-    def code_time_validity(self):
+    def cancel_code(self):
         """
-        Checks the validity of the verification code's expiration timestamp.
+        Makes the current code unusable, a new one is sent at the next verification.
         """
-        return (self.expiration_timestamp is None) or (self.is_expired())
+        self.code = 0
+        self.save()
 
     def reset(self):
         """
@@ -209,13 +358,3 @@ class CodeVerify(models.Model):
         self.count_otp = 1
         self.limit_time = None
         self.save()
-
-    def can_start_again(self):
-        if self.expiration_timestamp is not None:
-            setting_reset_time_otp = settings.RESET_TIME_OTP_MINUTE
-            time_reset = self.expiration_timestamp + timezone.timedelta(minutes=setting_reset_time_otp)
-
-            result = time_reset < timezone.now()
-            return result
-
-        return False
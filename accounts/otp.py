@@ -0,0 +1,120 @@
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import CodeVerify, OTPState, OTP_CODE_LIFETIME, generate_otp_code
+
+
+def get_otp(user):
+    """
+    :return: The OTP state of the user, from the backend of OTP_BACKEND.
+    """
+    return import_string(settings.OTP_BACKEND).load(user)
+
+
+class DatabaseOTP:
+    """
+    Keeps the OTP state in the CodeVerify row of the user. Each step of a login saves the row.
+    """
+
+    @staticmethod
+    def load(user):
+        try:
+            return user.codeverify
+        except CodeVerify.DoesNotExist:
+            return CodeVerify.objects.create(user=user)
+
+
+def uses_code_verify():
+    """
+    :return: True if OTP_BACKEND keeps the OTP states in the CodeVerify rows, the users need one.
+    """
+    backend = import_string(settings.OTP_BACKEND)
+    return isinstance(backend, type) and issubclass(backend, DatabaseOTP)
+
+
+def otp_keys(user_pk):
+    return f'otp:{user_pk}:code', f'otp:{user_pk}:count', f'otp:{user_pk}:limit'
+
+
+class CacheOTP(OTPState):
+    """
+    Keeps the OTP state in the cache, with the same behaviour as CodeVerify and no database writes.
+
+    The code and its expiration, the count of sent codes and the limit time are separate keys. They expire
+    RESET_TIME_OTP_MINUTE after the code, when CodeVerify would be reset by can_start_again. The count is
+    increased with an atomic INCR, so concurrent requests can not send more codes than MAX_OTP_TRY.
+    """
+
+    @classmethod
+    def load(cls, user):
+        return cls(user)
+
+    def __init__(self, user):
+        self.user = user
+        self.code_key, self.count_key, self.limit_key = otp_keys(user.pk)
+
+        state = cache.get_many([self.code_key, self.count_key, self.limit_key])
+        self.code, self.expiration_timestamp = state.get(self.code_key, (0, None))
+        self.count_otp = state.get(self.count_key, 1)
+        self.limit_time = state.get(self.limit_key)
+
+    def state_timeout(self):
+        return int((OTP_CODE_LIFETIME + timezone.timedelta(minutes=settings.RESET_TIME_OTP_MINUTE)).total_seconds())
+
+    def create_code(self):
+        """
+        Generates a new verification code, valid for OTP_CODE_LIFETIME.
+        """
+        self.code = generate_otp_code()
+        self.expiration_timestamp = timezone.now() + OTP_CODE_LIFETIME
+
+        timeout = self.state_timeout()
+        cache.set(self.code_key, (self.code, self.expiration_timestamp), timeout=timeout)
+        cache.touch(self.count_key, timeout=timeout)
+
+    def send_code(self, request=None):
+        """
+        Counts a sent code, like CodeVerify.send_code.
+
+        :return: False if MAX_OTP_TRY codes were sent and the LIMIT_TIME_MAX_OTP minutes did not pass yet.
+        """
+        if (self.expiration_timestamp is not None) and (self.is_expired()):
+            self.create_code()
+
+        cache.add(self.count_key, 1, timeout=self.state_timeout())
+        try:
+            self.count_otp = cache.incr(self.count_key)
+        except ValueError:
+            # The key expired between add and incr.
+            cache.set(self.count_key, 2, timeout=self.state_timeout())
+            self.count_otp = 2
+
+        if self.count_otp <= settings.MAX_OTP_TRY + 1:
+            if self.count_otp == settings.MAX_OTP_TRY + 1:
+                limit = timezone.timedelta(minutes=settings.LIMIT_TIME_MAX_OTP)
+                self.limit_time = timezone.now() + limit
+                cache.set(self.limit_key, self.limit_time, timeout=int(limit.total_seconds()))
+            return True
+
+        if cache.get(self.limit_key) is not None:
+            if request:
+                messages.info(request, 'Please after 10 minutes try Again')
+            return False
+
+        self.count_otp = 1
+        cache.set(self.count_key, 1, timeout=self.state_timeout())
+        return True
+
+    def cancel_code(self):
+        """
+        Makes the current code unusable, a new one is sent at the next verification.
+        """
+        self.code, self.expiration_timestamp = 0, None
+        cache.delete(self.code_key)
+
+    def reset(self):
+        self.code, self.expiration_timestamp, self.count_otp, self.limit_time = 0, None, 1, None
+        cache.delete_many([self.code_key, self.count_key, self.limit_key])
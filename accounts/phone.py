@@ -0,0 +1,47 @@
+from functools import lru_cache
+
+from django.conf import settings
+
+from phonenumber_field import serializerfields
+from phonenumber_field.phonenumber import PhoneNumber
+from rest_framework import serializers
+from rest_framework.exceptions import ValidationError
+import phonenumbers
+
+
+@lru_cache(maxsize=settings.PHONE_NUMBER_CACHE_SIZE)
+def normalize_phone_number(phone_number, region='IR'):
+    """
+    Parses and validates a phone number. phonenumbers.parse and is_valid_number are slow and the same numbers
+    are sent again and again, so the results of the last PHONE_NUMBER_CACHE_SIZE numbers are kept.
+
+    :param phone_number: A str, like '09121234567' or '+989121234567'.
+    :return: A (E.164 str, True) tuple, or (None, False) if the phone number is not valid.
+    """
+    try:
+        parsed_number = phonenumbers.parse(phone_number, region)
+    except phonenumbers.NumberParseException:
+        return None, False
+
+    if phonenumbers.is_valid_number(parsed_number):
+        return phonenumbers.format_number(parsed_number, phonenumbers.PhoneNumberFormat.E164), True
+
+    return None, False
+
+
+class PhoneNumberField(serializerfields.PhoneNumberField):
+    """
+    A PhoneNumberField validated by normalize_phone_number. The validated value is the E.164 str of the number,
+    it is compared with user.phone_number.as_e164 without parsing again.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, PhoneNumber):
+            data = data.as_e164
+        # The parsing of the parent class is skipped, only the checks of CharField run.
+        str_value = serializers.CharField.to_internal_value(self, data)
+
+        phone_number, valid = normalize_phone_number(str_value, self.region)
+        if not valid:
+            raise ValidationError(self.error_messages['invalid'])
+        return phone_number
@@ -0,0 +1,247 @@
+import hashlib
+import math
+import threading
+import time
+from logging import getLogger
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from rest_framework_simplejwt.settings import api_settings
+import redis
+
+log = getLogger(__name__)
+
+
+class BloomFilter:
+    """
+    A set of strings that may answer True for a string that was not added, with the probability error_rate
+    while it has less than capacity strings, and never answers False for a string that was added.
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def positions(self, item):
+        # Double hashing, the positions of the k hashes come from the two halves of one digest.
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class RedisRevocationList:
+    """
+    Keeps the revoked entries in Redis. Each entry is a key with the time it was revoked, its TTL is the remaining
+    lifetime of the tokens it revokes. A sorted set by expiration time lists the entries for the processes that
+    build their filter, and every revocation is published on TOKEN_REVOCATION_CHANNEL.
+    """
+    index_key = 'revoked'
+
+    def __init__(self):
+        # Short timeouts, the checks of the tokens fail open instead of waiting for an unreachable Redis.
+        self.redis = redis.Redis.from_url(settings.TOKEN_REVOCATION_REDIS_URL,
+                                          socket_connect_timeout=settings.TOKEN_REVOCATION_REDIS_TIMEOUT,
+                                          socket_timeout=settings.TOKEN_REVOCATION_REDIS_TIMEOUT)
+
+    @staticmethod
+    def entry_key(entry):
+        return f'revoked:{entry}'
+
+    def add(self, entry, revoked_at, expires):
+        now = time.time()
+        with self.redis.pipeline() as pipe:
+            pipe.set(self.entry_key(entry), revoked_at, ex=max(1, int(expires - now)))
+            pipe.zadd(self.index_key, {entry: expires})
+            pipe.zremrangebyscore(self.index_key, '-inf', now)
+            pipe.publish(settings.TOKEN_REVOCATION_CHANNEL, entry)
+            pipe.execute()
+
+    def get(self, entry):
+        """
+        :return: The time the entry was revoked, or None if it is not revoked or the revocation expired.
+        """
+        revoked_at = self.redis.get(self.entry_key(entry))
+        return float(revoked_at) if revoked_at is not None else None
+
+    def entries(self):
+        return [entry.decode() for entry in self.redis.zrangebyscore(self.index_key, time.time(), '+inf')]
+
+    def subscribe(self, callback, on_error):
+        """
+        Calls callback with each entry revoked by other processes, in a thread, until the connection is lost.
+        """
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(**{settings.TOKEN_REVOCATION_CHANNEL: lambda message: callback(message['data'].decode())})
+
+        def exception_handler(exception, pubsub, thread):
+            thread.stop()
+            pubsub.close()
+            on_error()
+
+        return pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=exception_handler)
+
+
+class LocmemRevocationList:
+    """
+    Keeps the revoked entries in the memory of the process. For tests.
+    """
+
+    def __init__(self):
+        self.revoked = {}
+        self.callbacks = []
+
+    def add(self, entry, revoked_at, expires):
+        self.revoked[entry] = (revoked_at, expires)
+        for callback in self.callbacks:
+            callback(entry)
+
+    def get(self, entry):
+        revoked_at, expires = self.revoked.get(entry, (None, 0))
+        return revoked_at if time.time() < expires else None
+
+    def entries(self):
+        now = time.time()
+        return [entry for entry, (revoked_at, expires) in self.revoked.items() if now < expires]
+
+    def subscribe(self, callback, on_error):
+        self.callbacks.append(callback)
+
+
+revocation_lists = {}
+
+
+def get_revocation_list():
+    """
+    :return: The revocation list of TOKEN_REVOCATION_BACKEND, one for each process.
+    """
+    path = settings.TOKEN_REVOCATION_BACKEND
+    if path not in revocation_lists:
+        revocation_lists[path] = import_string(path)()
+    return revocation_lists[path]
+
+
+class RevocationFilter:
+    """
+    The Bloom filter of the revoked entries in this process. An entry that is not in the filter is not revoked,
+    nearly all tokens are checked without a request to Redis. An entry in the filter is checked in the revocation
+    list, it may be a false positive or a revocation that expired.
+
+    The filter is built from the revocation list at the first check and every TOKEN_REVOCATION_REBUILD_SECONDS,
+    which drops the expired entries, and gets the new revocations of other processes from the channel meanwhile.
+    The filter is reset by the thread of the channel when its connection is lost, a check reads self.bloom once
+    so a reset in between does not leave it without a filter.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            self.bloom = None
+            self.built = 0
+            self.subscribed_to = None
+
+    def build(self):
+        """
+        :return: The new BloomFilter.
+        """
+        with self.lock:
+            revocation_list = get_revocation_list()
+
+            # Subscribed before the entries are read, a revocation in between is not missed.
+            if self.subscribed_to is not revocation_list:
+                revocation_list.subscribe(self.add, self.reset)
+                self.subscribed_to = revocation_list
+
+            entries = revocation_list.entries()
+            bloom = BloomFilter(max(settings.TOKEN_REVOCATION_BLOOM_CAPACITY, 2 * len(entries)),
+                                settings.TOKEN_REVOCATION_BLOOM_ERROR_RATE)
+            for entry in entries:
+                bloom.add(entry)
+
+            self.bloom = bloom
+            self.built = time.monotonic()
+            return bloom
+
+    def add(self, entry):
+        with self.lock:
+            if self.bloom is not None:
+                self.bloom.add(entry)
+
+    def __contains__(self, entry):
+        bloom = self.bloom
+        if (bloom is None or self.subscribed_to is not get_revocation_list()
+                or settings.TOKEN_REVOCATION_REBUILD_SECONDS < time.monotonic() - self.built):
+            bloom = self.build()
+        return entry in bloom
+
+
+revocation_filter = RevocationFilter()
+
+
+def token_entries(token):
+    """
+    :return: The entries that revoke a token: its jti, and its user for the tokens issued before a revocation of
+        all the tokens of the user.
+    """
+    return f'jti:{token[api_settings.JTI_CLAIM]}', f'user:{token[api_settings.USER_ID_CLAIM]}'
+
+
+def revoke(entry, expires):
+    get_revocation_list().add(entry, time.time(), expires)
+    # The filter of this process does not wait for the message of the channel.
+    revocation_filter.add(entry)
+
+
+def revoke_token(token):
+    """
+    Revokes a verified token until it expires.
+    """
+    revoke(token_entries(token)[0], token['exp'])
+
+
+def revoke_user_tokens(user):
+    """
+    Revokes all the tokens issued to a user until now, like when the account is blocked.
+    """
+    lifetime = max(api_settings.ACCESS_TOKEN_LIFETIME, api_settings.REFRESH_TOKEN_LIFETIME)
+    revoke(f'user:{user.pk}', time.time() + lifetime.total_seconds())
+
+
+def is_token_revoked(token):
+    """
+    Fails open: while the revocation list can not be read, like when Redis is down, the tokens are not refused.
+    They are still verified and expire, and an outage of Redis does not log out every user. The error is logged
+    and the filter is built again at the next check.
+
+    :return: True if the token is revoked.
+    """
+    try:
+        return check_token_entries(token)
+    except redis.RedisError:
+        log.warning('The revocation list can not be read, the token %s is not checked.',
+                    token.get(api_settings.JTI_CLAIM), exc_info=True)
+        return False
+
+
+def check_token_entries(token):
+    jti_entry, user_entry = token_entries(token)
+
+    if jti_entry in revocation_filter and get_revocation_list().get(jti_entry) is not None:
+        return True
+
+    if user_entry in revocation_filter:
+        revoked_at = get_revocation_list().get(user_entry)
+        return revoked_at is not None and token['iat'] <= revoked_at
+
+    return False
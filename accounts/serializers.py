@@ -1,8 +1,10 @@
 from rest_framework import serializers
-
-from phonenumber_field.serializerfields import PhoneNumberField
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
 
 from .models import CustomUser, CodeVerify
+from .phone import PhoneNumberField
+from .revocation import is_token_revoked
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -24,6 +26,13 @@ class UpdateUserSerializer(serializers.ModelSerializer):
         model = CustomUser
         fields = ('username', 'email', 'first_name', 'last_name')
 
+    def update(self, instance, validated_data):
+        # Only the edited columns are written, a full save would write back the ad token balance of the instance.
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        instance.save(update_fields=list(validated_data))
+        return instance
+
 
 class LoginSerializer(serializers.ModelSerializer):
     phone_number = PhoneNumberField(region='IR')
@@ -40,3 +49,19 @@ class CodeVarifySerializer(serializers.ModelSerializer):
     class Meta:
         model = CodeVerify
         fields = ('user_id', 'code', 'send_again')
+
+
+class RevocableTokenRefreshSerializer(TokenRefreshSerializer):
+    """
+    TokenRefreshSerializer that refuses the refresh tokens revoked by a logout or the block of the user.
+    """
+
+    def validate(self, attrs):
+        if is_token_revoked(self.token_class(attrs['refresh'])):
+            raise InvalidToken('Token is revoked')
+
+        return super().validate(attrs)
+
+
+class LogoutSerializer(serializers.Serializer):
+    refresh = serializers.CharField(required=False)
@@ -6,9 +6,11 @@ from rest_framework.exceptions import PermissionDenied
 from axes.signals import user_locked_out
 
 from .models import CustomUser, CodeVerify
+from .otp import uses_code_verify
 
 
 @receiver(post_save, sender=CustomUser)
 def create_code_verify(sender, instance, created, *args, **kwargs):
-    if created:
+    # CacheOTP does not read the row, a first login inserts only the user.
+    if created and uses_code_verify():
         CodeVerify.objects.create(user=instance)
@@ -0,0 +1,108 @@
+from logging import getLogger
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from .models import OTP_CODE_LIFETIME
+
+log = getLogger(__name__)
+
+# Messages sent with LocmemSMSProvider, like django.core.mail.outbox for emails.
+outbox = []
+
+
+class SMSError(Exception):
+    """
+    A send that failed for a reason that may pass, like a timeout or an error of the provider.
+    accounts.tasks retries the send after it.
+    """
+
+
+class SMSProvider:
+    """
+    Sends text messages. Providers with an API for many messages at once set supports_bulk
+    and override send_bulk.
+    """
+    supports_bulk = False
+
+    def send(self, phone, message):
+        raise NotImplementedError
+
+    def send_bulk(self, messages):
+        """
+        :param messages: A list of (phone, message) tuples.
+        """
+        for phone, message in messages:
+            self.send(phone, message)
+
+
+class ConsoleSMSProvider(SMSProvider):
+    """
+    Logs the messages with the accounts.sms logger, in the log of the celery worker. For development.
+    """
+
+    def send(self, phone, message):
+        log.info('SMS to %s: %s', phone, message)
+
+
+class FileSMSProvider(SMSProvider):
+    """
+    Appends the messages to SMS_FILE_PATH. For development and load tests.
+    """
+    supports_bulk = True
+
+    def send(self, phone, message):
+        self.send_bulk([(phone, message)])
+
+    def send_bulk(self, messages):
+        with open(settings.SMS_FILE_PATH, 'a', encoding='utf-8') as sms_file:
+            sms_file.writelines(f'{phone}\t{message}\n' for phone, message in messages)
+
+
+class LocmemSMSProvider(SMSProvider):
+    """
+    Keeps the messages in accounts.sms.outbox. For tests.
+    """
+    supports_bulk = True
+
+    def send(self, phone, message):
+        outbox.append((phone, message))
+
+    def send_bulk(self, messages):
+        outbox.extend(messages)
+
+
+def get_provider():
+    return import_string(settings.SMS_PROVIDER)()
+
+
+def otp_message(code):
+    return f'Your verification code: {code}'
+
+
+def send_otp_code(phone, code):
+    """
+    Queues the SMS of a verification code, the request does not wait for the provider.
+    A code that could not be sent before it expires is not sent anymore.
+    """
+    from .tasks import send_sms
+
+    send_sms.apply_async((str(phone), otp_message(code)), expires=OTP_CODE_LIFETIME.total_seconds())
+
+
+def send_many(messages):
+    """
+    Queues many messages, in batches of SMS_BATCH_SIZE if the provider can send them at once.
+
+    :param messages: A list of (phone, message) tuples.
+    """
+    from .tasks import send_sms, send_sms_bulk
+
+    messages = [(str(phone), message) for phone, message in messages]
+    if not get_provider().supports_bulk:
+        for phone, message in messages:
+            send_sms.delay(phone, message)
+        return
+
+    for start in range(0, len(messages), settings.SMS_BATCH_SIZE):
+        send_sms_bulk.delay(messages[start:start + settings.SMS_BATCH_SIZE])
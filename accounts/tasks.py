@@ -0,0 +1,20 @@
+from config.celery import app
+
+from .sms import SMSError, get_provider
+
+
+# The tasks of SMS run on the sms queue, see CELERY_TASK_ROUTES. A worker of their own keeps the codes
+# of logins from waiting behind long tasks of the default queue.
+
+@app.task(autoretry_for=(SMSError, ), retry_backoff=2, retry_backoff_max=30, max_retries=5)
+def send_sms(phone, message):
+    get_provider().send(phone, message)
+
+
+@app.task(autoretry_for=(SMSError, ), retry_backoff=5, retry_backoff_max=300, max_retries=5)
+def send_sms_bulk(messages):
+    """
+    :param messages: A list of [phone, message] pairs.
+    """
+    get_provider().send_bulk([tuple(pair) for pair in messages])
+    return len(messages)
@@ -1,14 +1,33 @@
-from django.test import TestCase
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from unittest import mock
+from io import StringIO
+import time
+from django.test.utils import CaptureQueriesContext
 from django import db
 from django.conf import settings
+from django.core.management import call_command
+from django.core.cache import cache
 from django.shortcuts import reverse
 from django.utils import timezone
 from django.utils.functional import SimpleLazyObject
 
+from axes.utils import reset as axes_reset
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from rest_framework_simplejwt.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
+import redis
 
-from .models import CustomUser
+from .authentication import CachedJWTAuthentication, UserRefreshToken
+from .models import CustomUser, CodeVerify, AdTokenLedger
+from .serializers import UpdateUserSerializer
+from .otp import get_otp, otp_keys
+from .phone import PhoneNumberField, normalize_phone_number
+from .revocation import BloomFilter, LocmemRevocationList, RedisRevocationList, RevocationFilter, \
+    get_revocation_list, revocation_filter, revocation_lists, revoke_user_tokens
+from .throttling import SlidingWindow
+from . import sms
+from payment.models import PackageAdToken, Order
 
 
 class TestLogin(TestCase):
@@ -18,6 +37,9 @@ class TestLogin(TestCase):
         cls.user2 = CustomUser.objects.create_user(phone='09323744992', username='ALI')
         cls.user3 = CustomUser.objects.create_superuser(username='a', password='1')
 
+    def setUp(self):
+        cache.clear()
+
     # CustomUser
     def test_info_user(self):
         # user1 with phone_number
@@ -169,6 +191,9 @@ class TestLoginAPI(TestCase):
         cls.user2 = CustomUser.objects.create_user(phone='09315479801', username='reza')
         cls.user3 = CustomUser.objects.create_superuser(username='8001', password='q1w2')
 
+    def setUp(self):
+        cache.clear()
+
     def test_generate_verification_code_with_phone_number(self):
         # first request for generating code
         response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479800'})
@@ -282,3 +307,570 @@ class TestLoginAPI(TestCase):
         response = self.client.post(reverse('accounts:check_code_api'),
                                     {'user_id': self.user1.pk, 'code': code_varify1.code + 1})
         self.assertEqual(response.status_code, 403)
+
+
+@override_settings(OTP_BACKEND='accounts.otp.CacheOTP')
+class TestCacheOTP(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = CustomUser.objects.create_user(phone='09315479820')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_login_without_code_verify_writes(self):
+        with CaptureQueriesContext(db.connection) as queries:
+            response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479820'})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+            code_varify = get_otp(self.user1)
+            self.assertEqual(code_varify.count_otp, 2)
+            self.assertIsNotNone(code_varify.expiration_timestamp)
+
+            response = self.client.post(reverse('accounts:check_code_api'),
+                                        {'user_id': self.user1.pk, 'code': code_varify.code})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertIsNotNone(response.data.get('access_token'))
+
+        self.assertFalse([query for query in queries.captured_queries if 'codeverify' in query['sql']])
+
+        # the state is reset after the login
+        self.assertEqual(cache.get_many(otp_keys(self.user1.pk)), {})
+        # the user was created without a CodeVerify row
+        self.assertFalse(CodeVerify.objects.filter(user=self.user1).exists())
+
+    def test_max_otp_try(self):
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479820'})
+        code = get_otp(self.user1).code
+
+        for _ in range(settings.MAX_OTP_TRY - 1):
+            response = self.client.post(reverse('accounts:check_code_api'),
+                                        {'user_id': self.user1.pk, 'send_again': True})
+            self.assertEqual(response.data.get('send again'), 'Done')
+        self.assertIsNotNone(get_otp(self.user1).limit_time)
+
+        response = self.client.post(reverse('accounts:check_code_api'), {'user_id': self.user1.pk, 'send_again': True})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data.get('times'), 'max otp try')
+
+        # after the limit time another code can be sent
+        code_key, count_key, limit_key = otp_keys(self.user1.pk)
+        cache.delete(limit_key)
+        response = self.client.post(reverse('accounts:check_code_api'), {'user_id': self.user1.pk, 'send_again': True})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_otp(self.user1).count_otp, 1)
+        self.assertEqual(get_otp(self.user1).code, code)
+
+    def test_expired_code(self):
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479820'})
+        code_varify = get_otp(self.user1)
+
+        code_key, count_key, limit_key = otp_keys(self.user1.pk)
+        cache.set(code_key, (code_varify.code, timezone.now() - timezone.timedelta(seconds=1)))
+
+        response = self.client.post(reverse('accounts:check_code_api'),
+                                    {'user_id': self.user1.pk, 'code': code_varify.code})
+        self.assertEqual(response.data.get('code'), 'code has expired')
+
+        # a new code is sent for the next login
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479820'})
+        self.assertNotEqual(get_otp(self.user1).code, code_varify.code)
+        self.assertFalse(get_otp(self.user1).is_expired())
+
+    def test_reset_by_ttl(self):
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479820'})
+
+        # the keys expire when CodeVerify would be reset by can_start_again
+        cache.delete_many(otp_keys(self.user1.pk))
+        response = self.client.post(reverse('accounts:check_code_api'), {'user_id': self.user1.pk, 'code': 1})
+        self.assertEqual(response.data.get('authentication'), 'user did not create a code.')
+
+
+class TestProvisionUser(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_first_login(self):
+        with CaptureQueriesContext(db.connection) as queries:
+            response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479850'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        inserts = [query['sql'] for query in queries.captured_queries if query['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(CustomUser.objects.filter(phone_number='+989315479850').count(), 1)
+
+        user, created = CustomUser.objects.provision_user('+989315479850')
+        self.assertFalse(created)
+        self.assertEqual(user.pk, response.data.get('user_id'))
+
+    def test_new_user_has_code_verify(self):
+        user, created = CustomUser.objects.provision_user('+989315479851')
+        self.assertTrue(created)
+        self.assertEqual(user.username, '+989315479851')
+
+        with self.assertNumQueries(0):
+            self.assertEqual(user.codeverify.code, 0)
+
+    @override_settings(OTP_BACKEND='accounts.otp.CacheOTP')
+    def test_new_user_without_code_verify(self):
+        with CaptureQueriesContext(db.connection) as queries:
+            user, created = CustomUser.objects.provision_user('+989315479853')
+
+        self.assertTrue(created)
+        self.assertEqual([query['sql'] for query in queries.captured_queries if 'codeverify' in query['sql']], [])
+        self.assertFalse(CodeVerify.objects.filter(user=user).exists())
+
+    def test_concurrent_first_login(self):
+        existing = CustomUser.objects.create_user(phone='09315479852')
+
+        # the other request creates the user between the get and the insert
+        with mock.patch.object(CustomUser.objects.__class__, 'get',
+                               side_effect=[CustomUser.DoesNotExist, existing]):
+            user, created = CustomUser.objects.provision_user('+989315479852')
+
+        self.assertFalse(created)
+        self.assertEqual(user, existing)
+        self.assertEqual(CustomUser.objects.filter(phone_number='+989315479852').count(), 1)
+
+
+class TestLoginThrottling(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = CustomUser.objects.create_user(phone='09315479830')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_sliding_window(self):
+        window = SlidingWindow('test', 100)
+        self.assertEqual(window.hit(now=1050), 1)
+        self.assertEqual(window.hit(now=1099), 2)
+
+        # a quarter of the previous bucket is still in the window
+        self.assertEqual(window.count(now=1175), 0.5)
+        self.assertEqual(window.hit(now=1175), 1.5)
+        self.assertEqual(window.count(now=1250), 0.5)
+
+    def test_max_login(self):
+        with self.assertNumQueries(0):
+            for _ in range(settings.MAX_LOGIN - 1):
+                self.assertTrue(self.user1.can_login(True))
+            self.assertTrue(self.user1.can_login())
+            self.assertIsNone(self.user1.block_time)
+
+            self.assertFalse(self.user1.can_login(True))
+            self.assertFalse(self.user1.can_login())
+        self.assertGreater(self.user1.block_time, timezone.now())
+
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479830'})
+        self.assertEqual(response.data.get('message'), 'You limit for too many logout')
+
+    def test_failures_without_writes(self):
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479830'})
+        code = self.user1.codeverify.code
+
+        with CaptureQueriesContext(db.connection) as queries:
+            for index in range(settings.AXES_FAILURE_LIMIT):
+                # every failure from another address, they are counted by the phone number
+                self.client.post(reverse('accounts:check_code_api'), {'user_id': self.user1.pk, 'code': code + 1},
+                                 REMOTE_ADDR=f'10.0.0.{index}')
+
+        self.assertFalse([query for query in queries.captured_queries
+                          if query['sql'].startswith(('INSERT', 'UPDATE', 'DELETE'))])
+
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '+989315479830'},
+                                    REMOTE_ADDR='10.0.1.1')
+        self.assertEqual(response.status_code, 403)
+
+        # the address of a failure is not locked out for other phone numbers
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479831'},
+                                    REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_reset_attempts(self):
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479830'})
+        code = self.user1.codeverify.code
+        for _ in range(settings.AXES_FAILURE_LIMIT):
+            self.client.post(reverse('accounts:check_code_api'), {'user_id': self.user1.pk, 'code': code + 1},
+                             REMOTE_ADDR='10.0.0.1')
+
+        # the phone number is normalized like the failures, the key of the address is not reset
+        self.assertEqual(axes_reset(username='+989315479830'), 1)
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479830'},
+                                    REMOTE_ADDR='10.0.1.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479831'},
+                                    REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, 403)
+
+        self.assertEqual(axes_reset(ip='10.0.0.1'), 1)
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479831'},
+                                    REMOTE_ADDR='10.0.0.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(axes_reset(ip='10.0.0.1', username='09315479830'), 0)
+
+
+class TestCachedJWTAuthentication(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = CustomUser.objects.create_user(phone='09315479840')
+        cls.staff = CustomUser.objects.create_user(phone='09315479841')
+        cls.staff.is_staff = True
+        cls.staff.save()
+
+    def setUp(self):
+        CachedJWTAuthentication.verified_tokens.clear()
+
+    def authenticate(self, token):
+        request = RequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        user, validated_token = CachedJWTAuthentication().authenticate(request)
+        return user
+
+    def test_user_from_claims(self):
+        token = UserRefreshToken.for_user(self.user1).access_token
+
+        with self.assertNumQueries(0):
+            user = self.authenticate(token)
+            self.assertTrue(user)
+            self.assertTrue(user.is_authenticated)
+            self.assertEqual(user.pk, self.user1.pk)
+            self.assertFalse(user.is_staff)
+
+        # the user is loaded at the first access to another field
+        with self.assertNumQueries(1):
+            self.assertEqual(user.phone_number, self.user1.phone_number)
+            self.assertEqual(user.ad_token, 0)
+            self.assertEqual(user, self.user1)
+
+    def test_staff_claim_is_checked(self):
+        token = UserRefreshToken.for_user(self.staff).access_token
+        self.assertTrue(self.authenticate(token).is_staff)
+
+        self.staff.is_staff = False
+        self.staff.save()
+        self.assertFalse(self.authenticate(token).is_staff)
+
+        # a token without the claim
+        token = RefreshToken.for_user(self.user1).access_token
+        with self.assertNumQueries(1):
+            self.assertFalse(self.authenticate(token).is_staff)
+
+    def test_verified_tokens_cache(self):
+        token = str(UserRefreshToken.for_user(self.user1).access_token).encode()
+        authentication = CachedJWTAuthentication()
+
+        validated_token = authentication.get_validated_token(token)
+        self.assertIs(authentication.get_validated_token(token), validated_token)
+
+        with override_settings(JWT_VERIFIED_TOKEN_CACHE_SIZE=1):
+            authentication.get_validated_token(str(UserRefreshToken.for_user(self.staff).access_token).encode())
+        self.assertEqual(len(CachedJWTAuthentication.verified_tokens), 1)
+        self.assertIsNot(authentication.get_validated_token(token), validated_token)
+
+    def test_inactive_user(self):
+        token = UserRefreshToken.for_user(self.user1).access_token
+        CustomUser.objects.filter(pk=self.user1.pk).update(is_active=False)
+
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token).phone_number
+
+        response = self.client.get(reverse('accounts:profile_api'), HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestTokenRevocation(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = CustomUser.objects.create_user(phone='09315479860')
+
+    def setUp(self):
+        cache.clear()
+        revocation_lists.clear()
+        revocation_filter.reset()
+        CachedJWTAuthentication.verified_tokens.clear()
+
+    def profile(self, access_token):
+        return self.client.get(reverse('accounts:profile_api'), HTTP_AUTHORIZATION=f'Bearer {access_token}')
+
+    def test_bloom_filter(self):
+        bloom = BloomFilter(1000, 0.001)
+        items = [f'jti:{index}' for index in range(1000)]
+        for item in items:
+            bloom.add(item)
+
+        self.assertTrue(all(item in bloom for item in items))
+        false_positives = sum(f'jti:other-{index}' in bloom for index in range(10000))
+        self.assertLess(false_positives, 50)
+
+    def test_logout(self):
+        refresh = UserRefreshToken.for_user(self.user1)
+        access_token = refresh.access_token
+        other_refresh = UserRefreshToken.for_user(self.user1)
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+        response = self.client.post(reverse('accounts:logout_api'), {'refresh': str(refresh)},
+                                    HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('accounts:token_refresh'), {'refresh': str(refresh)})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # the other sessions of the user are not logged out
+        self.assertEqual(self.profile(other_refresh.access_token).status_code, status.HTTP_200_OK)
+        response = self.client.post(reverse('accounts:token_refresh'), {'refresh': str(other_refresh)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_logout_with_refresh_of_other_user(self):
+        other_user = CustomUser.objects.create_user(phone='09315479861')
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+
+        response = self.client.post(reverse('accounts:logout_api'),
+                                    {'refresh': str(UserRefreshToken.for_user(other_user))},
+                                    HTTP_AUTHORIZATION=f'Bearer {access_token}')
+        self.assertEqual(response.data.get('refresh'), 'refresh token is invalid')
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+    def test_tokens_not_revoked_without_lookup(self):
+        revoke_user_tokens(CustomUser.objects.create_user(phone='09315479862'))
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+
+        with mock.patch.object(LocmemRevocationList, 'get') as get:
+            self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+        get.assert_not_called()
+
+    def test_revocation_of_other_process(self):
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+        # the message of the channel adds the entry to the filter of this process
+        get_revocation_list().add(f'jti:{access_token["jti"]}', time.time(), access_token['exp'])
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # a new process builds its filter from the list
+        revocation_filter.reset()
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_block_user(self):
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+        revoke_user_tokens(self.user1)
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # the tokens issued after the revocation are accepted
+        get_revocation_list().add(f'user:{self.user1.pk}', time.time() - 60, time.time() + 60)
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+    def test_expired_revocation(self):
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+        get_revocation_list().add(f'jti:{access_token["jti"]}', time.time(), time.time() - 1)
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+    @override_settings(TOKEN_REVOCATION_REDIS_TIMEOUT=0.2)
+    def test_redis_timeouts(self):
+        # an unreachable Redis does not block the checks until the timeout of the system
+        connection_kwargs = RedisRevocationList().redis.connection_pool.connection_kwargs
+        self.assertEqual(connection_kwargs['socket_connect_timeout'], 0.2)
+        self.assertEqual(connection_kwargs['socket_timeout'], 0.2)
+
+    def test_reset_during_check(self):
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+        build = RevocationFilter.build
+
+        # the channel of the filter is lost right after it is built
+        def build_and_reset(revocation_filter):
+            bloom = build(revocation_filter)
+            revocation_filter.reset()
+            return bloom
+
+        with mock.patch.object(RevocationFilter, 'build', build_and_reset):
+            self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+    def test_revocation_list_unavailable(self):
+        access_token = UserRefreshToken.for_user(self.user1).access_token
+        revoke_user_tokens(self.user1)
+        revocation_filter.reset()
+
+        # the tokens are accepted while the list can not be read
+        with mock.patch.object(LocmemRevocationList, 'entries', side_effect=redis.ConnectionError), \
+                self.assertLogs('accounts.revocation', 'WARNING'):
+            self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+        with mock.patch.object(LocmemRevocationList, 'get', side_effect=redis.ConnectionError), \
+                self.assertLogs('accounts.revocation', 'WARNING'):
+            self.assertEqual(self.profile(access_token).status_code, status.HTTP_200_OK)
+
+        # and refused again once it can
+        self.assertEqual(self.profile(access_token).status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class TestPhoneNumbers(SimpleTestCase):
+    def test_normalize_phone_number(self):
+        normalize_phone_number.cache_clear()
+
+        for phone_number in ('09121234567', '+989121234567', '9121234567'):
+            self.assertEqual(normalize_phone_number(phone_number), ('+989121234567', True))
+        self.assertEqual(normalize_phone_number('0912123'), (None, False))
+        self.assertEqual(normalize_phone_number('not a phone'), (None, False))
+
+        # the numbers seen before are not parsed again
+        self.assertEqual(normalize_phone_number.cache_info().misses, 5)
+
+    def test_serializer_field(self):
+        field = PhoneNumberField(region='IR')
+        self.assertEqual(field.run_validation('09121234567'), '+989121234567')
+
+        with self.assertRaises(ValidationError):
+            field.run_validation('0912123')
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('phone_benchmark', numbers=20, repeat=2, stdout=out)
+        self.assertIn('login', out.getvalue())
+        self.assertIn('ad create', out.getvalue())
+
+
+class TestSMS(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = CustomUser.objects.create_user(phone='09315479830')
+
+    def setUp(self):
+        sms.outbox.clear()
+
+    def test_login_sends_code(self):
+        response = self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479830'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.user1.codeverify.refresh_from_db()
+        self.assertEqual(sms.outbox, [('+989315479830', sms.otp_message(self.user1.codeverify.code))])
+
+        # the code is not sent again while it is valid
+        self.client.post(reverse('accounts:login_api'), {'phone_number': '09315479830'})
+        self.assertEqual(len(sms.outbox), 1)
+
+        response = self.client.post(reverse('accounts:check_code_api'), {'user_id': self.user1.pk, 'send_again': True})
+        self.assertEqual(response.data.get('send again'), 'Done')
+        self.assertEqual(len(sms.outbox), 2)
+
+    def test_retry_failed_send(self):
+        failures = [sms.SMSError('timeout')]
+
+        def send(provider, phone, message):
+            if failures:
+                raise failures.pop()
+            sms.outbox.append((phone, message))
+
+        with mock.patch.object(sms.LocmemSMSProvider, 'send', send):
+            sms.send_otp_code('+989315479830', 1234567)
+
+        self.assertEqual(sms.outbox, [('+989315479830', sms.otp_message(1234567))])
+
+    @override_settings(SMS_BATCH_SIZE=2)
+    def test_send_many_in_batches(self):
+        messages = [(f'+98931547983{index}', f'message {index}') for index in range(5)]
+
+        with mock.patch.object(sms.LocmemSMSProvider, 'send_bulk', autospec=True,
+                               side_effect=lambda provider, batch: sms.outbox.extend(batch)) as send_bulk:
+            sms.send_many(messages)
+
+        self.assertEqual(send_bulk.call_count, 3)
+        self.assertEqual(sms.outbox, messages)
+
+
+class TestAdToken(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = CustomUser.objects.create_user(phone='09315479810')
+        cls.package1 = PackageAdToken.objects.create(name='Token 1', description='this is package Token 1',
+                                                     price=20_000, token_quantity=2, confirmation=True)
+
+    def test_try_using_ad_token(self):
+        self.assertFalse(self.user1.try_using_ad_token('True'))
+        self.assertFalse(AdTokenLedger.objects.exists())
+
+        self.user1.add_ad_tokens(1, reason='admin')
+        self.assertEqual(self.user1.ad_token, 1)
+
+        self.assertFalse(self.user1.try_using_ad_token('False'))
+        self.assertTrue(self.user1.try_using_ad_token('True'))
+        self.assertEqual(self.user1.ad_token, 0)
+        self.assertTrue(self.user1.token_activated)
+
+        # a stale copy of the user can not spend the same token again
+        stale_user = CustomUser.objects.get(pk=self.user1.pk)
+        stale_user.ad_token = 1
+        stale_user.token_activated = False
+        self.assertFalse(stale_user.try_using_ad_token('True'))
+
+        self.assertTrue(self.user1.consume_activated_token())
+        self.assertFalse(stale_user.consume_activated_token())
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.ad_token, 0)
+        self.assertEqual(list(self.user1.ad_token_ledger.order_by('pk').values_list('change', 'reason')),
+                         [(1, 'admin'), (-1, 'use')])
+
+    def test_close_order(self):
+        order = Order.objects.create(customer=self.user1, package=self.package1, first_name='Ali',
+                                     last_name='Blue', phone='09315479810')
+
+        self.assertTrue(order.close_order())
+        self.assertTrue(order.completed)
+        self.assertEqual(order.token_quantity, 2)
+        self.assertIsNotNone(order.datetime_paid)
+
+        # closing the order again does not add the tokens twice
+        self.assertFalse(Order.objects.get(pk=order.pk).close_order())
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.ad_token, 2)
+        self.assertEqual(AdTokenLedger.objects.get(user=self.user1).order, order)
+
+    def test_login_writes_only_last_login(self):
+        cache.clear()
+        code_varify = get_otp(self.user1)
+        code_varify.create_code()
+
+        with CaptureQueriesContext(db.connection) as queries:
+            response = self.client.post(reverse('accounts:check_code_api'),
+                                        {'user_id': self.user1.pk, 'code': code_varify.code})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        updates = [query['sql'] for query in queries if query['sql'].startswith('UPDATE "accounts_customuser"')]
+        self.assertEqual(len(updates), 1)
+        self.assertIn('"last_login"', updates[0])
+        self.assertNotIn('"ad_token"', updates[0])
+
+    def test_edit_user_info_keeps_ad_token(self):
+        stale_user = CustomUser.objects.get(pk=self.user1.pk)
+        self.user1.add_ad_tokens(2, reason='admin')
+
+        ser = UpdateUserSerializer(stale_user, data={'first_name': 'Ali'}, partial=True)
+        self.assertTrue(ser.is_valid())
+        ser.save()
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.first_name, 'Ali')
+        self.assertEqual(self.user1.ad_token, 2)
+
+    def test_admin_change_records_the_difference(self):
+        CustomUser.objects.create_superuser(username='admin', password='admin')
+        self.client.post('/admin/login/', {'username': 'admin', 'password': 'admin'})
+        url = reverse('admin:accounts_customuser_change', args=[self.user1.pk])
+        form = self.client.get(url).context['adminform'].form
+
+        self.user1.add_ad_tokens(2, reason='admin')
+
+        # staff sets the balance to 5, the ledger gets the difference with the balance when the form is saved
+        data = {name: value for name, value in form.initial.items() if value is not None and name != 'password'}
+        data.update({'first_name': 'Ali', 'last_login_0': '', 'last_login_1': '', 'groups': [],
+                     'user_permissions': [], 'date_joined_0': form.initial['date_joined'].strftime('%Y-%m-%d'),
+                     'date_joined_1': form.initial['date_joined'].strftime('%H:%M:%S'), 'ad_token': 2 + 3})
+        data.pop('date_joined')
+        response = self.client.post(url, data)
+        self.assertEqual(response.status_code, status.HTTP_302_FOUND)
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.first_name, 'Ali')
+        self.assertEqual(self.user1.ad_token, 5)
+        self.assertEqual(list(self.user1.ad_token_ledger.order_by('pk').values_list('change', flat=True)), [2, 3])
@@ -0,0 +1,255 @@
+import time
+from logging import getLogger
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from axes.handlers.cache import AxesCacheHandler
+from axes.helpers import (
+    get_cache_timeout,
+    get_client_ip_address,
+    get_client_parameters,
+    get_client_str,
+    get_client_user_agent,
+    get_client_username,
+    get_failure_limit,
+    make_cache_key_list,
+)
+from axes.models import AccessAttempt
+from axes.signals import user_locked_out
+
+from .phone import normalize_phone_number
+
+log = getLogger(__name__)
+
+
+class SlidingWindow:
+    """
+    Counts the hits of a key in the last `window` seconds, with two keys in the cache and no database writes.
+
+    The hits are counted in fixed buckets of `window` seconds. The count of the window is the count of the
+    current bucket plus the count of the previous one, weighted by the part of the previous bucket that is still
+    in the window. A hit is an atomic INCR, so concurrent requests are all counted.
+    """
+
+    def __init__(self, key, window):
+        self.key = key
+        self.window = max(1, int(window))
+
+    def bucket_keys(self, now):
+        """
+        :return: A (current key, previous key, weight of the previous bucket) tuple.
+        """
+        bucket, elapsed = divmod(now, self.window)
+        bucket = int(bucket)
+        return f'{self.key}:{bucket}', f'{self.key}:{bucket - 1}', 1 - elapsed / self.window
+
+    def count(self, now=None):
+        current_key, previous_key, weight = self.bucket_keys(time.time() if now is None else now)
+        counts = cache.get_many([current_key, previous_key])
+        return counts.get(current_key, 0) + counts.get(previous_key, 0) * weight
+
+    def hit(self, now=None):
+        """
+        :return: The count of the window, with this hit.
+        """
+        current_key, previous_key, weight = self.bucket_keys(time.time() if now is None else now)
+
+        # A bucket is read until the end of the next one.
+        timeout = 2 * self.window
+        if cache.add(current_key, 1, timeout=timeout):
+            current = 1
+        else:
+            try:
+                current = cache.incr(current_key)
+            except ValueError:
+                # The key expired between add and incr.
+                cache.set(current_key, 1, timeout=timeout)
+                current = 1
+
+        return current + cache.get(previous_key, 0) * weight
+
+    def reset(self, now=None):
+        current_key, previous_key, _ = self.bucket_keys(time.time() if now is None else now)
+        cache.delete_many([current_key, previous_key])
+
+
+class Lockout:
+    """
+    A SlidingWindow that blocks its key for `block_time` once `limit` hits are counted in the window.
+    The block is a key of its own with the block time as its timeout, it does not end when the hits leave the window.
+    """
+
+    def __init__(self, key, limit, window, block_time):
+        self.window = SlidingWindow(key, window)
+        self.block_key = f'{key}:block'
+        self.limit = limit
+        self.block_time = int(block_time)
+
+    def hit(self):
+        """
+        :return: True if the key is blocked by this hit.
+        """
+        if self.limit <= self.window.hit():
+            blocked_until = timezone.now() + timezone.timedelta(seconds=self.block_time)
+            cache.set(self.block_key, blocked_until, timeout=self.block_time)
+            return True
+        return False
+
+    def blocked_until(self):
+        """
+        :return: The time the block ends, or None if the key is not blocked.
+        """
+        return cache.get(self.block_key)
+
+    def is_blocked(self):
+        return self.blocked_until() is not None
+
+    def count(self):
+        """
+        :return: The count of the window, not more than limit - 1 while the key is not blocked.
+            Only the block locks out, the hits that are still in the window after it do not extend it.
+        """
+        if self.is_blocked():
+            return self.limit
+        return min(self.window.count(), self.limit - 1)
+
+    def reset(self):
+        self.window.reset()
+        cache.delete(self.block_key)
+
+
+def login_lockout(phone_number):
+    """
+    :return: The Lockout of the successful logins of a phone number, MAX_LOGIN logins in
+        LOGIN_SUCCESS_CHECK_PERIOD_MINUTE block it for BLOCK_TIME_MAX_LOGIN_MINUTE.
+    """
+    return Lockout(
+        f'login:{phone_number}',
+        limit=settings.MAX_LOGIN,
+        window=settings.LOGIN_SUCCESS_CHECK_PERIOD_MINUTE * 60,
+        block_time=settings.BLOCK_TIME_MAX_LOGIN_MINUTE * 60,
+    )
+
+
+def get_client_phone_number(request, credentials=None):
+    """
+    AXES_USERNAME_CALLABLE, the phone number of a login in E.164. The failures of 09xx and +989xx share one key.
+
+    :return: The phone number, or None if the login has no valid phone number.
+    """
+    if credentials:
+        phone_number = credentials.get(settings.AXES_USERNAME_FORM_FIELD)
+    else:
+        phone_number = getattr(request, 'data', request.POST).get(settings.AXES_USERNAME_FORM_FIELD)
+
+    if not phone_number:
+        return None
+
+    # A PhoneNumber, from the credentials of signal_failed.
+    phone_number, valid = normalize_phone_number(str(phone_number), 'IR')
+    return phone_number
+
+
+class AxesSlidingWindowHandler(AxesCacheHandler):
+    """
+    Counts the login failures of django-axes in sliding windows of AXES_COOLOFF_TIME, keyed by the phone number
+    and the IP address. AXES_FAILURE_LIMIT failures in the window lock the client out for AXES_COOLOFF_TIME.
+
+    Unlike AxesDatabaseHandler nothing is written to the database, so a storm of wrong codes only touches the cache.
+    """
+
+    def get_lockouts(self, request, credentials=None):
+        username = get_client_username(request, credentials)
+        parameters = get_client_parameters(
+            username, get_client_ip_address(request), get_client_user_agent(request), request, credentials,
+        )
+        return self.make_lockouts(parameters, get_failure_limit(request, credentials))
+
+    @staticmethod
+    def make_lockouts(parameters, limit):
+        """
+        :param parameters: The parameters of get_client_parameters.
+        :return: The Lockouts of the parameters that have all their values.
+        """
+        # A client without a phone number, like a login of the admin panel, is only counted by the other keys.
+        # An empty value would share one key among all of them.
+        parameters = [parameter for parameter in parameters if all(parameter.values())]
+
+        window = get_cache_timeout()
+        return [
+            Lockout(key, limit=limit, window=window, block_time=window)
+            for key in make_cache_key_list(parameters)
+        ]
+
+    def get_failures(self, request, credentials=None):
+        return max((lockout.count() for lockout in self.get_lockouts(request, credentials)), default=0)
+
+    def user_login_failed(self, sender, credentials, request=None, **kwargs):
+        """
+        When user login fails, counts the failure and locks the client out if the limit is reached.
+        """
+        if request is None:
+            log.error('AXES: AxesSlidingWindowHandler.user_login_failed does not function without a request.')
+            return
+
+        username = get_client_username(request, credentials)
+
+        # If axes denied access, don't count the failed attempt as that would extend the lockout.
+        if not settings.AXES_RESET_COOL_OFF_ON_FAILURE_DURING_LOCKOUT and request.axes_locked_out:
+            request.axes_credentials = credentials
+            user_locked_out.send('axes', request=request, username=username, ip_address=request.axes_ip_address)
+            return
+
+        client_str = get_client_str(
+            username, request.axes_ip_address, request.axes_user_agent, request.axes_path_info, request,
+        )
+
+        if self.is_whitelisted(request, credentials):
+            log.info('AXES: Login failed from whitelisted client %s.', client_str)
+            return
+
+        lockouts = self.get_lockouts(request, credentials)
+        blocked = [lockout.hit() for lockout in lockouts]
+        request.axes_failures_since_start = self.get_failures(request, credentials)
+
+        log.warning('AXES: Login failure by %s. Count = %s.', client_str, request.axes_failures_since_start)
+
+        if settings.AXES_LOCK_OUT_AT_FAILURE and any(blocked):
+            log.warning('AXES: Locking out %s after repeated login failures.', client_str)
+
+            request.axes_locked_out = True
+            request.axes_credentials = credentials
+            user_locked_out.send('axes', request=request, username=username, ip_address=request.axes_ip_address)
+
+    def user_logged_in(self, sender, request, user, **kwargs):
+        log.info('AXES: Successful login by %s.', user.get_username())
+
+        if settings.AXES_RESET_ON_SUCCESS:
+            for lockout in self.get_lockouts(request, {settings.AXES_USERNAME_FORM_FIELD: user.phone_number}):
+                lockout.reset()
+
+    def reset_attempts(self, *, ip_address=None, username=None, ip_or_username=False):
+        """
+        Resets the failures and the lockouts of the keys of an IP address and of a phone number, like axes_reset_ip
+        and axes_reset_username. Each value has keys of its own, so ip_or_username changes nothing: the keys of
+        both values are reset, and a key of the two together if it is in AXES_LOCKOUT_PARAMETERS.
+
+        :return: The number of keys that had failures or a lockout.
+        """
+        if ip_address is None and username is None:
+            raise NotImplementedError('The failures are in the cache, they can not all be reset.')
+
+        if username is not None:
+            username = get_client_phone_number(None, {settings.AXES_USERNAME_FORM_FIELD: username})
+        attempt = AccessAttempt(username=username, ip_address=ip_address)
+        parameters = get_client_parameters(username, ip_address, None, attempt)
+
+        count = 0
+        for lockout in self.make_lockouts(parameters, get_failure_limit(attempt, None)):
+            count += lockout.is_blocked() or 0 < lockout.window.count()
+            lockout.reset()
+
+        log.info('AXES: Reset %d access attempts from cache.', count)
+        return count
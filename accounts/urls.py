@@ -13,6 +13,7 @@ urlpatterns = [
     path('logout/', views.LogoutView.as_view(), name='logout'),
     path('login/api/', views.LoginAPI.as_view(), name='login_api'),
     path('login/check-code/api/', views.CheckCodeAPI.as_view(), name='check_code_api'),
+    path('logout/api/', views.LogoutAPI.as_view(), name='logout_api'),
     path('refresh/api/', TokenRefreshView.as_view(), name='token_refresh'),
     path('profile/api/', views.UserInfoAPI.as_view(), name='profile_api'),
     path('profile/edit/api/', views.EditUserInfoAPI.as_view(), name='profile_edit_api'),
@@ -1,8 +1,11 @@
 from django.contrib import admin
 from django.contrib import messages
 
+from config.pagination import EstimatedCountPaginator
+
 from .models import Category, Ad, AdReport
 from .forms import AdForm
+from .utils import bulk_update_ads, bulk_soft_delete_ads, bulk_unblock_ads
 
 
 @admin.register(Category)
@@ -23,14 +26,18 @@ class AdsAdmin(admin.ModelAdmin):
     list_display = ('title', 'price', 'active', 'confirmation', 'datetime_modified', 'expiration_date', 'is_delete')
     ordering = ('-datetime_modified', )
     list_filter = ('active', 'is_delete', 'is_block', 'is_use_ad_token')
-    actions = ('soft_delete_selected', )
+    actions = ('soft_delete_selected', 'confirm_selected', 'unconfirm_selected', 'block_selected',
+               'unblock_selected')
     inlines = (AdReportTabu, )
     form = AdForm
+    # Avoid exact COUNT(*) queries over the whole table on every changelist page.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_fields(self, request, obj=None):
         fields = ['author', 'title', 'text', 'price', 'image', 'status_product', 'category',
-                  'location', 'phone', 'active', 'is_use_ad_token', 'count_reports', 'slug', 'confirmation',
-                  'datetime_modified', 'expiration_date']
+                  'location', 'province', 'city', 'latitude', 'longitude', 'phone', 'active', 'is_use_ad_token',
+                  'count_reports', 'view_count', 'slug', 'confirmation', 'datetime_modified', 'expiration_date']
 
         if obj:
 
@@ -43,7 +50,7 @@ class AdsAdmin(admin.ModelAdmin):
         return fields
 
     def get_readonly_fields(self, request, obj=None):
-        readonly_fields = ['datetime_modified', 'expiration_date', 'datetime_deleted']
+        readonly_fields = ['datetime_modified', 'expiration_date', 'datetime_deleted', 'view_count']
 
         if obj:
             readonly_fields.append('author')
@@ -70,9 +77,34 @@ class AdsAdmin(admin.ModelAdmin):
             del actions['delete_selected']
         return actions
 
+    # The bulk actions below change all selected ads with a single UPDATE instead of saving each ad.
+
     def soft_delete_selected(self, request, queryset):
-        # Perform the soft deletion for selected objects
-        for obj in queryset:
-            obj.soft_delete(reason='staff')
+        count = bulk_soft_delete_ads(queryset, reason='staff')
+        messages.info(request, f'{count} ads were deleted')
 
     soft_delete_selected.short_description = 'Soft delete selected objects'
+
+    def confirm_selected(self, request, queryset):
+        count = bulk_update_ads(queryset.filter(confirmation=False), confirmation=True)
+        messages.info(request, f'{count} ads were confirmed')
+
+    confirm_selected.short_description = 'Confirm selected ads'
+
+    def unconfirm_selected(self, request, queryset):
+        count = bulk_update_ads(queryset.filter(confirmation=True), confirmation=False)
+        messages.info(request, f'{count} ads were unconfirmed')
+
+    unconfirm_selected.short_description = 'Unconfirm selected ads'
+
+    def block_selected(self, request, queryset):
+        count = bulk_update_ads(queryset.filter(is_block=False), is_block=True)
+        messages.info(request, f'{count} ads were blocked')
+
+    block_selected.short_description = 'Block selected ads'
+
+    def unblock_selected(self, request, queryset):
+        count = bulk_unblock_ads(queryset)
+        messages.info(request, f'{count} ads were unblocked')
+
+    unblock_selected.short_description = 'Unblock selected ads and mark their reports investigated'
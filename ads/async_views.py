@@ -0,0 +1,92 @@
+from django.conf import settings
+from django.db.models import Q
+
+from rest_framework.response import Response
+from rest_framework import status
+
+from asgiref.sync import sync_to_async
+
+from config.async_views import AsyncAPIView
+
+from .serializers import AdListSerializer, AdDetailSerializer, SearchSerializer, CategorySerializer, NearSerializer
+from .models import Ad, Category
+from .utils import filter_ads_near
+from .counters import record_view, get_viewer
+
+
+# Async versions of the hot read endpoints of ads.views, served under ASGI. See config.async_views.AsyncAPIView.
+
+
+class AsyncAdsListAPI(AsyncAPIView):
+    serializer_class = AdListSerializer
+    use_read_replica = True
+
+    async def get(self, request):
+        ads_list = Ad.active_objs.select_related('author').prefetch_related('category').order_by(
+            '-datetime_modified')
+
+        province = request.query_params.get('province')
+        if province:
+            ads_list = ads_list.filter(province=province)
+
+        city = request.query_params.get('city')
+        if city:
+            ads_list = ads_list.filter(city=city)
+
+        if 'near' in request.query_params:
+            ser_near = NearSerializer(data=request.query_params)
+            if not ser_near.is_valid():
+                return Response(ser_near.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            latitude, longitude = ser_near.validated_data['near']
+            radius = ser_near.validated_data.get('radius', settings.GEO_DEFAULT_RADIUS_KM)
+            ads_list = await sync_to_async(filter_ads_near)(ads_list, latitude, longitude, radius)
+        else:
+            ads_list = [ad async for ad in ads_list]
+
+        ser = AdListSerializer(ads_list, many=True)
+        return Response(ser.data, status=status.HTTP_200_OK)
+
+
+class AsyncCategoryListAPI(AsyncAPIView):
+    serializer_class = CategorySerializer
+    use_read_replica = True
+
+    async def get(self, request):
+        categories_list = [category async for category in Category.objects.all()]
+        ser = CategorySerializer(categories_list, many=True)
+        return Response(ser.data, status=status.HTTP_200_OK)
+
+
+class AsyncSearchAdAPI(AsyncAPIView):
+    serializer_class = SearchSerializer
+    use_read_replica = True
+
+    async def post(self, request):
+        ser_search = SearchSerializer(data=request.data)
+        if ser_search.is_valid():
+            q = ser_search.validated_data['q']
+            ads_list = Ad.active_objs.filter(Q(title__icontains=q) | Q(text__icontains=q) |
+                                             Q(category__name__icontains=q)).distinct('id')
+            ads_list = [ad async for ad in ads_list.select_related('author').prefetch_related('category')]
+            ser = AdListSerializer(ads_list, many=True)
+
+            return Response(ser.data, status=status.HTTP_200_OK)
+
+        return Response(ser_search.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncAdDetailAPI(AsyncAPIView):
+    serializer_class = AdDetailSerializer
+    use_read_replica = True
+
+    async def get(self, request, pk):
+        try:
+            ad = await Ad.active_objs.select_related('author').prefetch_related('category', 'sign').aget(pk=pk)
+        except Ad.DoesNotExist:
+            return Response({'message': f'There is no ad with this pk {pk}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        await sync_to_async(record_view)(ad.pk, get_viewer(request))
+
+        ser = AdDetailSerializer(ad)
+        return Response(ser.data, status=status.HTTP_200_OK)
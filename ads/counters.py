@@ -0,0 +1,171 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.redis import RedisCache
+
+DIRTY_ADS_KEY = 'ad_views_dirty'
+
+# The dirty ads of the cache backends without sets, like LocMemCache in tests. Only right in one process.
+local_dirty_ads = set()
+local_dirty_ads_lock = threading.Lock()
+
+
+def view_count_key(ad_pk):
+    return f'ad_views:{ad_pk}'
+
+
+def viewer_key(ad_pk, viewer):
+    return f'ad_viewer:{ad_pk}:{viewer}'
+
+
+def get_client_ip(request):
+    """
+    Returns the ip address of the client.
+
+    X-Forwarded-For is only read when the request comes from one of TRUSTED_PROXY_IPS, any client can send it.
+    The client is the last address of the header that is not a trusted proxy.
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
+    forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+    if not forwarded_for or remote_addr not in settings.TRUSTED_PROXY_IPS:
+        return remote_addr
+
+    addresses = [address.strip() for address in forwarded_for.split(',') if address.strip()]
+    for address in reversed(addresses):
+        if address not in settings.TRUSTED_PROXY_IPS:
+            return address
+
+    return addresses[0] if addresses else remote_addr
+
+
+def get_viewer(request):
+    """
+    Returns an identifier for the client viewing an ad.
+
+    Authenticated users are identified by their pk, anonymous clients by their ip address.
+    """
+    if request.user.is_authenticated:
+        return f'user-{request.user.pk}'
+
+    return f'ip-{get_client_ip(request)}'
+
+
+def redis_client():
+    """
+    The redis-py client of the default cache, for the Redis commands the cache API does not have, like sets.
+
+    RedisCache has no public accessor, its client is the private _cache attribute (RedisCacheClient in
+    Django 4.2). This is the only place that reads it, check it when upgrading Django.
+
+    :return: The redis client of the default cache, or None if the cache is not RedisCache.
+    """
+    if isinstance(cache, RedisCache):
+        return cache._cache.get_client(write=True)
+    return None
+
+
+def mark_dirty(*ad_pks):
+    """
+    Adds ads to the set of the ads with pending views, the only ones flush_ad_views reads.
+    """
+    if not ad_pks:
+        return
+
+    client = redis_client()
+    if client is not None:
+        client.sadd(cache.make_key(DIRTY_ADS_KEY), *ad_pks)
+        return
+
+    with local_dirty_ads_lock:
+        local_dirty_ads.update(ad_pks)
+
+
+def pop_dirty_ads(count):
+    """
+    Removes up to count ads from the set of the ads with pending views, with an atomic SPOP on Redis.
+
+    :return: A list of ad pks, empty when no ad has pending views.
+    """
+    client = redis_client()
+    if client is not None:
+        return [int(pk) for pk in client.spop(cache.make_key(DIRTY_ADS_KEY), count) or []]
+
+    with local_dirty_ads_lock:
+        return [local_dirty_ads.pop() for _ in range(min(count, len(local_dirty_ads)))]
+
+
+def record_view(ad_pk, viewer):
+    """
+    Increments the pending view counter of an ad in the cache.
+
+    Repeat views by the same viewer within AD_VIEW_DEDUP_WINDOW_MINUTE are ignored. The counter expires
+    AD_VIEW_COUNTER_TTL_HOURS after the last flush that read it, a counter of an ad nobody views does not stay.
+
+    :return: True if the view was counted, False if it was a repeat view.
+    """
+    window = settings.AD_VIEW_DEDUP_WINDOW_MINUTE * 60
+    if not cache.add(viewer_key(ad_pk, viewer), 1, timeout=window):
+        return False
+
+    key = view_count_key(ad_pk)
+    timeout = settings.AD_VIEW_COUNTER_TTL_HOURS * 60 * 60
+    cache.add(key, 0, timeout=timeout)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # The key was evicted between add and incr.
+        cache.set(key, 1, timeout=timeout)
+
+    # Marked after the increment: a flush that pops the ad in between reads this view, or the ad is marked again.
+    mark_dirty(ad_pk)
+
+    return True
+
+
+def pop_pending_views(ad_pks):
+    """
+    Reads the pending view counters of the given ads and subtracts what was read from the cache.
+
+    Subtracting instead of deleting keeps the views recorded while the flush is running. The counters that
+    were read get AD_VIEW_COUNTER_TTL_HOURS again.
+
+    :return: A dict mapping ad pk to the number of views to add to the database.
+    """
+    keys = {view_count_key(pk): pk for pk in ad_pks}
+    pending = {}
+
+    for key, value in cache.get_many(keys).items():
+        if not value:
+            continue
+
+        try:
+            cache.decr(key, value)
+        except ValueError:
+            continue
+        cache.touch(key, settings.AD_VIEW_COUNTER_TTL_HOURS * 60 * 60)
+
+        pending[keys[key]] = value
+
+    return pending
+
+
+def restore_pending_views(ad_pks, pending):
+    """
+    Gives back the views of a flush that failed: adds the views read by pop_pending_views to the counters again
+    and marks the ads dirty again, the next flush reads them.
+
+    :param ad_pks: The ads popped by pop_dirty_ads.
+    :param pending: The views read by pop_pending_views, or an empty dict if it failed.
+    """
+    timeout = settings.AD_VIEW_COUNTER_TTL_HOURS * 60 * 60
+    for ad_pk, count in pending.items():
+        key = view_count_key(ad_pk)
+        cache.add(key, 0, timeout=timeout)
+        try:
+            cache.incr(key, count)
+        except ValueError:
+            # The key was evicted between add and incr.
+            cache.set(key, count, timeout=timeout)
+
+    mark_dirty(*ad_pks)
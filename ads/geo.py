@@ -0,0 +1,114 @@
+import math
+
+BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Height of a geohash cell in km for each precision, and its width at the equator.
+CELL_HEIGHT_KM = (5009.4, 625.1, 156.5, 19.5, 4.89, 0.61, 0.153, 0.019, 0.0048)
+CELL_WIDTH_KM = (5009.4, 1252.3, 156.5, 39.1, 4.89, 1.22, 0.153, 0.038, 0.0048)
+
+
+def encode(latitude, longitude, precision=9):
+    """
+    Encodes a point into a geohash of the given length.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    geohash = []
+    bits = char = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            middle = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= middle:
+                char = char * 2 + 1
+                lon_range[0] = middle
+            else:
+                char = char * 2
+                lon_range[1] = middle
+        else:
+            middle = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= middle:
+                char = char * 2 + 1
+                lat_range[0] = middle
+            else:
+                char = char * 2
+                lat_range[1] = middle
+
+        even = not even
+        bits += 1
+        if bits == 5:
+            geohash.append(BASE32[char])
+            bits = char = 0
+
+    return ''.join(geohash)
+
+
+def bounding_box(geohash):
+    """
+    Returns the (min latitude, max latitude, min longitude, max longitude) of a geohash cell.
+    """
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+
+    for char in geohash:
+        value = BASE32.index(char)
+        for shift in range(4, -1, -1):
+            bit = (value >> shift) & 1
+            current_range = lon_range if even else lat_range
+            middle = (current_range[0] + current_range[1]) / 2
+            current_range[1 - bit] = middle
+            even = not even
+
+    return lat_range[0], lat_range[1], lon_range[0], lon_range[1]
+
+
+def cell_with_neighbours(geohash):
+    """
+    Returns a geohash cell together with the 8 cells around it.
+    """
+    lat_min, lat_max, lon_min, lon_max = bounding_box(geohash)
+    height, width = lat_max - lat_min, lon_max - lon_min
+    latitude, longitude = (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+    cells = set()
+    for lat_step in (-1, 0, 1):
+        for lon_step in (-1, 0, 1):
+            neighbour_lat = min(max(latitude + lat_step * height, -90.0), 90.0)
+            neighbour_lon = (longitude + lon_step * width + 180.0) % 360.0 - 180.0
+            cells.add(encode(neighbour_lat, neighbour_lon, len(geohash)))
+
+    return cells
+
+
+def precision_for_radius(radius_km, latitude):
+    """
+    Returns the longest geohash precision whose cells are not smaller than the radius at this latitude,
+    so a cell and its neighbours cover the whole circle.
+    """
+    shrink = max(math.cos(math.radians(latitude)), 0.01)
+    precision = 1
+    for index, (height, width) in enumerate(zip(CELL_HEIGHT_KM, CELL_WIDTH_KM), start=1):
+        if min(height, width * shrink) < radius_km:
+            break
+        precision = index
+
+    return precision
+
+
+def covering_cells(latitude, longitude, radius_km):
+    """
+    Returns the geohash prefixes that together cover a circle around a point.
+    """
+    precision = precision_for_radius(radius_km, latitude)
+    return cell_with_neighbours(encode(latitude, longitude, precision))
+
+
+def distance_km(lat1, lon1, lat2, lon2):
+    """
+    Returns the great-circle distance between two points with the haversine formula.
+    """
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
@@ -0,0 +1,333 @@
+from contextlib import ExitStack
+import io
+import json
+import random
+import statistics
+import tempfile
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings, setup_databases, teardown_databases, \
+    setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils import timezone
+
+from rest_framework.test import APIClient
+
+from PIL import Image
+
+from accounts.authentication import UserRefreshToken
+from accounts.otp import get_otp
+from ads.models import Ad, Category
+from ads.utils import unique_ad_slugs
+from payment.models import PackageAdToken
+from config.celery import app
+
+WORDS = ('phone', 'laptop', 'bike', 'sofa', 'camera', 'watch', 'table', 'guitar', 'car', 'book',
+         'گوشی', 'لپ تاپ', 'دوچرخه', 'مبل', 'دوربین', 'ساعت', 'میز', 'گیتار', 'ماشین', 'کتاب')
+CITIES = (('Tehran', 'Tehran', 35.6892, 51.3890), ('Isfahan', 'Isfahan', 32.6546, 51.6680),
+          ('Fars', 'Shiraz', 29.5918, 52.5837), ('Khorasan Razavi', 'Mashhad', 36.2605, 59.6168))
+
+
+class ZarinpalStub:
+    """
+    Answers the requests.post calls of payment.views like the Zarinpal sandbox, without the network.
+    """
+
+    class Response:
+        def __init__(self, data):
+            self.data = data
+
+        def json(self):
+            return self.data
+
+    def __call__(self, url, data=None, headers=None, **kwargs):
+        if url.endswith('PaymentVerification.json'):
+            return self.Response({'Status': 100, 'RefID': 1})
+
+        return self.Response({'Status': 100, 'Authority': 'A' + '0' * 35, 'errors': []})
+
+
+def jpeg_image(name='benchmark.jpg'):
+    buffer = io.BytesIO()
+    Image.new('RGB', (800, 600), (120, 160, 200)).save(buffer, format='JPEG')
+    return SimpleUploadedFile(name=name, content=buffer.getvalue(), content_type='image/jpeg')
+
+
+def summarize(latencies, queries):
+    result = {
+        'requests': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'queries_mean': round(statistics.fmean(queries), 2),
+        'queries_max': max(queries),
+    }
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        result['p50_ms'] = round(percentiles[49] * 1000, 2)
+        result['p95_ms'] = round(percentiles[94] * 1000, 2)
+
+    return result
+
+
+def find_regressions(results, baseline, max_regression):
+    """
+    Compares the scenarios of a run with a baseline run.
+
+    :param max_regression: Allowed increase of p95 latency, in percent. Queries per request may not increase.
+    :return: A list of the regressions, as text.
+    """
+    regressions = []
+    for name, result in results['scenarios'].items():
+        base = baseline.get('scenarios', {}).get(name)
+        if base is None:
+            continue
+
+        if result['queries_max'] > base['queries_max']:
+            regressions.append(f'{name}: {result["queries_max"]} queries per request, was {base["queries_max"]}')
+
+        if 'p95_ms' in result and 'p95_ms' in base and \
+                result['p95_ms'] > base['p95_ms'] * (1 + max_regression / 100):
+            regressions.append(f'{name}: p95 {result["p95_ms"]}ms, was {base["p95_ms"]}ms')
+
+    return regressions
+
+
+class Benchmark:
+    """
+    Seeds a database and runs the scenarios through the whole middleware and view stack with the test client.
+    Each scenario returns the response of its measured request.
+    """
+
+    def __init__(self, users_count, ads_count, sellers_count=50):
+        self.users_count = users_count
+        self.sellers_count = sellers_count
+        self.ads_count = ads_count
+        self.client = APIClient()
+
+    def seed(self):
+        user_model = get_user_model()
+        # The users of the iterations have no ads, so each creates its ad with the free quota.
+        self.users = [user_model.objects.create_user(phone=f'912{index:07d}') for index in range(self.users_count)]
+        sellers = [user_model.objects.create_user(phone=f'913{index:07d}') for index in range(self.sellers_count)]
+
+        self.categories = Category.objects.bulk_create([
+            Category(name=f'{word} {index}', slug=f'category-{index}') for index, word in enumerate(WORDS)
+        ])
+
+        titles = [f'{random.choice(WORDS)} {random.choice(WORDS)} {index}' for index in range(self.ads_count)]
+        ads = []
+        for title, slug in zip(titles, unique_ad_slugs(titles)):
+            province, city, latitude, longitude = random.choice(CITIES)
+            author = random.choice(sellers)
+            ad = Ad(
+                author=author, title=title, slug=slug, text=' '.join(random.choices(WORDS, k=40)),
+                price=random.randint(10_000, 100_000_000), image='ad_covers/benchmark.jpg',
+                status_product=random.choice(Ad.STATUS_CHOICES)[0], location=f'{city}, {province}',
+                province=province, city=city, latitude=latitude + random.uniform(-0.2, 0.2),
+                longitude=longitude + random.uniform(-0.2, 0.2), phone=author.phone_number, confirmation=True,
+            )
+            ad.set_computed_fields()
+            ad.expiration_date = timezone.now() + timezone.timedelta(days=30)
+            ads.append(ad)
+
+        self.ads = Ad.objects.bulk_create(ads)
+
+        AdCategory, AdSign = Ad.category.through, Ad.sign.through
+        AdCategory.objects.bulk_create([
+            AdCategory(ad_id=ad.pk, category_id=category.pk)
+            for ad in self.ads for category in random.sample(self.categories, 2)
+        ])
+        AdSign.objects.bulk_create([
+            AdSign(ad_id=ad.pk, customuser_id=user.pk)
+            for ad in random.sample(self.ads, len(self.ads) // 4) for user in random.sample(self.users, 3)
+        ], ignore_conflicts=True)
+
+        self.package = PackageAdToken.objects.create(
+            name='Benchmark package', description='Benchmark package', price=100_000, token_quantity=5,
+            confirmation=True,
+        )
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserRefreshToken.for_user(user).access_token}')
+
+    def anonymous(self):
+        self.client.credentials()
+
+    # scenarios, index is the number of the iteration and of its user
+
+    def ads_list(self, index):
+        self.anonymous()
+        return self.client.get(reverse('ads:ads_list_api'))
+
+    def search(self, index):
+        self.anonymous()
+        return self.client.post(reverse('ads:search_ads'), {'q': random.choice(WORDS)})
+
+    def ad_detail(self, index):
+        self.anonymous()
+        return self.client.get(reverse('ads:ad_detail_api', args=[random.choice(self.ads).pk]))
+
+    def create_ad(self, index):
+        user = self.users[index]
+        self.authenticate(user)
+        province, city, latitude, longitude = random.choice(CITIES)
+        data = {
+            'title': f'{random.choice(WORDS)} {index}',
+            'text': ' '.join(random.choices(WORDS, k=40)),
+            'image': jpeg_image(),
+            'status_product': 'like new',
+            'price': 2_500_000,
+            'phone': user.phone_number.as_e164,
+            'location': f'{city}, {province}',
+            'province': province,
+            'city': city,
+            'latitude': latitude,
+            'longitude': longitude,
+            'category': [category.name for category in random.sample(self.categories, 2)],
+        }
+        return self.client.post(reverse('ads:create_ad_api'), data, format='multipart')
+
+    def sign_toggle(self, index):
+        self.authenticate(self.users[index])
+        return self.client.get(reverse('ads:sign_ad_api', args=[random.choice(self.ads).pk]))
+
+    def login(self, index):
+        self.anonymous()
+        return self.client.post(reverse('accounts:login_api'), {'phone_number': self.users[index].phone_number.as_e164})
+
+    def check_code(self, index):
+        self.anonymous()
+        user = self.users[index]
+        code = get_otp(user).code
+        return self.client.post(reverse('accounts:check_code_api'), {'user_id': user.pk, 'code': code})
+
+    def order_registration(self, index):
+        self.authenticate(self.users[index])
+        data = {
+            'package': self.package.pk,
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': f'user{index}@example.com',
+            'phone': '9390125991',
+        }
+        return self.client.post(reverse('payment:order_registration'), data, format='json')
+
+    def checkout(self, index):
+        self.authenticate(self.users[index])
+        return self.client.get(reverse('payment:sandbox_process'))
+
+    def payment_callback(self, index):
+        self.authenticate(self.users[index])
+        return self.client.get(reverse('payment:sandbox_callback'), {'Status': 'OK', 'Authority': 'A' + '0' * 35})
+
+    # (name, method, expected status code). The scenarios of an iteration run in this order, the later
+    # ones depend on the earlier ones: check code needs the code sent by login, checkout needs the order.
+    SCENARIOS = (
+        ('ads list', ads_list, 200),
+        ('search', search, 200),
+        ('ad detail', ad_detail, 200),
+        ('create ad', create_ad, 201),
+        ('sign toggle', sign_toggle, 200),
+        ('login', login, 200),
+        ('check code', check_code, 200),
+        ('order registration', order_registration, 200),
+        ('checkout', checkout, 200),
+        ('payment callback', payment_callback, 200),
+    )
+
+    def run(self, iterations, warmup):
+        measurements = {name: ([], []) for name, scenario, expected_status in self.SCENARIOS}
+
+        for index in range(warmup + iterations):
+            for name, scenario, expected_status in self.SCENARIOS:
+                with CaptureQueriesContext(connection) as queries:
+                    start = time.perf_counter()
+                    response = scenario(self, index)
+                    elapsed = time.perf_counter() - start
+
+                if response.status_code != expected_status:
+                    raise CommandError(f'{name} returned {response.status_code}: {response.content[:500]!r}')
+
+                if index >= warmup:
+                    latencies, queries_counts = measurements[name]
+                    latencies.append(elapsed)
+                    queries_counts.append(len(queries))
+
+        return {name: summarize(*measurement) for name, measurement in measurements.items()}
+
+
+class Command(BaseCommand):
+    help = 'Seed a test database and measure the p50/p95 latency and queries per request of the hot paths of the ' \
+           'API: ads list, search, detail, create, sign, the login/OTP flow and the order and payment. ' \
+           'SMS and Zarinpal are replaced by local stubs. With --baseline, fails if a scenario regressed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests of each scenario')
+        parser.add_argument('--warmup', type=int, default=5, help='Requests of each scenario before measuring')
+        parser.add_argument('--ads', type=int, default=2000, help='Number of ads seeded')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the random data')
+        parser.add_argument('--output', help='Write the results to this file instead of stdout')
+        parser.add_argument('--baseline', help='Results of an earlier run to compare with')
+        parser.add_argument('--max-regression', type=float, default=20,
+                            help='Allowed increase of p95 latency over the baseline, in percent')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as baseline_file:
+                baseline = json.load(baseline_file)
+
+        random.seed(options['seed'])
+        iterations, warmup = options['iterations'], options['warmup']
+        benchmark = Benchmark(users_count=iterations + warmup, ads_count=options['ads'])
+
+        # The data is seeded in a test database and the images in a temporary directory, both are removed
+        # at the end. The cache is shared with the running site, its keys get a prefix of their own.
+        caches_settings = {alias: {**cache_settings, 'KEY_PREFIX': 'benchmark'}
+                           for alias, cache_settings in settings.CACHES.items()}
+
+        setup_test_environment()
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            with ExitStack() as stack:
+                media_root = stack.enter_context(tempfile.TemporaryDirectory())
+                stack.enter_context(override_settings(
+                    CACHES=caches_settings, DATABASE_REPLICAS=[], MEDIA_ROOT=media_root,
+                    SMS_PROVIDER='accounts.sms.LocmemSMSProvider',
+                    TOKEN_REVOCATION_BACKEND='accounts.revocation.LocmemRevocationList'))
+                stack.enter_context(mock.patch('payment.views.requests.post', ZarinpalStub()))
+                # Without a worker of the sms queue, the SMS tasks run in the request.
+                # The celery settings have no attribute to restore for mock.patch, the value is set back instead.
+                stack.callback(setattr, app.conf, 'task_always_eager', app.conf.task_always_eager)
+                app.conf.task_always_eager = True
+
+                benchmark.seed()
+                scenarios = benchmark.run(iterations, warmup)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        results = {
+            'iterations': iterations,
+            'warmup': warmup,
+            'ads': options['ads'],
+            'database': connection.vendor,
+            'scenarios': scenarios,
+        }
+
+        output = json.dumps(results, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = find_regressions(results, baseline, options['max_regression'])
+            if regressions:
+                raise CommandError('Regressions against the baseline:\n' + '\n'.join(regressions))
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import statistics
+import time
+from urllib.parse import urlsplit, urlencode
+
+from django.core.management.base import BaseCommand, CommandError
+
+from ads.models import Ad
+
+
+# (name, method, WSGI path, ASGI path, form data)
+ENDPOINTS = (
+    ('ads list', 'GET', '/ads/list/', '/ads/async/list/', None),
+    ('ad detail', 'GET', '/ads/{pk}/', '/ads/async/{pk}/', None),
+    ('search', 'POST', '/ads/search/', '/ads/async/search/', {'q': 'a'}),
+    ('categories', 'GET', '/ads/list/category/', '/ads/async/list/category/', None),
+    ('packages', 'GET', '/payment/package/list/', '/payment/async/package/list/', None),
+)
+
+
+async def send_request(host, port, method, path, data, slow_client_seconds):
+    """
+    Sends one HTTP/1.1 request on a new connection and reads the whole response.
+
+    A slow client sends the request line, then waits slow_client_seconds before the rest of the request,
+    like a client on a slow mobile network. A sync worker is held for the whole wait.
+
+    :return: The status code of the response.
+    """
+    body = urlencode(data).encode() if data else b''
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(f'{method} {path} HTTP/1.1\r\n'.encode())
+        await writer.drain()
+        if slow_client_seconds:
+            await asyncio.sleep(slow_client_seconds)
+
+        headers = f'Host: {host}\r\nConnection: close\r\nContent-Length: {len(body)}\r\n'
+        if body:
+            headers += 'Content-Type: application/x-www-form-urlencoded\r\n'
+        writer.write(headers.encode() + b'\r\n' + body)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        await reader.read()
+    finally:
+        writer.close()
+
+    return int(status_line.split()[1])
+
+
+async def load(base_url, method, path, data, concurrency, duration, slow_client_seconds):
+    """
+    Keeps concurrency connections busy with requests to a path for duration seconds.
+    """
+    url = urlsplit(base_url)
+    latencies, errors = [], 0
+    deadline = time.monotonic() + duration
+
+    async def client():
+        nonlocal errors
+        while time.monotonic() < deadline:
+            start = time.monotonic()
+            try:
+                status_code = await send_request(url.hostname, url.port or 80, method, path, data,
+                                                 slow_client_seconds)
+            except (OSError, IndexError, ValueError):
+                status_code = None
+
+            if status_code is not None and status_code < 500:
+                latencies.append(time.monotonic() - start)
+            else:
+                errors += 1
+
+    start = time.monotonic()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    elapsed = time.monotonic() - start
+
+    result = {
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+    }
+    if len(latencies) >= 2:
+        percentiles = statistics.quantiles(latencies, n=100)
+        result['p50_ms'] = round(percentiles[49] * 1000, 1)
+        result['p95_ms'] = round(percentiles[94] * 1000, 1)
+
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Compare the throughput of the read endpoints under WSGI and their async versions under ASGI, ' \
+           'with many concurrent connections. Start both servers first, e.g. ' \
+           'gunicorn config.wsgi -b :8000 -w 4 and uvicorn config.asgi:application --port 8001 --workers 4.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi', default='http://localhost:8000', help='Base url of the WSGI server')
+        parser.add_argument('--asgi', default='http://localhost:8001', help='Base url of the ASGI server')
+        parser.add_argument('--concurrency', type=int, default=50, help='Number of concurrent connections')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to load each endpoint')
+        parser.add_argument('--slow-client-ms', type=int, default=0,
+                            help='Delay of each client in the middle of sending its request')
+        parser.add_argument('--ad-pk', type=int, help='Ad used for the detail endpoint, the newest active ad '
+                                                      'by default')
+
+    def handle(self, *args, **options):
+        ad_pk = options['ad_pk']
+        if ad_pk is None:
+            ad_pk = Ad.active_objs.order_by('-datetime_modified').values_list('pk', flat=True).first()
+            if ad_pk is None:
+                raise CommandError('There is no active ad, send --ad-pk')
+
+        slow_client_seconds = options['slow_client_ms'] / 1000
+        results = {
+            'concurrency': options['concurrency'],
+            'duration': options['duration'],
+            'slow_client_ms': options['slow_client_ms'],
+            'endpoints': {},
+        }
+
+        for name, method, wsgi_path, asgi_path, data in ENDPOINTS:
+            results['endpoints'][name] = {}
+            for server, path in (('wsgi', wsgi_path), ('asgi', asgi_path)):
+                results['endpoints'][name][server] = asyncio.run(load(
+                    options[server], method, path.format(pk=ad_pk), data, options['concurrency'],
+                    options['duration'], slow_client_seconds,
+                ))
+
+        self.stdout.write(json.dumps(results, indent=2))
@@ -0,0 +1,96 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from phonenumber_field import serializerfields
+
+from accounts.backends import validate_ir_phone_number
+from accounts.phone import normalize_phone_number
+from accounts.serializers import LoginSerializer
+from ads.serializers import AdCreateOrUpdateSerializer
+
+
+def phone_numbers(count, seed):
+    """
+    :return: count distinct phone numbers, written like the users send them.
+    """
+    rng = random.Random(seed)
+    numbers = rng.sample(range(10 ** 7), count)
+    formats = ('0912{:07d}', '+98912{:07d}', '912{:07d}')
+    return [rng.choice(formats).format(number) for number in numbers]
+
+
+def login_path(field, validate):
+    """
+    The parsing of a login: the phone_number of LoginSerializer, then validate_ir_phone_number of the
+    authentication backend.
+    """
+    def login(phone_number):
+        phone_number = field.run_validation(phone_number)
+        validate(phone_number if isinstance(phone_number, str) else phone_number.as_e164)
+
+    return login
+
+
+def ad_create_path(field, user_phone_e164):
+    """
+    The parsing of an ad create: the phone of AdCreateOrUpdateSerializer, compared with the phone of the user.
+    """
+    def ad_create(phone_number):
+        return field.run_validation(phone_number) == user_phone_e164
+
+    return ad_create
+
+
+class Command(BaseCommand):
+    help = 'Measure the phone number parsing of the login and ad create paths, without and with the cache of ' \
+           'accounts.phone.normalize_phone_number.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--numbers', type=int, default=1000, help='Distinct phone numbers')
+        parser.add_argument('--repeat', type=int, default=20, help='Times each phone number is validated')
+        parser.add_argument('--seed', type=int, default=1, help='Seed of the random phone numbers')
+
+    def measure(self, func, numbers, repeat):
+        """
+        :return: The mean time of a call in microseconds.
+        """
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for phone_number in numbers:
+                func(phone_number)
+        return (time.perf_counter() - start) / (repeat * len(numbers)) * 10 ** 6
+
+    def handle(self, *args, **options):
+        numbers = phone_numbers(options['numbers'], options['seed'])
+        repeat = options['repeat']
+        user_phone_e164 = normalize_phone_number(numbers[0])[0]
+
+        # The fields of phonenumber_field parse every value, like the serializers before normalize_phone_number.
+        upstream_field = serializerfields.PhoneNumberField(region='IR')
+        paths = {
+            'login': (
+                login_path(upstream_field, lambda phone_number: normalize_phone_number.__wrapped__(phone_number)),
+                login_path(LoginSerializer().fields['phone_number'],
+                           lambda phone_number: validate_ir_phone_number(phone_number, None)),
+            ),
+            'ad create': (
+                ad_create_path(upstream_field, user_phone_e164),
+                ad_create_path(AdCreateOrUpdateSerializer().fields['phone'], user_phone_e164),
+            ),
+        }
+
+        self.stdout.write(f'{"path":<12}{"uncached us":>14}{"cold us":>12}{"warm us":>12}{"speedup":>10}')
+        for name, (upstream, cached) in paths.items():
+            upstream_us = self.measure(upstream, numbers, repeat)
+
+            normalize_phone_number.cache_clear()
+            cold_us = self.measure(cached, numbers, 1)
+            warm_us = self.measure(cached, numbers, repeat)
+
+            self.stdout.write(f'{name:<12}{upstream_us:>14.1f}{cold_us:>12.1f}{warm_us:>12.1f}'
+                              f'{upstream_us / warm_us:>9.1f}x')
+
+        info = normalize_phone_number.cache_info()
+        self.stdout.write(f'cache: {info.hits} hits, {info.misses} misses, {info.currsize}/{info.maxsize} numbers')
@@ -0,0 +1,335 @@
+from contextlib import contextmanager
+from itertools import accumulate
+import io
+import math
+import random
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.text import slugify
+
+from accounts.models import CodeVerify, AdTokenLedger
+from accounts.otp import uses_code_verify
+from ads.models import Ad, AdReport, Category
+from payment.models import Order, PackageAdToken, generate_short_uuid
+
+CATEGORIES = ('Mobile phones', 'Laptops', 'Cars', 'Motorcycles', 'Apartments', 'Furniture', 'Home appliances',
+              'Clothing', 'Bicycles', 'Musical instruments', 'Books', 'Cameras', 'Video games', 'Jobs', 'Services',
+              'موبایل', 'لپ تاپ', 'خودرو', 'موتورسیکلت', 'آپارتمان', 'مبلمان', 'لوازم خانگی', 'پوشاک', 'دوچرخه',
+              'آلات موسیقی', 'کتاب', 'دوربین', 'بازی ویدیویی', 'استخدام', 'خدمات')
+
+ITEMS = {
+    'en': ('iPhone 13', 'Samsung Galaxy A52', 'Dell XPS laptop', 'Peugeot 206', 'Pride 131', 'Honda motorcycle',
+           'mountain bike', 'leather sofa', 'dining table', 'LG refrigerator', 'washing machine', 'acoustic guitar',
+           'Canon camera', 'PlayStation 5', 'winter jacket', 'two bedroom apartment'),
+    'fa': ('گوشی آیفون ۱۳', 'سامسونگ گلکسی A52', 'لپ تاپ دل', 'پژو ۲۰۶', 'پراید ۱۳۱', 'موتور هوندا', 'دوچرخه کوهستان',
+           'مبل راحتی چرمی', 'میز ناهارخوری', 'یخچال ال جی', 'ماشین لباسشویی', 'گیتار آکوستیک', 'دوربین کانن',
+           'پلی استیشن ۵', 'کاپشن زمستانی', 'آپارتمان دو خوابه'),
+}
+ADJECTIVES = {
+    'en': ('clean', 'barely used', 'like new', 'urgent sale', 'with warranty', 'negotiable', 'original'),
+    'fa': ('تمیز', 'کم کار', 'در حد نو', 'فروش فوری', 'با گارانتی', 'قابل مذاکره', 'اصل'),
+}
+SENTENCES = {
+    'en': ('In perfect condition, no scratches.', 'Selling because I am moving.', 'Original box and charger.',
+           'Price is negotiable for serious buyers.', 'Only calls please, no messages.', 'Can be checked in person.',
+           'Used for less than a year.', 'Delivery is possible in the city.'),
+    'fa': ('در حد نو و بدون خط و خش.', 'به دلیل مهاجرت فروشی است.', 'کارتن و شارژر اصلی دارد.',
+           'برای خریدار واقعی قیمت توافقی است.', 'فقط تماس، پیام جواب داده نمی‌شود.', 'امکان بازدید حضوری هست.',
+           'کمتر از یک سال کار کرده.', 'امکان ارسال در سطح شهر هست.'),
+}
+FIRST_NAMES = ('Ali', 'Sara', 'Reza', 'Maryam', 'Hossein', 'Zahra', 'Mohammad', 'Fatemeh', 'Amir', 'Niloofar')
+LAST_NAMES = ('Ahmadi', 'Hosseini', 'Karimi', 'Rezaei', 'Moradi', 'Jafari', 'Sadeghi', 'Mohammadi', 'Rahimi')
+CITIES = (('Tehran', 'Tehran', 35.6892, 51.3890, 10), ('Isfahan', 'Isfahan', 32.6546, 51.6680, 3),
+          ('Razavi Khorasan', 'Mashhad', 36.2605, 59.6168, 4), ('Fars', 'Shiraz', 29.5918, 52.5837, 2),
+          ('East Azerbaijan', 'Tabriz', 38.0800, 46.2919, 2), ('Alborz', 'Karaj', 35.8400, 50.9391, 2),
+          ('Gilan', 'Rasht', 37.2808, 49.5832, 1), ('Khuzestan', 'Ahvaz', 31.3183, 48.6706, 1))
+REPORT_REASONS = ('Wrong price', 'Duplicate ad', 'Fraud', 'Wrong category', 'قیمت غیر واقعی', 'آگهی تکراری')
+
+# Seeded users get phone numbers of this range, so they do not clash with real ones.
+PHONE_PREFIX = '+98999'
+
+
+def poisson(mean):
+    """
+    A random number of events, for a mean of a few events (Knuth's method).
+    """
+    limit, count, product = math.exp(-mean), 0, random.random()
+    while product > limit:
+        count += 1
+        product *= random.random()
+    return count
+
+
+def zipf_cum_weights(count, skew):
+    """
+    Cumulative weights of random.choices where the n-th item has a weight of 1 / n ** skew,
+    so a few sellers post most of the ads, like on the site.
+    """
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(count)))
+
+
+def random_datetime(days):
+    return timezone.now() - timezone.timedelta(seconds=random.uniform(0, days * 24 * 60 * 60))
+
+
+@contextmanager
+def explicit_datetimes(*models):
+    """
+    Lets the generated values of auto_now and auto_now_add fields be saved, instead of the current time.
+    """
+    fields = [field for model in models for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)]
+    flags = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in flags:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def copy_value(value):
+    """
+    A value in the text format of PostgreSQL COPY.
+    """
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    return str(value).replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '\\r')
+
+
+class Loader:
+    """
+    Inserts rows with bulk_create, or with COPY on PostgreSQL. Neither runs save or the model signals,
+    the seed command fills what the signals would (slugs, CodeVerify rows, report counts).
+    """
+
+    def __init__(self, use_copy, batch_size):
+        self.use_copy = use_copy
+        self.batch_size = batch_size
+        self.counts = {}
+
+    def insert(self, model, objs):
+        """
+        :return: The objs, with their pks.
+        """
+        if objs:
+            if self.use_copy:
+                self.copy(model, objs)
+            else:
+                objs = model.objects.bulk_create(objs, batch_size=self.batch_size)
+
+            self.counts[model._meta.label] = self.counts.get(model._meta.label, 0) + len(objs)
+
+        return objs
+
+    def copy(self, model, objs):
+        fields = [field for field in model._meta.concrete_fields if field is not model._meta.pk]
+        buffer = io.StringIO()
+        for obj in objs:
+            buffer.write('\t'.join(copy_value(field.get_db_prep_save(getattr(obj, field.attname), connection))
+                                   for field in fields))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        quote_name = connection.ops.quote_name
+        columns = ', '.join(quote_name(field.column) for field in fields)
+        last_pk = model.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        with connection.cursor() as cursor:
+            cursor.copy_expert(f'COPY {quote_name(model._meta.db_table)} ({columns}) FROM STDIN', buffer)
+
+        # Rows copied in one statement get the next values of the sequence, in order.
+        pks = model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)
+        for obj, pk in zip(objs, pks):
+            obj.pk = pk
+
+
+class Command(BaseCommand):
+    help = 'Generate users, categories, ads in Persian and English, signs, reports and orders for load testing. ' \
+           'Rows are inserted in batches with bulk_create, or with COPY on PostgreSQL, without the model signals.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10_000, help='Number of users')
+        parser.add_argument('--ads', type=int, default=100_000, help='Number of ads')
+        parser.add_argument('--categories', type=int, default=len(CATEGORIES), help='Number of categories')
+        parser.add_argument('--seller-skew', type=float, default=0.8,
+                            help='Zipf exponent of the ads per user, higher means fewer sellers post more ads')
+        parser.add_argument('--persian', type=float, default=0.7, help='Share of ads written in Persian')
+        parser.add_argument('--signs', type=float, default=2, help='Mean number of signs of an ad')
+        parser.add_argument('--reports', type=float, default=0.05, help='Mean number of reports of an ad')
+        parser.add_argument('--orders', type=float, default=0.05, help='Share of users with an order')
+        parser.add_argument('--paid', type=float, default=0.7, help='Share of orders that are paid')
+        parser.add_argument('--unconfirmed', type=float, default=0.05, help='Share of ads waiting for confirmation')
+        parser.add_argument('--inactive', type=float, default=0.1, help='Share of ads deactivated by their author')
+        parser.add_argument('--days', type=int, default=25, help='Ads and users are created over this many days')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows generated and inserted at once')
+        parser.add_argument('--copy', action='store_true', help='Insert with COPY, only on PostgreSQL')
+        parser.add_argument('--seed', type=int, help='Seed of the random data, to generate the same data again')
+
+    def handle(self, *args, **options):
+        if options['copy'] and connection.vendor != 'postgresql':
+            raise CommandError('--copy needs PostgreSQL')
+
+        random.seed(options['seed'])
+        self.options = options
+        self.loader = Loader(options['copy'], options['batch_size'])
+        self.transactions = set()
+        start = time.perf_counter()
+
+        with explicit_datetimes(get_user_model(), Ad, AdReport, Order, AdTokenLedger):
+            self.categories = self.seed_categories(options['categories'])
+            self.packages = self.seed_packages()
+            self.user_pks = self.seed_users(options['users'])
+            self.seed_ads(options['ads'])
+
+        if connection.vendor == 'postgresql':
+            # Statistics of the planner, autovacuum would update them only later.
+            with connection.cursor() as cursor:
+                for model in (get_user_model(), CodeVerify, Ad, Ad.category.through, Ad.sign.through, AdReport,
+                              Order, AdTokenLedger):
+                    cursor.execute(f'ANALYZE {connection.ops.quote_name(model._meta.db_table)}')
+
+        elapsed = time.perf_counter() - start
+        for label, count in self.loader.counts.items():
+            self.stdout.write(f'{label}: {count} rows')
+        rows = sum(self.loader.counts.values())
+        self.stdout.write(self.style.SUCCESS(f'{rows} rows in {elapsed:.1f}s ({rows / elapsed:.0f} rows/s)'))
+
+    def seed_categories(self, count):
+        names = list(CATEGORIES[:count]) + [f'Category {index}' for index in range(len(CATEGORIES), count)]
+        existing = set(Category.objects.filter(name__in=names).values_list('name', flat=True))
+        self.loader.insert(Category, [
+            Category(name=name, slug=slugify(name, allow_unicode=True)) for name in names if name not in existing
+        ])
+        return list(Category.objects.filter(name__in=names).values_list('pk', flat=True))
+
+    def seed_packages(self):
+        if not PackageAdToken.active_objs.exists():
+            for quantity, price in ((5, 50_000), (10, 90_000), (25, 200_000)):
+                PackageAdToken.objects.create(name=f'{quantity} ad tokens', description=f'{quantity} ad tokens',
+                                              price=price, token_quantity=quantity, confirmation=True)
+
+        return list(PackageAdToken.active_objs.all())
+
+    def seed_users(self, count):
+        user_model = get_user_model()
+        first_number = user_model.objects.filter(phone_number__startswith=PHONE_PREFIX).count()
+        user_pks = []
+
+        for batch_start in range(0, count, self.options['batch_size']):
+            users, orders = [], []
+            batch_end = min(count, batch_start + self.options['batch_size'])
+            for number in range(first_number + batch_start, first_number + batch_end):
+                phone = f'{PHONE_PREFIX}{number:07d}'
+                user = user_model(username=phone, phone_number=phone, password=make_password(None),
+                                  date_joined=random_datetime(self.options['days']))
+                users.append(user)
+                if random.random() < self.options['orders']:
+                    orders.append((user, self.order(user)))
+
+            with transaction.atomic():
+                users = self.loader.insert(user_model, users)
+                # Done by the post_save receiver of accounts.signals for users created one by one.
+                if uses_code_verify():
+                    self.loader.insert(CodeVerify, [CodeVerify(user_id=user.pk) for user in users])
+
+                for user, order in orders:
+                    order.customer_id = order.created_by_id = user.pk
+                orders = self.loader.insert(Order, [order for user, order in orders])
+
+                ledger = [AdTokenLedger(user_id=order.customer_id, change=order.token_quantity, reason='purchase',
+                                        order_id=order.pk, datetime_created=order.datetime_paid)
+                          for order in orders if order.completed]
+                self.loader.insert(AdTokenLedger, ledger)
+
+            user_pks.extend(user.pk for user in users)
+
+        return user_pks
+
+    def order(self, user):
+        package = random.choice(self.packages)
+        ordered = max(user.date_joined, random_datetime(self.options['days']))
+        order = Order(package=package, first_name=random.choice(FIRST_NAMES), last_name=random.choice(LAST_NAMES),
+                      phone=user.phone_number, datetime_ordered=ordered)
+
+        # The short transaction ids of generate_short_uuid clash now and then among millions of orders.
+        while order.transaction in self.transactions:
+            order.transaction = generate_short_uuid()
+        self.transactions.add(order.transaction)
+
+        if random.random() < self.options['paid']:
+            order.completed = True
+            order.price, order.discount = package.price, package.discount
+            order.discount_price, order.token_quantity = package.discount_price, package.token_quantity
+            order.datetime_paid = ordered + timezone.timedelta(minutes=random.randint(1, 30))
+            # The balance is the sum of the ledger, see AdTokenLedger.
+            user.ad_token += package.token_quantity
+
+        return order
+
+    def seed_ads(self, count):
+        seller_weights = zipf_cum_weights(len(self.user_pks), self.options['seller_skew'])
+        category_weights = zipf_cum_weights(len(self.categories), 0.8)
+        city_weights = list(accumulate(city[4] for city in CITIES))
+        first_number = Ad.objects.count()
+
+        for batch_start in range(0, count, self.options['batch_size']):
+            batch_count = min(self.options['batch_size'], count - batch_start)
+            authors = random.choices(self.user_pks, cum_weights=seller_weights, k=batch_count)
+            ads, ads_categories, ads_signs, ads_reports = [], [], [], []
+
+            for index, author in enumerate(authors):
+                language = 'fa' if random.random() < self.options['persian'] else 'en'
+                title = f'{random.choice(ITEMS[language])} {random.choice(ADJECTIVES[language])}'
+                province, city, latitude, longitude, weight = random.choices(CITIES, cum_weights=city_weights)[0]
+                created = random_datetime(self.options['days'])
+                reporters = random.sample(self.user_pks, min(poisson(self.options['reports']), len(self.user_pks)))
+
+                ad = Ad(
+                    author_id=author, title=title, text=' '.join(random.sample(SENTENCES[language], 3)),
+                    # The slug signal makes slugs unique with a query per ad, the number of the ad does it here.
+                    slug=f'{slugify(title, allow_unicode=True)}-{first_number + batch_start + index}',
+                    price=min(max(int(round(random.lognormvariate(16, 1.5), -3)), 10_000), 99_999_999_999),
+                    image='ad_covers/seed.jpg', status_product=random.choice(Ad.STATUS_CHOICES)[0],
+                    location=f'{city}, {province}', province=province, city=city,
+                    latitude=latitude + random.uniform(-0.15, 0.15), longitude=longitude + random.uniform(-0.15, 0.15),
+                    phone=f'{PHONE_PREFIX}{random.randint(0, 9_999_999):07d}',
+                    active=random.random() >= self.options['inactive'],
+                    confirmation=random.random() >= self.options['unconfirmed'],
+                    count_reports=len(reporters), is_block=len(reporters) >= settings.MIN_REPORTS_TO_BLOCK_AD,
+                    view_count=int(random.lognormvariate(3, 1.2)),
+                    datetime_created=created, datetime_modified=created,
+                )
+                ad.set_computed_fields()
+                ad.expiration_date = created + timezone.timedelta(days=30)
+                ads.append(ad)
+
+                ads_categories.append(set(random.choices(self.categories, cum_weights=category_weights,
+                                                         k=random.randint(1, 2))))
+                ads_signs.append(random.sample(self.user_pks, min(poisson(self.options['signs']), len(self.user_pks))))
+                ads_reports.append(reporters)
+
+            AdCategory, AdSign = Ad.category.through, Ad.sign.through
+            with transaction.atomic():
+                ads = self.loader.insert(Ad, ads)
+                self.loader.insert(AdCategory, [AdCategory(ad_id=ad.pk, category_id=category_pk)
+                                                for ad, categories in zip(ads, ads_categories)
+                                                for category_pk in categories])
+                self.loader.insert(AdSign, [AdSign(ad_id=ad.pk, customuser_id=user_pk)
+                                            for ad, signs in zip(ads, ads_signs) for user_pk in signs])
+                self.loader.insert(AdReport, [
+                    AdReport(ad_id=ad.pk, user_id=user_pk, report_reason=random.choice(REPORT_REASONS),
+                             datetime_reported=min(timezone.now(), ad.datetime_created + timezone.timedelta(
+                                 hours=random.randint(1, 48))))
+                    for ad, reports in zip(ads, ads_reports) for user_pk in reports
+                ])
+
+            self.stdout.write(f'{batch_start + batch_count}/{count} ads')
@@ -5,6 +5,8 @@ from django.core.validators import MaxValueValidator, MinValueValidator
 
 from phonenumber_field.modelfields import PhoneNumberField
 
+from .geo import encode
+
 
 class Category(models.Model):
     """
@@ -27,6 +29,11 @@ class ActiveAdsManger(models.Manager):
                                              expiration_date__gt=timezone.now(), is_delete=False)
 
 
+class PendingAdsManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(confirmation=False, is_delete=False)
+
+
 class Ad(models.Model):
     """
         Represents an advertisement.
@@ -61,6 +68,15 @@ class Ad(models.Model):
     image = models.ImageField(upload_to='ad_covers/', verbose_name='image')
     status_product = models.CharField(max_length=30, choices=STATUS_CHOICES, verbose_name='status product')
     location = models.TextField(verbose_name='location')
+
+    # structured location, geohash is computed from latitude and longitude on save
+    province = models.CharField(max_length=100, blank=True, db_index=True, verbose_name='province')
+    city = models.CharField(max_length=100, blank=True, db_index=True, verbose_name='city')
+    latitude = models.FloatField(null=True, blank=True, verbose_name='latitude',
+                                 validators=(MinValueValidator(-90), MaxValueValidator(90)))
+    longitude = models.FloatField(null=True, blank=True, verbose_name='longitude',
+                                  validators=(MinValueValidator(-180), MaxValueValidator(180)))
+    geohash = models.CharField(max_length=12, blank=True, db_index=True, editable=False, verbose_name='geohash')
     phone = PhoneNumberField(region='IR', verbose_name='phone')
     slug = models.SlugField(allow_unicode=True, blank=True, verbose_name='slug')
 
@@ -78,6 +94,9 @@ class Ad(models.Model):
     is_block = models.BooleanField(default=False, blank=True, verbose_name='is block')
     count_reports = models.PositiveIntegerField(default=0, blank=True, verbose_name='count reports')
 
+    # Updated in batches by ads.tasks.flush_ad_views from the counters kept in the cache.
+    view_count = models.PositiveBigIntegerField(default=0, blank=True, verbose_name='view count')
+
     # soft-delete fields
     expiration_date = models.DateTimeField(null=True, verbose_name='expiration date')
     is_delete = models.BooleanField(default=False, verbose_name='is delete')
@@ -85,16 +104,41 @@ class Ad(models.Model):
                                    verbose_name='delete with')
     datetime_deleted = models.DateTimeField(null=True, blank=True, verbose_name='datetime deleted')
 
+    # moderation lease, so two staff members do not review the same ad
+    claimed_by = models.ForeignKey(get_user_model(), on_delete=models.SET_NULL, related_name='claimed_ads', null=True,
+                                   blank=True, verbose_name='claimed by')
+    claim_expires = models.DateTimeField(null=True, blank=True, verbose_name='claim expires')
+
     objects = models.Manager()
     active_objs = ActiveAdsManger()
+    pending_objs = PendingAdsManager()
+
+    class Meta:
+        indexes = (
+            # Moderation queue: unconfirmed ads that are not deleted, oldest first.
+            models.Index(fields=('datetime_modified', 'id'), condition=models.Q(confirmation=False, is_delete=False),
+                         name='ad_moderation_queue_idx'),
+            # Free ads quota of a user: CustomUser.free_ad_quota.
+            models.Index(fields=('author', 'is_use_ad_token', 'datetime_created'), name='ad_author_free_quota_idx'),
+        )
 
     def __str__(self):
         return self.title
 
-    def save(self, *args, **kwargs):
+    def set_computed_fields(self):
+        """
+        Fill the fields computed on save. bulk_create does not call save, so it calls this for each ad.
+        """
         if not self.pk:
             self.expiration_date = timezone.now() + timezone.timedelta(minutes=10)
 
+        if self.latitude is not None and self.longitude is not None:
+            self.geohash = encode(self.latitude, self.longitude)
+        else:
+            self.geohash = ''
+
+    def save(self, *args, **kwargs):
+        self.set_computed_fields()
         super().save(*args, **kwargs)
 
     def soft_delete(self, reason):
@@ -116,3 +160,41 @@ class AdReport(models.Model):
 
     class Meta:
         unique_together = ['ad', 'user']
+
+
+class TrendingAd(models.Model):
+    """
+        A precomputed position of an ad in the trending feed.
+
+        Rows are rebuilt by ads.tasks.compute_trending_ads. A null category holds the feed over all categories.
+    """
+
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='trending_ads', null=True,
+                                 blank=True, verbose_name='category')
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='trending_positions', verbose_name='ad')
+    rank = models.PositiveIntegerField(verbose_name='rank')
+    score = models.FloatField(verbose_name='score')
+    datetime_computed = models.DateTimeField(verbose_name='datetime computed')
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('category', 'rank'), name='trending_category_rank_idx'),
+        )
+        ordering = ('rank', )
+
+
+class SimilarAd(models.Model):
+    """
+        A precomputed neighbour of an ad, rebuilt every night by ads.tasks.compute_similar_ads.
+    """
+
+    ad = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='similar_ads', verbose_name='ad')
+    similar = models.ForeignKey(Ad, on_delete=models.CASCADE, related_name='+', verbose_name='similar')
+    rank = models.PositiveIntegerField(verbose_name='rank')
+    score = models.FloatField(verbose_name='score')
+
+    class Meta:
+        indexes = (
+            models.Index(fields=('ad', 'rank'), name='similar_ad_rank_idx'),
+        )
+        ordering = ('rank', )
@@ -3,4 +3,4 @@ from rest_framework.permissions import BasePermission
 
 class IsAdOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.author == request.user
+        return obj.author_id == request.user.pk
@@ -1,6 +1,9 @@
+from django.conf import settings
+from django.db import models
+
 from rest_framework import serializers
 
-from phonenumber_field.serializerfields import PhoneNumberField
+from accounts.phone import PhoneNumberField
 
 from .models import Ad, Category, AdReport
 
@@ -17,7 +20,7 @@ class AdListSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Ad
-        fields = ('id', 'author', 'title', 'image', 'status_product', 'price', 'location',
+        fields = ('id', 'author', 'title', 'image', 'status_product', 'price', 'location', 'province', 'city',
                   'category', 'slug', 'datetime_modified')
 
 
@@ -25,6 +28,25 @@ class SearchSerializer(serializers.Serializer):
     q = serializers.CharField(required=True)
 
 
+class NearSerializer(serializers.Serializer):
+    near = serializers.RegexField(r'^-?\d+(\.\d+)?,-?\d+(\.\d+)?$', required=True,
+                                  error_messages={'invalid': 'Send near like this near=lat,lon'})
+    radius = serializers.FloatField(min_value=0.1, required=False)
+
+    def validate_near(self, value):
+        latitude, longitude = map(float, value.split(','))
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise serializers.ValidationError('Invalid latitude or longitude.')
+
+        return latitude, longitude
+
+    def validate_radius(self, value):
+        if value > settings.GEO_MAX_RADIUS_KM:
+            raise serializers.ValidationError(f'radius must be at most {settings.GEO_MAX_RADIUS_KM} km.')
+
+        return value
+
+
 class AdDetailSerializer(serializers.ModelSerializer):
     category = CategorySerializer(many=True, required=False, read_only=True)
     author = serializers.ReadOnlyField(source='author.username')
@@ -32,7 +54,50 @@ class AdDetailSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ad
         fields = ('id', 'author', 'title', 'text', 'image', 'status_product', 'price',
-                  'phone', 'location', 'category', 'sign', 'datetime_modified')
+                  'phone', 'location', 'province', 'city', 'latitude', 'longitude', 'category', 'sign', 'view_count',
+                  'datetime_modified')
+
+
+class ModerationAdSerializer(serializers.ModelSerializer):
+    category = CategorySerializer(many=True, required=False, read_only=True)
+    author = serializers.ReadOnlyField(source='author.username')
+    claimed_by = serializers.ReadOnlyField(source='claimed_by.username')
+
+    class Meta:
+        model = Ad
+        fields = ('id', 'author', 'title', 'text', 'image', 'status_product', 'price', 'phone', 'location',
+                  'province', 'city', 'category', 'count_reports', 'datetime_modified', 'claimed_by', 'claim_expires')
+
+
+class ModerationClaimSerializer(serializers.Serializer):
+    count = serializers.IntegerField(min_value=1, max_value=settings.MODERATION_MAX_CLAIM, required=False)
+
+
+class ModerationDecisionSerializer(serializers.Serializer):
+    DECISION_CHOICES = (
+        ('confirm', 'Confirm'),
+        ('reject', 'Reject'),
+    )
+
+    ads = serializers.ListField(child=serializers.IntegerField(), allow_empty=False)
+    decision = serializers.ChoiceField(choices=DECISION_CHOICES)
+
+
+class BulkCreateAdSerializer(serializers.Serializer):
+    """
+    The ads are sent as a JSON list in the 'ads' field of a multipart form,
+    the image of the ad at index i is sent in the 'image_<i>' field.
+    """
+    ads = serializers.JSONField(binary=True)
+
+    def validate_ads(self, value):
+        if not isinstance(value, list) or not value or not all(isinstance(item, dict) for item in value):
+            raise serializers.ValidationError('Send ads as a non-empty list of objects.')
+
+        if len(value) > settings.BULK_CREATE_ADS_MAX:
+            raise serializers.ValidationError(f'Send at most {settings.BULK_CREATE_ADS_MAX} ads at once.')
+
+        return value
 
 
 class AdReportSerializer(serializers.ModelSerializer):
@@ -88,7 +153,14 @@ class AdCreateOrUpdateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Ad
         fields = ('title', 'text', 'image', 'status_product', 'price', 'phone',
-                  'location', 'category', 'active')
+                  'location', 'province', 'city', 'latitude', 'longitude', 'category', 'active')
+
+    def validate_category(self, value):
+        # A primary key out of the range of the column is an error of the database, not a missing category.
+        for identifier in value:
+            if identifier.isdecimal() and models.BigIntegerField.MAX_BIGINT < int(identifier):
+                raise serializers.ValidationError(f'Invalid value({identifier}).')
+        return value
 
     def validate_status_product(self, value):
         value = value.lower()
@@ -97,6 +169,14 @@ class AdCreateOrUpdateSerializer(serializers.ModelSerializer):
         else:
             raise serializers.ValidationError('Invalid status product value.')
 
+    def validate(self, attrs):
+        latitude = attrs.get('latitude', getattr(self.instance, 'latitude', None))
+        longitude = attrs.get('longitude', getattr(self.instance, 'longitude', None))
+        if (latitude is None) != (longitude is None):
+            raise serializers.ValidationError({'location': 'Send both latitude and longitude.'})
+
+        return attrs
+
     def create(self, validated_data):
         categories_list = []
         try:
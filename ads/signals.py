@@ -1,10 +1,18 @@
 import random
 
-from django.db.models.signals import pre_save
-from django.dispatch import receiver
+from django.db import transaction
+from django.db.models import Q
+from django.db.models.signals import pre_save, post_save
+from django.dispatch import receiver, Signal
 from django.utils.text import slugify
 
-from .models import Category, Ad
+from accounts.models import record_free_ad
+
+from .models import Category, Ad, TrendingAd, SimilarAd
+
+# Sent once for a batch of ads changed with a single UPDATE, which skips the model signals.
+# Receivers get the pks of the ads and the updated fields.
+ads_bulk_updated = Signal()
 
 
 @receiver(pre_save, sender=Category)
@@ -19,6 +27,31 @@ def create_slug_ad(sender, instance, *args, **kwargs):
         instance.slug = create_unique_slug(instance, instance.title)
 
 
+@receiver(post_save, sender=Ad)
+def count_free_ad(sender, instance, created, *args, **kwargs):
+    # Counted once the ad is committed, a creation that is rolled back is not counted.
+    if created and not instance.is_use_ad_token:
+        author_pk = instance.author_id
+        transaction.on_commit(lambda: record_free_ad(author_pk))
+
+
+# The values of the updated fields that take an ad out of Ad.active_objs.
+DEACTIVATING_FIELDS = {'is_delete': True, 'is_block': True, 'active': False, 'confirmation': False}
+
+
+@receiver(ads_bulk_updated, sender=Ad)
+def remove_inactive_ads_from_feeds(sender, pks, fields, **kwargs):
+    """
+    Removes the ads a batch deactivated from the trending feeds and the similar ads until they are computed again,
+    the pages of the feeds do not keep slots for them.
+    """
+    if not any(field in fields and fields[field] == value for field, value in DEACTIVATING_FIELDS.items()):
+        return
+
+    TrendingAd.objects.filter(ad__in=pks).delete()
+    SimilarAd.objects.filter(Q(ad__in=pks) | Q(similar__in=pks)).delete()
+
+
 def create_unique_slug(instance, create_by, slug_primitive=None):
     if slug_primitive is None:
         slug = slugify(create_by, allow_unicode=True)
@@ -0,0 +1,120 @@
+import re
+import unicodedata
+
+import numpy as np
+from scipy import sparse
+
+# Unify Arabic and Persian forms of the same letters and digits, and split words on zero-width non-joiners.
+CHARACTERS_MAP = str.maketrans({
+    'ي': 'ی',
+    'ى': 'ی',
+    'ك': 'ک',
+    'ة': 'ه',
+    'ۀ': 'ه',
+    '‌': ' ',
+    **{digit: str(number) for number, digit in enumerate('۰۱۲۳۴۵۶۷۸۹')},
+    **{digit: str(number) for number, digit in enumerate('٠١٢٣٤٥٦٧٨٩')},
+})
+
+WORD_RE = re.compile(r'\w+')
+
+# Words in fewer ads than this are kept whatever max_document_frequency is, small sets keep their shared words.
+FREQUENT_WORD_MIN_ADS = 100
+
+
+def normalize_text(text):
+    """
+    Splits a Persian or English text into lowercase words without diacritics.
+    Words of a single character are dropped.
+    """
+    text = unicodedata.normalize('NFKC', text).translate(CHARACTERS_MAP).lower()
+    text = ''.join(char for char in text if unicodedata.category(char) != 'Mn')
+    return [word for word in WORD_RE.findall(text) if len(word) > 1]
+
+
+def ad_words(title, text):
+    # Words of the title are counted twice, they describe the product better than the text.
+    title_words = normalize_text(title)
+    return title_words + title_words + normalize_text(text)
+
+
+def normalize_rows(matrix):
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return (sparse.diags(1 / norms) @ matrix).tocsr()
+
+
+def build_vectors(documents, categories, category_weight, max_document_frequency=1.0):
+    """
+    Builds one L2-normalized sparse row per ad: TF-IDF over its words followed by its categories one-hot.
+
+    Args:
+        documents (list): List of word lists, one per ad.
+        categories (list): List of category pk lists, one per ad.
+        category_weight (float): Weight of the categories part against the words part.
+        max_document_frequency (float): Words in more than this part of the ads are dropped, like stop words.
+            They say little about an ad and every pair of ads that share one is a similarity to compute.
+    """
+    vocabulary = {}
+    rows, columns = [], []
+    for row, words in enumerate(documents):
+        for word in words:
+            rows.append(row)
+            columns.append(vocabulary.setdefault(word, len(vocabulary)))
+
+    count_ads = len(documents)
+    counts = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(count_ads, len(vocabulary)))
+    counts.sum_duplicates()
+
+    document_frequency = np.bincount(counts.indices, minlength=len(vocabulary))
+    kept = document_frequency <= max(max_document_frequency * count_ads, FREQUENT_WORD_MIN_ADS)
+    counts, document_frequency = counts[:, kept], document_frequency[kept]
+
+    idf = np.log((1 + count_ads) / (1 + document_frequency)) + 1
+    counts.data = 1 + np.log(counts.data)
+    words_part = normalize_rows(counts @ sparse.diags(idf))
+
+    category_columns = {}
+    rows, columns = [], []
+    for row, category_pks in enumerate(categories):
+        for pk in category_pks:
+            rows.append(row)
+            columns.append(category_columns.setdefault(pk, len(category_columns)))
+
+    one_hot = sparse.csr_matrix((np.ones(len(rows)), (rows, columns)), shape=(count_ads, len(category_columns)))
+    categories_part = normalize_rows(one_hot) * category_weight
+
+    return normalize_rows(sparse.hstack([words_part, categories_part]))
+
+
+def nearest_neighbours(vectors, prices, count, price_sigma, chunk_size):
+    """
+    Yields the `count` most similar rows of every row of `vectors` as (row, [(neighbour_row, score), ...]).
+
+    The score is the cosine similarity of two rows, reduced by the distance between their log prices.
+    Similarities are computed for `chunk_size` rows at a time, a chunk holds one similarity for each pair of
+    a row of the chunk and an ad that shares a word or a category with it: up to chunk_size x N, fewer with the
+    frequent words dropped by build_vectors. Only the `count` best of each row are kept after the chunk.
+    """
+    log_prices = np.log(np.asarray(prices, dtype=float))
+    transposed = vectors.T.tocsr()
+
+    for start in range(0, vectors.shape[0], chunk_size):
+        similarities = (vectors[start:start + chunk_size] @ transposed).tocsr()
+
+        for offset in range(similarities.shape[0]):
+            row = start + offset
+            begin, end = similarities.indptr[offset], similarities.indptr[offset + 1]
+            neighbours = similarities.indices[begin:end]
+            scores = similarities.data[begin:end].copy()
+
+            not_self = neighbours != row
+            neighbours, scores = neighbours[not_self], scores[not_self]
+            scores *= np.exp(-(log_prices[neighbours] - log_prices[row]) ** 2 / (2 * price_sigma ** 2))
+
+            if len(scores) > count:
+                top = np.argpartition(-scores, count)[:count]
+                neighbours, scores = neighbours[top], scores[top]
+
+            order = np.argsort(-scores, kind='stable')
+            yield row, [(int(neighbours[i]), float(scores[i])) for i in order if scores[i] > 0]
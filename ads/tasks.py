@@ -1,18 +1,155 @@
+from collections import defaultdict
+import heapq
+
+from django.db import transaction
+from django.db.models import F, Case, When, Value, Count
 from django.utils import timezone
 from django.conf import settings
 
 from config.celery import app
 
-from .models import Ad
+from .models import Ad, TrendingAd, SimilarAd
+from .similarity import ad_words, build_vectors, nearest_neighbours
+from .counters import pop_dirty_ads, pop_pending_views, restore_pending_views
 
 
 @app.task
 def check_expiration_date_every_day():
     ads = Ad.objects.filter(expiration_date__lt=timezone.now(), is_delete=False)
-    ads.update(is_delete=True, delete_with='expired', datetime_deleted=timezone.now())
+    return ads.update(is_delete=True, delete_with='expired', datetime_deleted=timezone.now())
 
 
 @app.task
 def check_reports_of_ads():
     ads = Ad.objects.filter(count_reports__gte=settings.MIN_REPORTS_TO_BLOCK_AD, is_delete=False)
-    ads.update(is_block=True)
+    return ads.update(is_block=True)
+
+
+@app.task
+def flush_ad_views():
+    """
+    Moves the view counters kept in the cache to Ad.view_count, with one UPDATE per batch of ads.
+
+    Only the ads marked dirty by record_view since the last flush are read, deleted ads too. If a batch fails,
+    its views and ads are given back to the cache for the next flush.
+
+    :return: The number of updated ads.
+    """
+    batch_size = settings.AD_VIEW_FLUSH_BATCH_SIZE
+
+    updated = 0
+    while True:
+        batch = pop_dirty_ads(batch_size)
+        if not batch:
+            break
+
+        pending = {}
+        try:
+            pending = pop_pending_views(batch)
+            updated += update_view_counts(pending)
+        except Exception:
+            restore_pending_views(batch, pending)
+            raise
+
+    return updated
+
+
+def update_view_counts(pending):
+    if not pending:
+        return 0
+
+    increments = Case(
+        *[When(pk=pk, then=Value(count)) for pk, count in pending.items()],
+        default=Value(0),
+        output_field=Ad._meta.get_field('view_count'),
+    )
+    return Ad.objects.filter(pk__in=pending.keys()).update(view_count=F('view_count') + increments)
+
+
+def trending_score(views, signs, datetime_created, now):
+    """
+    Scores an ad by its views and signs, decayed by its age in hours.
+    """
+    age_hours = (now - datetime_created).total_seconds() / 3600
+    return (views + signs * settings.TRENDING_SIGN_WEIGHT) / (age_hours + 2) ** settings.TRENDING_GRAVITY
+
+
+@app.task
+def compute_trending_ads():
+    """
+    Rebuilds the trending feed of every category, and the feed over all categories, from the active ads.
+
+    :return: The number of rows in the feeds.
+    """
+    now = timezone.now()
+    size = settings.TRENDING_ADS_SIZE
+
+    active_ads = Ad.active_objs.annotate(count_signs=Count('sign')).values_list(
+        'pk', 'view_count', 'count_signs', 'datetime_created')
+    scores = {
+        pk: trending_score(views, signs, datetime_created, now)
+        for pk, views, signs, datetime_created in active_ads.iterator()
+    }
+
+    ads_of_category = defaultdict(list)
+    ads_of_category[None] = list(scores)
+    categories = Ad.category.through.objects.filter(ad__in=Ad.active_objs.all()).values_list('ad_id', 'category_id')
+    for ad_id, category_id in categories.iterator():
+        if ad_id in scores:
+            ads_of_category[category_id].append(ad_id)
+
+    trending_ads = []
+    for category_id, ad_ids in ads_of_category.items():
+        top_ads = heapq.nlargest(size, ad_ids, key=scores.__getitem__)
+        trending_ads.extend(
+            TrendingAd(category_id=category_id, ad_id=ad_id, rank=rank, score=scores[ad_id], datetime_computed=now)
+            for rank, ad_id in enumerate(top_ads, start=1)
+        )
+
+    with transaction.atomic():
+        TrendingAd.objects.all().delete()
+        TrendingAd.objects.bulk_create(trending_ads, batch_size=1000)
+
+    return len(trending_ads)
+
+
+@app.task
+def compute_similar_ads():
+    """
+    Rebuilds the similar ads of every active ad from its words, categories and price.
+
+    :return: The number of similar ads stored.
+    """
+    ads = list(Ad.active_objs.values_list('pk', 'title', 'text', 'price').order_by('pk'))
+    if not ads:
+        SimilarAd.objects.all().delete()
+        return 0
+
+    categories = defaultdict(list)
+    through = Ad.category.through.objects.filter(ad__in=Ad.active_objs.all()).values_list('ad_id', 'category_id')
+    for ad_id, category_id in through.iterator():
+        categories[ad_id].append(category_id)
+
+    vectors = build_vectors(
+        [ad_words(title, text) for pk, title, text, price in ads],
+        [categories[pk] for pk, title, text, price in ads],
+        settings.SIMILAR_ADS_CATEGORY_WEIGHT,
+        settings.SIMILAR_ADS_MAX_WORD_FREQUENCY,
+    )
+    neighbours = nearest_neighbours(
+        vectors, [price for pk, title, text, price in ads], settings.SIMILAR_ADS_COUNT,
+        settings.SIMILAR_ADS_PRICE_SIGMA, settings.SIMILAR_ADS_CHUNK_SIZE,
+    )
+
+    similar_ads = []
+    for row, similar_rows in neighbours:
+        similar_ads.extend(
+            SimilarAd(ad_id=ads[row][0], similar_id=ads[similar_row][0], rank=rank, score=score)
+            for rank, (similar_row, score) in enumerate(similar_rows, start=1)
+        )
+
+    with transaction.atomic():
+        SimilarAd.objects.all().delete()
+        SimilarAd.objects.bulk_create(similar_ads, batch_size=1000)
+
+    return len(similar_ads)
@@ -0,0 +1,113 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext
+from django.contrib.auth import get_user_model
+
+from accounts.models import free_ad_quota_keys
+from ads.models import Ad, AdReport, TrendingAd, SimilarAd
+from ads.signals import ads_bulk_updated
+
+
+class AdsAdminBulkActionsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = get_user_model().objects.create_superuser(username='superuser', password='admin')
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+        cls.user2 = get_user_model().objects.create_user(phone='9359048320')
+
+        cls.ads = [
+            Ad.objects.create(
+                author=cls.user1,
+                title=f'Ad {number}',
+                text='this ad create for test',
+                image='ad_image_1.jpg',
+                status_product='new',
+                phone='9351212121',
+                price=10_000,
+                location='Test Location 1',
+            )
+            for number in range(3)
+        ]
+
+    def setUp(self):
+        self.client.post('/admin/login/', {'username': 'superuser', 'password': 'admin'})
+        self.batches = []
+        ads_bulk_updated.connect(self.receive_batch)
+
+    def tearDown(self):
+        ads_bulk_updated.disconnect(self.receive_batch)
+
+    def receive_batch(self, sender, pks, fields, **kwargs):
+        self.batches.append(sorted(pks))
+
+    def run_action(self, action, ads):
+        with CaptureQueriesContext(connection) as queries, self.captureOnCommitCallbacks(execute=True):
+            self.client.post('/admin/ads/ad/', {
+                'action': action,
+                '_selected_action': [ad.pk for ad in ads],
+            })
+
+        return [query['sql'] for query in queries if query['sql'].startswith('UPDATE "ads_ad"')]
+
+    def test_soft_delete_selected(self):
+        updates = self.run_action('soft_delete_selected', self.ads[:2])
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.batches, [[self.ads[0].pk, self.ads[1].pk]])
+        self.assertEqual(Ad.objects.filter(is_delete=True, delete_with='staff').count(), 2)
+        self.assertIsNotNone(Ad.objects.get(pk=self.ads[0].pk).datetime_deleted)
+        self.assertFalse(Ad.objects.get(pk=self.ads[2].pk).is_delete)
+
+    def test_confirm_and_unconfirm_selected(self):
+        updates = self.run_action('confirm_selected', self.ads)
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Ad.objects.filter(confirmation=True).count(), 3)
+
+        self.run_action('unconfirm_selected', self.ads[:1])
+        self.assertEqual(Ad.objects.filter(confirmation=True).count(), 2)
+        self.assertEqual(len(self.batches), 2)
+
+    def test_block_and_unblock_selected(self):
+        for ad in self.ads:
+            AdReport.objects.create(ad=ad, user=self.user2, report_reason='spam')
+        Ad.objects.update(count_reports=1)
+
+        self.run_action('block_selected', self.ads)
+        self.assertEqual(Ad.objects.filter(is_block=True).count(), 3)
+
+        updates = self.run_action('unblock_selected', self.ads[:2])
+
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(Ad.objects.filter(is_block=True).count(), 1)
+        self.assertEqual(Ad.objects.get(pk=self.ads[0].pk).count_reports, 0)
+        self.assertEqual(AdReport.objects.filter(investigated=True).count(), 2)
+        self.assertFalse(AdReport.objects.get(ad=self.ads[2]).investigated)
+
+    def test_deactivated_ads_leave_feeds(self):
+        now = timezone.now()
+        TrendingAd.objects.bulk_create(
+            TrendingAd(ad=ad, rank=rank, score=1, datetime_computed=now) for rank, ad in enumerate(self.ads, start=1)
+        )
+        SimilarAd.objects.create(ad=self.ads[2], similar=self.ads[0], rank=1, score=1)
+        SimilarAd.objects.create(ad=self.ads[2], similar=self.ads[1], rank=2, score=1)
+
+        # an update that keeps the ads active does not touch the feeds
+        self.run_action('confirm_selected', self.ads[:1])
+        self.assertEqual(TrendingAd.objects.count(), 3)
+
+        self.run_action('block_selected', self.ads[:1])
+        self.assertQuerysetEqual(TrendingAd.objects.order_by('rank').values_list('ad', flat=True),
+                                 [self.ads[1].pk, self.ads[2].pk])
+        self.assertQuerysetEqual(SimilarAd.objects.values_list('similar', flat=True), [self.ads[1].pk])
+
+    def test_bulk_update_keeps_free_ad_quota(self):
+        # the quota counts the deleted and blocked ads too, the cached count stays right
+        count, reset_time = self.user1.free_ad_quota()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.run_action('soft_delete_selected', self.ads[:1])
+
+        self.assertEqual(cache.get(free_ad_quota_keys(self.user1.pk)[0]), count)
@@ -0,0 +1,114 @@
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from asgiref.sync import async_to_sync
+
+from rest_framework import status
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.response import Response
+from rest_framework.test import APITestCase, APIRequestFactory, force_authenticate
+
+from ads.models import Ad, Category
+from ads.counters import view_count_key
+from config.async_views import AsyncAPIView
+
+
+class AsyncAdsViewsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        cls.category1 = Category.objects.create(name='Category one')
+        cls.category2 = Category.objects.create(name='Category two')
+
+        cls.ad1 = Ad.objects.create(
+            author=cls.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            phone='9351212121',
+            price=10_000,
+            location='Test Location 1',
+            city='Tehran',
+            latitude=35.70,
+            longitude=51.40,
+            active=True,
+            confirmation=True,
+        )
+
+        cls.ad2 = Ad.objects.create(
+            author=cls.user1,
+            title='shoes for happy mens',
+            text='you can by CD',
+            image='ad_image_1.jpg',
+            status_product='new',
+            price=10_000,
+            location='Test Location 1',
+            city='Shiraz',
+            active=True,
+            confirmation=True,
+        )
+
+        cls.ad1.category.add(cls.category1, cls.category2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_ads_list_matches_sync_view(self):
+        response = self.client.get(reverse('ads:async_ads_list_api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.client.get(reverse('ads:ads_list_api')).data)
+        self.assertEqual(len(response.data), 2)
+
+        response = self.client.get(reverse('ads:async_ads_list_api') + '?city=Tehran')
+        self.assertEqual([ad['id'] for ad in response.data], [self.ad1.pk])
+
+        response = self.client.get(reverse('ads:async_ads_list_api') + '?near=35.71,51.41&radius=5')
+        self.assertEqual([ad['id'] for ad in response.data], [self.ad1.pk])
+        self.assertEqual(len(response.data[0]['category']), 2)
+
+        response = self.client.get(reverse('ads:async_ads_list_api') + '?near=35.71')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ad_detail(self):
+        response = self.client.get(reverse('ads:async_ad_detail_api', args=[self.ad1.pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['author'], self.user1.username)
+        self.assertEqual(len(response.data['category']), 2)
+        self.assertEqual(cache.get(view_count_key(self.ad1.pk)), 1)
+
+        response = self.client.get(reverse('ads:async_ad_detail_api', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_categories_list(self):
+        response = self.client.get(reverse('ads:async_categories_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.client.get(reverse('ads:categories_list')).data)
+
+    def test_search_with_invalid_data(self):
+        response = self.client.post(reverse('ads:async_search_ads'), {})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncAPIViewTest(APITestCase):
+    class ProfileView(AsyncAPIView):
+        permission_classes = (IsAuthenticated, )
+
+        async def get(self, request):
+            return Response({'phone': request.user.phone_number.as_e164})
+
+    def test_dispatch_checks_permissions(self):
+        user = get_user_model().objects.create_user(phone='9354214823')
+        view = async_to_sync(self.ProfileView.as_view())
+        factory = APIRequestFactory()
+
+        response = view(factory.get('/'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        request = factory.get('/')
+        force_authenticate(request, user=user)
+        response = view(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['phone'], '+989354214823')
@@ -0,0 +1,31 @@
+from django.test import SimpleTestCase
+
+from ads.management.commands.benchmark import summarize, find_regressions
+
+
+class BenchmarkRegressionsTest(SimpleTestCase):
+    def results(self, p95_ms, queries_max):
+        return {'scenarios': {'ads list': {'p95_ms': p95_ms, 'queries_max': queries_max}}}
+
+    def test_summarize(self):
+        result = summarize([0.010, 0.020, 0.030, 0.040], [3, 3, 4, 3])
+        self.assertEqual(result['requests'], 4)
+        self.assertEqual(result['queries_max'], 4)
+        self.assertEqual(result['mean_ms'], 25)
+        self.assertLessEqual(result['p50_ms'], result['p95_ms'])
+
+    def test_no_regression(self):
+        baseline = self.results(p95_ms=100, queries_max=5)
+        self.assertEqual(find_regressions(self.results(p95_ms=115, queries_max=5), baseline, 20), [])
+        self.assertEqual(find_regressions(self.results(p95_ms=50, queries_max=3), baseline, 20), [])
+
+    def test_regressions(self):
+        baseline = self.results(p95_ms=100, queries_max=5)
+
+        regressions = find_regressions(self.results(p95_ms=130, queries_max=6), baseline, 20)
+        self.assertEqual(len(regressions), 2)
+        self.assertIn('6 queries per request, was 5', regressions[0])
+        self.assertIn('p95 130ms, was 100ms', regressions[1])
+
+    def test_new_scenario_is_not_compared(self):
+        self.assertEqual(find_regressions(self.results(p95_ms=130, queries_max=6), {'scenarios': {}}, 20), [])
@@ -0,0 +1,145 @@
+import json
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import AdTokenLedger
+from ads.models import Ad, Category
+from ads.tests.test_update_and_create_views import image_for_test
+from ads.utils import unique_ad_slugs
+
+
+class BulkCreateAdAPITest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The uploaded images are saved in a directory of their own, removed after the tests.
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        cls.category1 = Category.objects.create(name='Category one')
+        cls.category2 = Category.objects.create(name='Category two')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user1)
+
+    def ad_data(self, title='Test Ad', **kwargs):
+        data = {
+            'title': title,
+            'text': 'This is a test ad.',
+            'status_product': 'New',
+            'price': 10_000,
+            'phone': '9354214823',
+            'location': 'Iran',
+            'category': [self.category1.name, self.category2.pk],
+        }
+        data.update(kwargs)
+        return data
+
+    def post_ads(self, ads, url_params=''):
+        data = {'ads': json.dumps(ads)}
+        for index in range(len(ads)):
+            data[f'image_{index}'] = image_for_test()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(reverse('ads:bulk_create_ad_api') + url_params, data, format='multipart')
+
+    def test_create_ads_in_bulk(self):
+        response = self.post_ads([self.ad_data('first ad'), self.ad_data('second ad', latitude=35.7, longitude=51.4)])
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results], ['Wait for confirmation'] * 2)
+
+        first_ad = Ad.objects.get(pk=results[0]['id'])
+        second_ad = Ad.objects.get(pk=results[1]['id'])
+        self.assertEqual(first_ad.author, self.user1)
+        self.assertEqual(first_ad.slug, 'first-ad')
+        self.assertIsNotNone(first_ad.expiration_date)
+        self.assertTrue(first_ad.image)
+        self.assertEqual(set(first_ad.category.all()), {self.category1, self.category2})
+        self.assertTrue(second_ad.geohash)
+        self.assertFalse(second_ad.is_use_ad_token)
+
+        self.assertEqual(self.user1.free_ad_quota()[0], 2)
+
+    def test_invalid_ads_get_their_own_result(self):
+        ads = [
+            self.ad_data('first ad'),
+            self.ad_data('second ad', status_product='broken'),
+            self.ad_data('third ad', category=['no category']),
+            self.ad_data('fourth ad', phone='9359048320'),
+            # out of the range of the primary key
+            self.ad_data('fifth ad', category=['99999999999999999999']),
+        ]
+        response = self.post_ads(ads)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        results = response.data['results']
+        self.assertEqual([result['status'] for result in results],
+                         ['Wait for confirmation', 'fail', 'fail', 'fail', 'fail'])
+        self.assertIn('status_product', results[1]['errors'])
+        self.assertIn('category', results[2]['errors'])
+        self.assertIn('phone', results[3]['errors'])
+        self.assertIn('category', results[4]['errors'])
+        self.assertEqual(Ad.objects.count(), 1)
+
+        # no valid ad
+        response = self.post_ads([self.ad_data(status_product='broken')])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_invalid_ads_field(self):
+        response = self.client.post(reverse('ads:bulk_create_ad_api'), {'ads': '{"title": "x"}'}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        too_many = [self.ad_data()] * (settings.BULK_CREATE_ADS_MAX + 1)
+        response = self.client.post(reverse('ads:bulk_create_ad_api'), {'ads': json.dumps(too_many)},
+                                    format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Ad.objects.count(), 0)
+
+    def test_ads_over_free_quota_use_ad_tokens(self):
+        ads = [self.ad_data(f'ad {number}') for number in range(settings.FREE_ADS_MONTHLY_QUOTA + 2)]
+
+        response = self.post_ads(ads)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.post_ads(ads, '?use=True')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Ad.objects.count(), 0)
+
+        self.user1.add_ad_tokens(2, 'admin')
+        response = self.post_ads(ads, '?use=True')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ad.objects.filter(is_use_ad_token=False).count(), settings.FREE_ADS_MONTHLY_QUOTA)
+        self.assertEqual(Ad.objects.filter(is_use_ad_token=True).count(), 2)
+
+        self.user1.refresh_from_db()
+        self.assertEqual(self.user1.ad_token, 0)
+        self.assertEqual(AdTokenLedger.objects.filter(user=self.user1, reason='use').get().change, -2)
+
+
+class UniqueAdSlugsTest(APITestCase):
+    def test_slugs_are_unique(self):
+        user = get_user_model().objects.create_user(phone='9354214823')
+        Ad.objects.create(author=user, title='same title', text='text', image='ad_image_1.jpg',
+                          status_product='new', price=10_000, location='Iran')
+
+        self.assertEqual(unique_ad_slugs(['same title', 'same title', 'other title']),
+                         ['same-title-1', 'same-title-2', 'other-title'])
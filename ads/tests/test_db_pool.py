@@ -0,0 +1,117 @@
+import threading
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase
+
+from psycopg2 import extensions
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from config.db_backends.postgresql.base import is_pooled_connection_usable
+from config.db_backends.postgresql.pool import ConnectionPool, PoolTimeout
+from config.db_metrics import connection_stats
+
+
+class FakeConnection:
+    def __init__(self):
+        self.closed = 0
+        self.autocommit = True
+        self.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+        self.queries = 0
+
+    def get_transaction_status(self):
+        return self.transaction_status
+
+    def cursor(self):
+        connection = self
+
+        class Cursor:
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *args):
+                pass
+
+            def execute(self, sql):
+                if connection.closed:
+                    raise Exception('connection already closed')
+                connection.queries += 1
+
+        return Cursor()
+
+    def close(self):
+        self.closed = 1
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        connection_stats.reset()
+        self.pool = ConnectionPool(size=2, timeout=0.05, check=lambda connection, idle_seconds: not connection.closed)
+
+    def test_connections_are_reused(self):
+        connection = self.pool.getconn(FakeConnection)
+        self.pool.putconn(connection)
+
+        self.assertIs(self.pool.getconn(FakeConnection), connection)
+        self.assertEqual(self.pool.in_use, 1)
+        self.assertEqual(connection_stats.snapshot()['opened'], 1)
+        self.assertEqual(connection_stats.snapshot()['pool_checkouts'], 2)
+
+    def test_unusable_and_discarded_connections_are_replaced(self):
+        connection = self.pool.getconn(FakeConnection)
+        self.pool.putconn(connection, discard=True)
+        self.assertTrue(connection.closed)
+
+        connection = self.pool.getconn(FakeConnection)
+        self.pool.putconn(connection)
+        connection.closed = 1
+
+        self.assertIsNot(self.pool.getconn(FakeConnection), connection)
+        stats = connection_stats.snapshot()
+        self.assertEqual((stats['opened'], stats['closed']), (3, 2))
+
+    def test_full_pool_waits_then_times_out(self):
+        first = self.pool.getconn(FakeConnection)
+        self.pool.getconn(FakeConnection)
+
+        with self.assertRaises(PoolTimeout):
+            self.pool.getconn(FakeConnection)
+        self.assertEqual(connection_stats.snapshot()['pool_timeouts'], 1)
+
+        # a connection returned by another thread frees the waiting one
+        threading.Timer(0.01, self.pool.putconn, args=(first, )).start()
+        self.pool.timeout = 1
+        self.assertIs(self.pool.getconn(FakeConnection), first)
+        self.assertGreater(connection_stats.snapshot()['pool_wait_seconds_max'], 0)
+
+    def test_pooled_connection_check(self):
+        connection = FakeConnection()
+        self.assertTrue(is_pooled_connection_usable(connection, idle_seconds=1, check_after=30))
+        self.assertEqual(connection.queries, 0)
+
+        self.assertTrue(is_pooled_connection_usable(connection, idle_seconds=60, check_after=30))
+        self.assertEqual(connection.queries, 1)
+
+        connection.transaction_status = extensions.TRANSACTION_STATUS_INERROR
+        self.assertFalse(is_pooled_connection_usable(connection, idle_seconds=1, check_after=30))
+
+        connection.transaction_status = extensions.TRANSACTION_STATUS_IDLE
+        connection.closed = 1
+        self.assertFalse(is_pooled_connection_usable(connection, idle_seconds=60, check_after=30))
+
+
+class DatabaseConnectionsAPITest(APITestCase):
+    def test_only_staff_can_see_stats(self):
+        user = get_user_model().objects.create_user(phone='9354214823')
+        self.client.force_authenticate(user)
+        response = self.client.get(reverse('db_connections'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('db_connections'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('opened', response.data)
+        self.assertIn('pools', response.data)
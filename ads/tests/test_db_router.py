@@ -0,0 +1,115 @@
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import RequestFactory, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from asgiref.sync import async_to_sync
+
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from ads.models import Ad, Category
+from config.db_router import ReplicaRouter, sticky_key
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTest(APITransactionTestCase):
+    # The replica alias mirrors the test database. The rows are committed, so both aliases see them.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+
+        self.user1 = get_user_model().objects.create_user(phone='9354214823')
+        self.category1 = Category.objects.create(name='Category one')
+        self.ad1 = Ad.objects.create(
+            author=self.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+        )
+
+    def get(self, url, **extra):
+        with CaptureQueriesContext(connections['default']) as default_queries, \
+                CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(url, **extra)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return len(default_queries), len(replica_queries), response
+
+    def test_read_only_views_read_from_replica(self):
+        for url in (reverse('ads:ads_list_api'), reverse('ads:ad_detail_api', args=[self.ad1.pk]),
+                    reverse('ads:categories_list'), reverse('payment:packages_list'),
+                    reverse('ads:async_ads_list_api')):
+            default_count, replica_count, response = self.get(url)
+            self.assertEqual(default_count, 0, url)
+            self.assertGreater(replica_count, 0, url)
+
+        default_count, replica_count, response = self.get(reverse('ads:ads_list_api'))
+        self.assertEqual(response.data[0]['id'], self.ad1.pk)
+
+    def test_other_views_use_primary(self):
+        self.client.force_authenticate(self.user1)
+
+        default_count, replica_count, response = self.get(reverse('ads:ad_quota_api'))
+        self.assertGreater(default_count, 0)
+        self.assertEqual(replica_count, 0)
+
+    def test_client_reads_its_writes_from_primary(self):
+        self.client.force_authenticate(self.user1)
+        response = self.client.get(reverse('ads:sign_ad_api', args=[self.ad1.pk]))
+        self.assertEqual(response.data['status'], 'add')
+
+        default_count, replica_count, response = self.get(reverse('ads:ads_list_api'))
+        self.assertGreater(default_count, 0)
+        self.assertEqual(replica_count, 0)
+
+        # other clients still read from the replica
+        default_count, replica_count, response = self.get(reverse('ads:ads_list_api'), REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(default_count, 0)
+        self.assertGreater(replica_count, 0)
+
+        # the sticky marker expired
+        cache.clear()
+        default_count, replica_count, response = self.get(reverse('ads:ads_list_api'))
+        self.assertEqual(default_count, 0)
+        self.assertGreater(replica_count, 0)
+
+    def test_async_views_read_from_replica(self):
+        # the ASGI handler, where the middleware runs in async mode
+        with CaptureQueriesContext(connections['default']) as default_queries, \
+                CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = async_to_sync(self.async_client.get)(reverse('ads:async_ads_list_api'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(default_queries), 0)
+        self.assertGreater(len(replica_queries), 0)
+
+    def test_sticky_key_of_forwarded_client(self):
+        factory = RequestFactory()
+        key = sticky_key(factory.get('/', REMOTE_ADDR='10.0.0.2'))
+
+        # a client can not pick another key with X-Forwarded-For
+        self.assertEqual(sticky_key(factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='10.0.0.3')), key)
+
+        with override_settings(TRUSTED_PROXY_IPS=['10.0.0.2']):
+            self.assertEqual(sticky_key(factory.get('/', REMOTE_ADDR='10.0.0.2', HTTP_X_FORWARDED_FOR='10.0.0.3')),
+                             sticky_key(factory.get('/', REMOTE_ADDR='10.0.0.3')))
+
+    def test_outside_of_requests_reads_use_primary(self):
+        router = ReplicaRouter()
+        self.assertEqual(router.db_for_read(Ad), 'default')
+        self.assertEqual(router.db_for_write(Ad), 'default')
+
+        with transaction.atomic():
+            self.assertEqual(router.db_for_read(Ad), 'default')
+
+        self.assertTrue(router.allow_migrate('default', 'ads'))
+        self.assertFalse(router.allow_migrate('replica', 'ads'))
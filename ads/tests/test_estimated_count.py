@@ -0,0 +1,60 @@
+from unittest import mock, skipUnless
+
+from django.db import connection
+from django.test import TestCase
+from django.contrib.auth import get_user_model
+
+from config.pagination import estimated_count, EstimatedCountPaginator
+from ads.models import Ad
+
+
+class EstimatedCountTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.superuser = get_user_model().objects.create_superuser(username='superuser', password='admin')
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        for number in range(3):
+            Ad.objects.create(
+                author=cls.user1,
+                title=f'Ad {number}',
+                text='this ad create for test',
+                image='ad_image_1.jpg',
+                status_product='new',
+                phone='9351212121',
+                price=10_000,
+                location='Test Location 1',
+                confirmation=number == 0,
+            )
+
+    def test_small_sets_are_counted_exactly(self):
+        self.assertEqual(estimated_count(Ad.objects.all()), 3)
+        self.assertEqual(estimated_count(Ad.objects.filter(confirmation=True)), 1)
+        self.assertEqual(EstimatedCountPaginator(Ad.objects.order_by('pk'), 2).num_pages, 2)
+
+    @skipUnless(connection.vendor == 'postgresql', 'row estimates are read from PostgreSQL')
+    def test_large_sets_are_estimated(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'ANALYZE {Ad._meta.db_table}')
+
+        self.assertEqual(estimated_count(Ad.objects.all(), threshold=0), 3)
+        self.assertEqual(estimated_count(Ad.objects.filter(confirmation=True), threshold=0), 1)
+
+    def test_filtered_sets_are_counted_exactly(self):
+        with mock.patch.object(connection, 'vendor', 'postgresql'), \
+                mock.patch('config.pagination.table_estimate', return_value=50_000):
+            self.assertEqual(estimated_count(Ad.objects.all(), threshold=10), 50_000)
+            self.assertEqual(estimated_count(Ad.objects.filter(confirmation=True), threshold=10), 1)
+            self.assertEqual(EstimatedCountPaginator(Ad.objects.filter(confirmation=False), 2).count, 2)
+
+    def test_admin_changelist(self):
+        self.client.post('/admin/login/', {'username': 'superuser', 'password': 'admin'})
+
+        response = self.client.get('/admin/ads/ad/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 3)
+        self.assertFalse(response.context['cl'].show_full_result_count)
+
+        response = self.client.get('/admin/payment/order/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 0)
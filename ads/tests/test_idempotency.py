@@ -0,0 +1,139 @@
+import shutil
+import tempfile
+
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.models import Ad, Category
+from ads.tests.test_update_and_create_views import image_for_test
+from config.idempotency import idempotency_cache_key
+
+
+class IdempotentCreateAdTest(APITestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The uploaded images are saved in a directory of their own, removed after the tests.
+        media_root = tempfile.mkdtemp()
+        cls.addClassCleanup(shutil.rmtree, media_root, ignore_errors=True)
+        media_settings = override_settings(MEDIA_ROOT=media_root)
+        media_settings.enable()
+        cls.addClassCleanup(media_settings.disable)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+        cls.user2 = get_user_model().objects.create_user(phone='9359048320')
+
+        cls.category1 = Category.objects.create(name='Category one')
+
+    def setUp(self):
+        cache.clear()
+
+    def ad_data(self):
+        return {
+            'title': 'Test Ad',
+            'text': 'This is a test ad.',
+            'status_product': 'New',
+            'price': 10_000,
+            'phone': '9354214823',
+            'location': 'Iran',
+            'category': [self.category1.pk],
+            'image': image_for_test(),
+        }
+
+    def test_repeat_with_same_key_replays_response(self):
+        self.client.force_authenticate(self.user1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                        HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        replay = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                  HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(replay.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(replay.data, response.data)
+        self.assertEqual(replay['Idempotent-Replayed'], 'true')
+        self.assertEqual(Ad.objects.count(), 1)
+        self.assertEqual(self.user1.free_ad_quota()[0], 1)
+
+        # a new key is a new request
+        response = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-2')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ad.objects.count(), 2)
+
+    def test_same_key_with_different_request_is_refused(self):
+        self.client.force_authenticate(self.user1)
+
+        response = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        data = self.ad_data()
+        data['title'] = 'Another Ad'
+        response = self.client.post(reverse('ads:create_ad_api'), data, format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+        # the query parameters are part of the request too
+        response = self.client.post(reverse('ads:create_ad_api') + '?use=True', self.ad_data(), format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+        self.assertEqual(Ad.objects.count(), 1)
+
+    def test_without_key_every_request_runs(self):
+        self.client.force_authenticate(self.user1)
+
+        self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart')
+        self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart')
+
+        self.assertEqual(Ad.objects.count(), 2)
+
+    def test_keys_are_per_user(self):
+        self.client.force_authenticate(self.user1)
+        self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                         HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.client.force_authenticate(self.user2)
+        data = self.ad_data()
+        data['phone'] = '9359048320'
+        response = self.client.post(reverse('ads:create_ad_api'), data, format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertFalse(response.has_header('Idempotent-Replayed'))
+        self.assertEqual(Ad.objects.count(), 2)
+
+    def test_failed_response_is_not_replayed(self):
+        self.client.force_authenticate(self.user1)
+
+        data = self.ad_data()
+        data.pop('title')
+        response = self.client.post(reverse('ads:create_ad_api'), data, format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Ad.objects.count(), 1)
+
+    def test_request_in_progress_returns_conflict(self):
+        self.client.force_authenticate(self.user1)
+
+        request = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                   HTTP_IDEMPOTENCY_KEY='key-1').wsgi_request
+        cache.clear()
+        # the first request still holds the key
+        cache.add(f'{idempotency_cache_key(request, "key-1")}:lock', 1)
+
+        response = self.client.post(reverse('ads:create_ad_api'), self.ad_data(), format='multipart',
+                                    HTTP_IDEMPOTENCY_KEY='key-1')
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
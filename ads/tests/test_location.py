@@ -0,0 +1,95 @@
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.models import Ad
+from ads.serializers import AdListSerializer
+from ads.geo import encode, bounding_box, cell_with_neighbours, distance_km
+
+
+class GeoTest(APITestCase):
+    def test_encode(self):
+        self.assertEqual(encode(57.64911, 10.40744, 11), 'u4pruydqqvj')
+
+        lat_min, lat_max, lon_min, lon_max = bounding_box(encode(35.6892, 51.3890, 7))
+        self.assertTrue(lat_min <= 35.6892 <= lat_max and lon_min <= 51.3890 <= lon_max)
+
+    def test_cell_with_neighbours(self):
+        self.assertEqual(cell_with_neighbours('u4pruy'), {
+            'u4pruy', 'u4prvn', 'u4prvj', 'u4prvp', 'u4prux', 'u4pruw', 'u4pruz', 'u4prut', 'u4pruv',
+        })
+
+    def test_distance_km(self):
+        # Tehran to Isfahan
+        self.assertAlmostEqual(distance_km(35.6892, 51.3890, 32.6539, 51.6660), 338.5, delta=1)
+
+
+class AdsListNearAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        locations = (
+            ('Tehran', 'Tehran', 35.7000, 51.4000),
+            ('Tehran', 'Tehran', 35.7300, 51.4200),
+            ('Tehran', 'Karaj', 35.8400, 50.9400),
+            ('Isfahan', 'Isfahan', 32.6539, 51.6660),
+            ('Isfahan', 'Isfahan', None, None),
+        )
+        cls.ads = []
+        for province, city, latitude, longitude in locations:
+            cls.ads.append(Ad.objects.create(
+                author=cls.user1,
+                title=f'Ad in {city}',
+                text='this ad create for test',
+                image='ad_image_1.jpg',
+                status_product='new',
+                phone='9351212121',
+                price=10_000,
+                location=f'{city} street',
+                province=province,
+                city=city,
+                latitude=latitude,
+                longitude=longitude,
+                active=True,
+                confirmation=True,
+            ))
+
+    def test_geohash_is_set_on_save(self):
+        self.assertEqual(self.ads[0].geohash, encode(35.7000, 51.4000))
+        self.assertEqual(self.ads[4].geohash, '')
+
+    def test_filter_with_city_and_province(self):
+        response = self.client.get(reverse('ads:ads_list_api'), {'city': 'Karaj'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, AdListSerializer([self.ads[2]], many=True).data)
+
+        response = self.client.get(reverse('ads:ads_list_api'), {'province': 'Isfahan'})
+        self.assertEqual(len(response.data), 2)
+
+    def test_filter_near(self):
+        response = self.client.get(reverse('ads:ads_list_api'), {'near': '35.7010,51.4010', 'radius': 5})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # nearest first
+        self.assertEqual(response.data, AdListSerializer([self.ads[0], self.ads[1]], many=True).data)
+
+        response = self.client.get(reverse('ads:ads_list_api'), {'near': '35.7010,51.4010', 'radius': 60})
+        self.assertEqual([ad['id'] for ad in response.data], [self.ads[0].pk, self.ads[1].pk, self.ads[2].pk])
+
+        response = self.client.get(reverse('ads:ads_list_api'), {'near': '35.7010,51.4010', 'radius': 5,
+                                                                 'city': 'Karaj'})
+        self.assertEqual(response.data, [])
+
+    def test_filter_near_with_invalid_data(self):
+        response = self.client.get(reverse('ads:ads_list_api'), {'near': 'Tehran'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('near', response.data)
+
+        response = self.client.get(reverse('ads:ads_list_api'), {'near': '95,51'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.get(reverse('ads:ads_list_api'), {'near': '35.7,51.4', 'radius': 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('radius', response.data)
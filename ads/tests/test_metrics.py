@@ -0,0 +1,123 @@
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from asgiref.sync import iscoroutinefunction
+from prometheus_client import REGISTRY
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.async_views import AsyncAdsListAPI
+from ads.models import Ad
+from ads.tasks import check_reports_of_ads
+from config.db_metrics import connection_stats
+from config.metrics import MetricsMiddleware
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        cls.ad1 = Ad.objects.create(
+            author=cls.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_request_metrics_by_view(self):
+        view = 'ads:ads_list_api'
+        requests_before = sample('http_request_duration_seconds_count', view=view, method='GET', status='200')
+        queries_before = sample('http_request_db_queries_sum', view=view)
+        serializer_before = sample('http_request_serializer_duration_seconds_sum', view=view)
+        size_before = sample('http_response_size_bytes_sum', view=view)
+
+        response = self.client.get(reverse('ads:ads_list_api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', view=view, method='GET', status='200'), requests_before + 1)
+        self.assertGreater(sample('http_request_db_queries_sum', view=view), queries_before)
+        self.assertGreater(sample('http_request_serializer_duration_seconds_sum', view=view), serializer_before)
+        self.assertEqual(sample('http_response_size_bytes_sum', view=view), size_before + len(response.content))
+
+    async def test_async_request_metrics(self):
+        view = 'ads:async_ads_list_api'
+        requests_before = sample('http_request_duration_seconds_count', view=view, method='GET', status='200')
+        queries_before = sample('http_request_db_queries_sum', view=view)
+
+        # the middleware runs in the event loop, the view is not adapted to sync
+        self.assertTrue(iscoroutinefunction(MetricsMiddleware(AsyncAdsListAPI.as_view())))
+
+        response = await self.async_client.get(reverse(view))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        self.assertEqual(
+            sample('http_request_duration_seconds_count', view=view, method='GET', status='200'), requests_before + 1)
+        self.assertGreater(sample('http_request_db_queries_sum', view=view), queries_before)
+
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('ads:ad_detail_api', args=[self.ad1.pk]))
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+
+        content = response.content.decode()
+        self.assertIn('http_request_duration_seconds_bucket{', content)
+        self.assertIn('view="ads:ad_detail_api"', content)
+        self.assertIn('http_request_db_duration_seconds_sum{view="ads:ad_detail_api"}', content)
+        self.assertIn('db_connections_opened_total', content)
+        self.assertNotIn('view="metrics"', content)
+
+    @override_settings(MIN_REPORTS_TO_BLOCK_AD=1)
+    def test_task_metrics(self):
+        task = 'ads.tasks.check_reports_of_ads'
+        runs_before = sample('celery_task_duration_seconds_count', task=task, state='SUCCESS')
+        rows_before = sample('celery_task_rows_affected_total', task=task)
+
+        Ad.objects.filter(pk=self.ad1.pk).update(count_reports=1)
+        check_reports_of_ads.apply()
+
+        self.assertEqual(sample('celery_task_duration_seconds_count', task=task, state='SUCCESS'), runs_before + 1)
+        self.assertEqual(sample('celery_task_rows_affected_total', task=task), rows_before + 1)
+
+    def test_metrics_endpoint_is_restricted(self):
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        with override_settings(METRICS_ALLOWED_IPS=['10.0.0.0/24']):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        staff = get_user_model().objects.create_superuser(username='admin', password='admin')
+        self.client.force_login(staff)
+        response = self.client.get(reverse('metrics'), REMOTE_ADDR='10.0.0.5')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_connection_metrics(self):
+        opened_before = sample('db_connections_opened_total')
+        in_use_before = sample('db_pool_connections_in_use')
+
+        connection_stats.record_opened()
+        connection_stats.record_pool_taken()
+        self.assertEqual(sample('db_connections_opened_total'), opened_before + 1)
+        self.assertEqual(sample('db_pool_connections_in_use'), in_use_before + 1)
+
+        connection_stats.record_pool_returned()
+        self.assertEqual(sample('db_pool_connections_in_use'), in_use_before)
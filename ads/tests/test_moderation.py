@@ -0,0 +1,128 @@
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.models import Ad
+
+
+class ModerationAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff1 = get_user_model().objects.create_superuser(username='staff1', password='staff1')
+        cls.staff2 = get_user_model().objects.create_superuser(username='staff2', password='staff2')
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        cls.ads = [
+            Ad.objects.create(
+                author=cls.user1,
+                title=f'Ad {number}',
+                text='this ad create for test',
+                image='ad_image_1.jpg',
+                status_product='new',
+                phone='9351212121',
+                price=10_000,
+                location='Test Location 1',
+            )
+            for number in range(5)
+        ]
+
+        # confirmed and deleted ads are not in the queue
+        Ad.objects.filter(pk=cls.ads[3].pk).update(confirmation=True)
+        Ad.objects.filter(pk=cls.ads[4].pk).update(is_delete=True)
+
+    def test_only_staff_can_moderate(self):
+        self.client.force_authenticate(self.user1)
+
+        response = self.client.get(reverse('ads:moderation_queue_api'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        response = self.client.post(reverse('ads:moderation_claim_api'))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    @override_settings(MODERATION_QUEUE_PAGE_SIZE=2)
+    def test_queue_pages(self):
+        self.client.force_authenticate(self.staff1)
+
+        response = self.client.get(reverse('ads:moderation_queue_api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 3)
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.ads[0].pk, self.ads[1].pk])
+        self.assertIsNotNone(response.data['next'])
+
+        response = self.client.get(reverse('ads:moderation_queue_api'), {'cursor': response.data['next']})
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.ads[2].pk])
+        self.assertIsNone(response.data['next'])
+
+        response = self.client.get(reverse('ads:moderation_queue_api'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_queue_without_claims_of_others(self):
+        self.client.force_authenticate(self.staff1)
+        self.client.post(reverse('ads:moderation_claim_api'), {'count': 1})
+
+        response = self.client.get(reverse('ads:moderation_queue_api'))
+        self.assertEqual([ad['id'] for ad in response.data['results']], [ad.pk for ad in self.ads[:3]])
+
+        # the ad staff1 is reviewing is not listed for staff2 until the lease expires
+        self.client.force_authenticate(self.staff2)
+        response = self.client.get(reverse('ads:moderation_queue_api'))
+        self.assertEqual([ad['id'] for ad in response.data['results']], [self.ads[1].pk, self.ads[2].pk])
+
+        Ad.objects.filter(pk=self.ads[0].pk).update(claim_expires=timezone.now() - timezone.timedelta(minutes=1))
+        response = self.client.get(reverse('ads:moderation_queue_api'))
+        self.assertEqual([ad['id'] for ad in response.data['results']], [ad.pk for ad in self.ads[:3]])
+
+    def test_claim(self):
+        self.client.force_authenticate(self.staff1)
+        response = self.client.post(reverse('ads:moderation_claim_api'), {'count': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([ad['id'] for ad in response.data], [self.ads[0].pk, self.ads[1].pk])
+        self.assertEqual(response.data[0]['claimed_by'], 'staff1')
+
+        # another staff member gets the next ad
+        self.client.force_authenticate(self.staff2)
+        response = self.client.post(reverse('ads:moderation_claim_api'), {'count': 2})
+        self.assertEqual([ad['id'] for ad in response.data], [self.ads[2].pk])
+
+        # an expired lease can be claimed again
+        Ad.objects.filter(pk=self.ads[0].pk).update(claim_expires=timezone.now() - timezone.timedelta(minutes=1))
+        response = self.client.post(reverse('ads:moderation_claim_api'))
+        self.assertEqual([ad['id'] for ad in response.data], [self.ads[0].pk])
+
+        response = self.client.post(reverse('ads:moderation_claim_api'), {'count': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_decide(self):
+        self.client.force_authenticate(self.staff1)
+        self.client.post(reverse('ads:moderation_claim_api'), {'count': 1})
+
+        # the ad claimed by staff1 is skipped
+        self.client.force_authenticate(self.staff2)
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('ads:moderation_decision_api'), {
+                'ads': [self.ads[0].pk, self.ads[1].pk], 'decision': 'confirm',
+            })
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 1)
+        self.assertFalse(Ad.objects.get(pk=self.ads[0].pk).confirmation)
+        self.assertTrue(Ad.objects.get(pk=self.ads[1].pk).confirmation)
+
+        self.client.force_authenticate(self.staff1)
+        response = self.client.post(reverse('ads:moderation_decision_api'), {
+            'ads': [self.ads[0].pk], 'decision': 'reject',
+        })
+        self.assertEqual(response.data['count'], 1)
+        ad = Ad.objects.get(pk=self.ads[0].pk)
+        self.assertTrue(ad.is_delete)
+        self.assertEqual(ad.delete_with, 'staff')
+        self.assertIsNone(ad.claimed_by)
+
+        response = self.client.post(reverse('ads:moderation_decision_api'), {
+            'ads': [self.ads[2].pk], 'decision': 'maybe',
+        })
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('decision', response.data)
@@ -0,0 +1,103 @@
+import marshal
+
+from django.core.cache import cache
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from ads.models import Ad
+from config.profiling import profile_key
+
+
+class ProfilingTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+        cls.staff = get_user_model().objects.create_user(phone='9354214824')
+        cls.staff.is_staff = True
+        cls.staff.save()
+
+        cls.ad1 = Ad.objects.create(
+            author=cls.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def authorization(self, user):
+        return f'Bearer {RefreshToken.for_user(user).access_token}'
+
+    def test_server_timing_for_staff(self):
+        response = self.client.get(reverse('ads:ads_list_api'), HTTP_X_PROFILE='timing',
+                                   HTTP_AUTHORIZATION=self.authorization(self.staff))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        phases = [entry.split(';')[0] for entry in response['Server-Timing'].split(', ')]
+        self.assertEqual(phases, ['auth', 'db', 'serialize', 'render', 'total'])
+        self.assertNotIn('X-Profile-Id', response)
+
+    def test_profile_query_parameter(self):
+        response = self.client.get(reverse('ads:ads_list_api') + '?profile=1',
+                                   HTTP_AUTHORIZATION=self.authorization(self.staff))
+        self.assertIn('Server-Timing', response)
+
+    def test_ignored_for_other_users(self):
+        response = self.client.get(reverse('ads:ads_list_api'), HTTP_X_PROFILE='cprofile',
+                                   HTTP_AUTHORIZATION=self.authorization(self.user1))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('Server-Timing', response)
+        self.assertNotIn('X-Profile-Id', response)
+
+        response = self.client.get(reverse('ads:ads_list_api'), HTTP_X_PROFILE='timing')
+        self.assertNotIn('Server-Timing', response)
+
+    def test_cprofile_download(self):
+        response = self.client.get(reverse('ads:ad_detail_api', args=[self.ad1.pk]), HTTP_X_PROFILE='cprofile',
+                                   HTTP_AUTHORIZATION=self.authorization(self.staff))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        profile_id = response['X-Profile-Id']
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('profile_detail', args=[profile_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['view'], 'ads:ad_detail_api')
+        self.assertTrue(response.data['queries'])
+        self.assertIn('sql', response.data['queries'][0])
+        self.assertIn('duration_ms', response.data['queries'][0])
+        self.assertIn('function calls', response.data['top_functions'])
+
+        response = self.client.get(reverse('profile_download', args=[profile_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn(f'{profile_id}.prof', response['Content-Disposition'])
+        self.assertIsInstance(marshal.loads(response.content), dict)
+
+    async def test_cprofile_of_async_view(self):
+        response = await self.async_client.get(
+            reverse('ads:async_ad_detail_api', args=[self.ad1.pk]),
+            headers={'X-Profile': 'cprofile', 'Authorization': self.authorization(self.staff)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('Server-Timing', response)
+
+        profile = cache.get(profile_key(response['X-Profile-Id']))
+        self.assertEqual(profile['view'], 'ads:async_ad_detail_api')
+        self.assertTrue(profile['queries'])
+
+    def test_profile_only_for_staff(self):
+        self.client.force_authenticate(self.user1)
+        response = self.client.get(reverse('profile_detail', args=['abc']))
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+        self.client.force_authenticate(self.staff)
+        response = self.client.get(reverse('profile_detail', args=['abc']))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,123 @@
+import json
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.conf import settings
+from django.utils import timezone
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from accounts.models import free_ad_quota_keys
+from ads.models import Ad
+from ads.tests.test_update_and_create_views import image_for_test
+
+
+class AdQuotaAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+    def setUp(self):
+        cache.clear()
+
+    def new_ad(self, **kwargs):
+        return Ad.objects.create(
+            author=self.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            phone='9351212121',
+            price=10_000,
+            location='Test Location 1',
+            **kwargs,
+        )
+
+    def create_ad(self, **kwargs):
+        # The cached count is increased when the ad is committed.
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.new_ad(**kwargs)
+
+    def test_quota_without_login(self):
+        response = self.client.get(reverse('ads:ad_quota_api'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_quota(self):
+        self.client.force_authenticate(self.user1)
+
+        response = self.client.get(reverse('ads:ad_quota_api'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['free_ads_used'], 0)
+        self.assertEqual(response.data['free_ads_remaining'], settings.FREE_ADS_MONTHLY_QUOTA)
+        self.assertIsNone(response.data['reset_time'])
+
+        ad = self.create_ad()
+        # ads created with an ad token are not counted
+        self.create_ad(is_use_ad_token=True)
+
+        response = self.client.get(reverse('ads:ad_quota_api'))
+        self.assertEqual(response.data['free_ads_used'], 1)
+        self.assertEqual(response.data['reset_time'], ad.datetime_created + timezone.timedelta(days=30))
+
+        # the cached count is increased when a free ad is created
+        self.create_ad()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user1.free_ad_quota()[0], 2)
+
+    def test_rolled_back_ad_is_not_counted(self):
+        self.assertEqual(self.user1.free_ad_quota()[0], 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.new_ad()
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.user1.free_ad_quota()[0], 0)
+
+    def test_old_ads_are_not_counted(self):
+        ad = self.create_ad()
+        Ad.objects.filter(pk=ad.pk).update(datetime_created=timezone.now() - timezone.timedelta(days=31))
+
+        self.assertEqual(self.user1.free_ad_quota(), (0, None))
+
+    def test_has_free_ad_quota(self):
+        for _ in range(settings.FREE_ADS_MONTHLY_QUOTA - 1):
+            self.create_ad()
+        self.assertTrue(self.user1.has_free_ad_quota())
+
+        self.create_ad()
+        self.assertFalse(self.user1.has_free_ad_quota())
+
+    def test_create_ad_checks_quota_again_in_the_lock(self):
+        for _ in range(settings.FREE_ADS_MONTHLY_QUOTA):
+            self.create_ad()
+        # a stale count, like the one read by concurrent requests before the others created their ads
+        cache.set(free_ad_quota_keys(self.user1.pk)[0], 0)
+
+        self.client.force_authenticate(self.user1)
+        data = {
+            'title': 'Test Ad',
+            'text': 'This is a test ad.',
+            'image': image_for_test(),
+            'status_product': 'New',
+            'price': 10_000,
+            'phone': '9354214823',
+            'location': 'Iran',
+        }
+        response = self.client.post(reverse('ads:create_ad_api'), data, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('You have reached your ad creation limit.', response.data['message'])
+
+        del data['image']
+        response = self.client.post(reverse('ads:bulk_create_ad_api'), {'ads': json.dumps([data]),
+                                    'image_0': image_for_test()}, format='multipart')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        self.assertEqual(Ad.objects.count(), settings.FREE_ADS_MONTHLY_QUOTA)
@@ -0,0 +1,42 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.contrib.auth import get_user_model
+from django.db.models import Sum
+from django.test import TestCase
+
+from accounts.models import CodeVerify, AdTokenLedger
+from ads.models import Ad, AdReport, Category
+from payment.models import Order
+
+
+class SeedCommandTest(TestCase):
+    def seed(self, **options):
+        call_command('seed', batch_size=30, seed=1, stdout=StringIO(), **options)
+
+    def test_seed(self):
+        self.seed(users=50, ads=200, categories=40, reports=1, orders=0.5)
+
+        self.assertEqual(get_user_model().objects.count(), 50)
+        self.assertEqual(Ad.objects.count(), 200)
+        self.assertEqual(Category.objects.count(), 40)
+        self.assertTrue(Ad.sign.through.objects.exists())
+        self.assertTrue(Order.objects.exists())
+
+        # what the signals do for models saved one by one
+        self.assertEqual(CodeVerify.objects.count(), 50)
+        self.assertEqual(Ad.objects.values('slug').distinct().count(), 200)
+        self.assertFalse(Category.objects.filter(slug='').exists())
+
+        self.assertEqual(Ad.objects.aggregate(Sum('count_reports'))['count_reports__sum'], AdReport.objects.count())
+        self.assertEqual(AdTokenLedger.objects.aggregate(Sum('change'))['change__sum'],
+                         get_user_model().objects.aggregate(Sum('ad_token'))['ad_token__sum'])
+        self.assertEqual(AdTokenLedger.objects.count(), Order.objects.filter(completed=True).count())
+
+    def test_seed_again(self):
+        self.seed(users=20, ads=20)
+        self.seed(users=20, ads=20)
+
+        self.assertEqual(get_user_model().objects.count(), 40)
+        self.assertEqual(Ad.objects.values('slug').distinct().count(), 40)
+        self.assertEqual(Category.objects.count(), 30)
@@ -0,0 +1,80 @@
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.models import Ad, Category, SimilarAd
+from ads.serializers import AdListSerializer
+from ads.similarity import build_vectors, normalize_text
+from ads.tasks import compute_similar_ads
+
+
+class SimilarAdsAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+
+        cls.category1 = Category.objects.create(name='Shoes')
+        cls.category2 = Category.objects.create(name='Phones')
+
+        ads_info = (
+            ('Running shoes size 42', 'light running shoes for men', 100_000, cls.category1),
+            ('Running shoes size 43', 'running shoes, nearly new', 120_000, cls.category1),
+            ('Leather shoes', 'formal shoes for men', 900_000, cls.category1),
+            ('Old phone', 'a phone that still works', 110_000, cls.category2),
+        )
+        cls.ads = []
+        for title, text, price, category in ads_info:
+            ad = Ad.objects.create(
+                author=cls.user1,
+                title=title,
+                text=text,
+                image='ad_image_1.jpg',
+                status_product='new',
+                phone='9351212121',
+                price=price,
+                location='Test Location 1',
+                active=True,
+                confirmation=True,
+            )
+            ad.category.add(category)
+            cls.ads.append(ad)
+
+    def test_normalize_text(self):
+        self.assertEqual(normalize_text('كفش ورزشي سايز ۴۲'), ['کفش', 'ورزشی', 'سایز', '42'])
+        self.assertEqual(normalize_text('Running-Shoes, a NEW pair'), ['running', 'shoes', 'new', 'pair'])
+
+    def test_frequent_words_are_dropped(self):
+        documents = [['common', f'word{index // 2}'] for index in range(200)]
+        vectors = build_vectors(documents, [[] for _ in documents], 0.5, max_document_frequency=0.5)
+
+        # the 100 words of two ads each, not the word of every ad
+        self.assertEqual(vectors.shape[1], 100)
+        self.assertEqual(build_vectors(documents, [[] for _ in documents], 0.5).shape[1], 101)
+
+    def test_compute_similar_ads(self):
+        compute_similar_ads()
+
+        similar_to_first = list(SimilarAd.objects.filter(ad=self.ads[0]).values_list('similar', flat=True))
+        # same words, category and close price first, then same words and category with a far price
+        self.assertEqual(similar_to_first[:2], [self.ads[1].pk, self.ads[2].pk])
+        self.assertFalse(SimilarAd.objects.filter(ad=self.ads[0], similar=self.ads[0]).exists())
+
+    def test_get_similar_ads(self):
+        compute_similar_ads()
+
+        response = self.client.get(reverse('ads:similar_ads_api', args=[self.ads[0].pk]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data[0], AdListSerializer(self.ads[1]).data)
+
+        # deactivated ads are not listed
+        self.ads[1].active = False
+        self.ads[1].save()
+
+        response = self.client.get(reverse('ads:similar_ads_api', args=[self.ads[0].pk]))
+        self.assertNotIn(self.ads[1].pk, [ad['id'] for ad in response.data])
+
+        response = self.client.get(reverse('ads:similar_ads_api', args=[999]))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('message', response.data)
@@ -0,0 +1,113 @@
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.test import override_settings
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.models import Ad, Category, TrendingAd
+from ads.serializers import AdListSerializer
+from ads.tasks import compute_trending_ads
+
+
+class TrendingAdsAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+        cls.user2 = get_user_model().objects.create_user(phone='9359048320')
+
+        cls.category1 = Category.objects.create(name='Category one')
+        cls.category2 = Category.objects.create(name='Category two')
+
+        cls.ad1 = Ad.objects.create(
+            author=cls.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            phone='9351212121',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+            view_count=10,
+        )
+
+        cls.ad2 = Ad.objects.create(
+            author=cls.user2,
+            title='shoes for happy mens',
+            text='you can by CD',
+            image='ad_image_1.jpg',
+            status_product='new',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+            view_count=2,
+        )
+
+        cls.ad3 = Ad.objects.create(
+            author=cls.user2,
+            title='still testing',
+            text='please active this ad',
+            image='ad_image_2.jpg',
+            status_product='worked',
+            price=20_000,
+            location='Test Location 2',
+            active=True,
+            view_count=100,
+        )
+
+        cls.ad1.category.add(cls.category1)
+        cls.ad2.category.add(cls.category1, cls.category2)
+        cls.ad3.category.add(cls.category1)
+
+    def test_compute_trending_ads(self):
+        compute_trending_ads()
+
+        # inactive ads are not in the feed
+        self.assertFalse(TrendingAd.objects.filter(ad=self.ad3).exists())
+        self.assertEqual(list(TrendingAd.objects.filter(category=None).values_list('ad', flat=True)),
+                         [self.ad1.pk, self.ad2.pk])
+        self.assertEqual(list(TrendingAd.objects.filter(category=self.category2).values_list('ad', flat=True)),
+                         [self.ad2.pk])
+
+        # signs move an ad up
+        self.ad2.sign.add(self.user1, self.user2)
+        compute_trending_ads()
+
+        self.assertEqual(list(TrendingAd.objects.filter(category=None).values_list('ad', flat=True)),
+                         [self.ad2.pk, self.ad1.pk])
+
+    def test_get_trending_ads(self):
+        compute_trending_ads()
+
+        response = self.client.get(reverse('ads:trending_ads'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, AdListSerializer([self.ad1, self.ad2], many=True).data)
+
+        response = self.client.get(reverse('ads:trending_ads'), {'category': self.category2.pk})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, AdListSerializer([self.ad2], many=True).data)
+
+        # an ad deactivated after the feed was computed is skipped
+        self.ad1.active = False
+        self.ad1.save()
+
+        response = self.client.get(reverse('ads:trending_ads'))
+        self.assertEqual(response.data, AdListSerializer([self.ad2], many=True).data)
+
+    @override_settings(TRENDING_ADS_PAGE_SIZE=1)
+    def test_get_trending_ads_pages(self):
+        compute_trending_ads()
+
+        response = self.client.get(reverse('ads:trending_ads'), {'page': 2})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, AdListSerializer([self.ad2], many=True).data)
+
+        response = self.client.get(reverse('ads:trending_ads'), {'page': 3})
+        self.assertEqual(response.data, [])
+
+        response = self.client.get(reverse('ads:trending_ads'), {'page': 0})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('message', response.data)
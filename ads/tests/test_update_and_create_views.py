@@ -4,6 +4,7 @@ from django.conf import settings
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.cache import cache
 
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -77,6 +78,10 @@ class AdsListAPITest(APITestCase):
         cls.ad2.category.add(cls.category2)
         cls.ad3.category.add(cls.category1)
 
+    def setUp(self):
+        # Free ads quota is cached, the cache is not rolled back with the database between tests.
+        cache.clear()
+
     def test_create_ad_with_valid_data_and_test_token_ad(self):
         # try without login
         data = {
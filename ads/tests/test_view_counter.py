@@ -0,0 +1,148 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.urls import reverse
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.test import RequestFactory, override_settings
+
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from ads.models import Ad
+from ads.counters import get_viewer, local_dirty_ads, record_view, view_count_key
+from ads.tasks import flush_ad_views
+
+
+class AdViewCounterTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user1 = get_user_model().objects.create_user(phone='9354214823')
+        cls.user2 = get_user_model().objects.create_user(phone='9359048320')
+
+        cls.ad1 = Ad.objects.create(
+            author=cls.user1,
+            title='Ad Title for text',
+            text='this ad create for test',
+            image='ad_image_1.jpg',
+            status_product='new',
+            phone='9351212121',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+        )
+
+        cls.ad2 = Ad.objects.create(
+            author=cls.user2,
+            title='shoes for happy mens',
+            text='you can by CD',
+            image='ad_image_1.jpg',
+            status_product='new',
+            price=10_000,
+            location='Test Location 1',
+            active=True,
+            confirmation=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        local_dirty_ads.clear()
+
+    def test_detail_view_is_counted_once_per_viewer(self):
+        url = reverse('ads:ad_detail_api', args=[self.ad1.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.client.get(url)
+        self.assertEqual(cache.get(view_count_key(self.ad1.pk)), 1)
+
+        # an authenticated user is a different viewer from the anonymous client
+        self.client.force_authenticate(self.user2)
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(cache.get(view_count_key(self.ad1.pk)), 2)
+
+        # the database is not touched until the counters are flushed
+        self.ad1.refresh_from_db()
+        self.assertEqual(self.ad1.view_count, 0)
+
+    def test_flush_ad_views(self):
+        for viewer in range(3):
+            record_view(self.ad1.pk, viewer)
+        record_view(self.ad2.pk, 0)
+
+        flush_ad_views()
+
+        self.ad1.refresh_from_db()
+        self.ad2.refresh_from_db()
+        self.assertEqual(self.ad1.view_count, 3)
+        self.assertEqual(self.ad2.view_count, 1)
+        self.assertEqual(cache.get(view_count_key(self.ad1.pk)), 0)
+
+        # views recorded after a flush are added to the stored count
+        record_view(self.ad1.pk, 3)
+        flush_ad_views()
+
+        self.ad1.refresh_from_db()
+        self.assertEqual(self.ad1.view_count, 4)
+
+    def test_failed_flush_keeps_the_views(self):
+        for viewer in range(2):
+            record_view(self.ad1.pk, viewer)
+
+        with mock.patch('ads.tasks.update_view_counts', side_effect=DatabaseError):
+            with self.assertRaises(DatabaseError):
+                flush_ad_views()
+        self.assertEqual(cache.get(view_count_key(self.ad1.pk)), 2)
+
+        # the next flush reads the ad again
+        self.assertEqual(flush_ad_views(), 1)
+        self.assertEqual(Ad.objects.get(pk=self.ad1.pk).view_count, 2)
+
+    @override_settings(AD_VIEW_FLUSH_BATCH_SIZE=1)
+    def test_flush_ad_views_in_batches(self):
+        record_view(self.ad1.pk, 0)
+        record_view(self.ad2.pk, 0)
+
+        flush_ad_views()
+
+        self.assertEqual(Ad.objects.get(pk=self.ad1.pk).view_count, 1)
+        self.assertEqual(Ad.objects.get(pk=self.ad2.pk).view_count, 1)
+
+    def test_flush_ad_views_reads_only_dirty_ads(self):
+        record_view(self.ad1.pk, 0)
+        self.assertEqual(flush_ad_views(), 1)
+
+        # nothing was viewed since the last flush
+        self.assertEqual(flush_ad_views(), 0)
+
+    def test_flush_ad_views_of_deleted_ad(self):
+        record_view(self.ad1.pk, 0)
+        Ad.objects.filter(pk=self.ad1.pk).update(is_delete=True)
+
+        flush_ad_views()
+
+        self.assertEqual(Ad.objects.get(pk=self.ad1.pk).view_count, 1)
+
+    @override_settings(AD_VIEW_COUNTER_TTL_HOURS=1)
+    def test_view_counter_expires(self):
+        record_view(self.ad1.pk, 0)
+
+        # LocMemCache keeps None for the keys that never expire
+        self.assertIsNotNone(cache._expire_info[cache.make_key(view_count_key(self.ad1.pk))])
+
+    def get_viewer(self, **meta):
+        request = RequestFactory().get('/', **meta)
+        request.user = AnonymousUser()
+        return get_viewer(request)
+
+    def test_forwarded_for_of_untrusted_client_is_ignored(self):
+        self.assertEqual(self.get_viewer(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4'), 'ip-10.0.0.1')
+
+    @override_settings(TRUSTED_PROXY_IPS=['10.0.0.1', '10.0.0.2'])
+    def test_forwarded_for_of_trusted_proxy(self):
+        # the address the client sent itself is before the ones added by the proxies
+        viewer = self.get_viewer(REMOTE_ADDR='10.0.0.1', HTTP_X_FORWARDED_FOR='1.2.3.4, 5.6.7.8, 10.0.0.2')
+        self.assertEqual(viewer, 'ip-5.6.7.8')
@@ -1,19 +1,32 @@
 from django.urls import path
 
-from . import views
+from . import views, async_views
 
 app_name = 'ads'
 
 urlpatterns = [
     path('list/', views.AdsListAPI.as_view(), name='ads_list_api'),
     path('search/', views.SearchAdAPI.as_view(), name='search_ads'),
+    path('trending/', views.TrendingAdsAPI.as_view(), name='trending_ads'),
     path('list/category/', views.CategoryListAPI.as_view(), name='categories_list'),
     path('category/<int:pk>/', views.AdsListWithCategoryAPI.as_view(), name='ads_list_with_category'),
     path('create/', views.CreateAdAPI.as_view(), name='create_ad_api'),
+    path('create/bulk/', views.BulkCreateAdAPI.as_view(), name='bulk_create_ad_api'),
+    path('quota/', views.AdQuotaAPI.as_view(), name='ad_quota_api'),
     path('<int:pk>/', views.AdDetailAPI.as_view(), name='ad_detail_api'),
+    path('<int:pk>/similar/', views.SimilarAdsAPI.as_view(), name='similar_ads_api'),
     path('report/<int:pk>/', views.ReportAdAPI.as_view(), name='report_ad_api'),
     path('update/<int:pk>/', views.UpdateAdAPI.as_view(), name='update_ad_api'),
     path('delete/<int:pk>/', views.DeleteAdAPI.as_view(), name='delete_ad_api'),
     path('sign/<int:pk>/', views.SignAdAPI.as_view(), name='sign_ad_api'),
     path('sign/list/', views.UserSignAdsListAPI.as_view(), name='user_sign_ads_list_api'),
+    path('moderation/queue/', views.ModerationQueueAPI.as_view(), name='moderation_queue_api'),
+    path('moderation/claim/', views.ModerationClaimAPI.as_view(), name='moderation_claim_api'),
+    path('moderation/decide/', views.ModerationDecisionAPI.as_view(), name='moderation_decision_api'),
+
+    # async versions for ASGI, see config.async_views
+    path('async/list/', async_views.AsyncAdsListAPI.as_view(), name='async_ads_list_api'),
+    path('async/search/', async_views.AsyncSearchAdAPI.as_view(), name='async_search_ads'),
+    path('async/list/category/', async_views.AsyncCategoryListAPI.as_view(), name='async_categories_list'),
+    path('async/<int:pk>/', async_views.AsyncAdDetailAPI.as_view(), name='async_ad_detail_api'),
 ]
@@ -1,10 +1,24 @@
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import datetime
+
+from django.db import transaction
+from django.db.models import Q
 from django.utils import timezone
+from django.utils.text import slugify
 from django.conf import settings
+from django.core.cache import cache
 
 from rest_framework import status
 from rest_framework.response import Response
 
 from accounts.serializers import CodeVarifySerializer
+from accounts.models import free_ad_quota_keys
+from accounts.otp import get_otp
+from accounts.sms import send_otp_code
+
+from .models import Ad, AdReport, Category
+from .signals import ads_bulk_updated
+from .geo import covering_cells, distance_km
 
 
 def phone_number_verification(request):
@@ -13,7 +27,7 @@ def phone_number_verification(request):
 
     ser = CodeVarifySerializer(data=request.data)
     if ser.is_valid():
-        code_varify = user.codeverify
+        code_varify = get_otp(user)
         if code_varify.expiration_timestamp is not None and code_varify.code:
             reset_time = code_varify.expiration_timestamp + timezone.timedelta(minutes=1)
             if timezone.now() < reset_time:
@@ -21,9 +35,8 @@ def phone_number_verification(request):
                 if send_again:
                     if code_varify.send_code():
 
-                        if not settings.TESTING:
-                            # send code to phone in request
-                            print('this is code: ', code_varify.code)
+                        # send code to phone in request
+                        send_otp_code(request.data.get('phone'), code_varify.code)
 
                         return Response({'send again': 'Done'}, status=status.HTTP_200_OK)
 
@@ -50,9 +63,8 @@ def phone_number_verification(request):
         if code_varify.send_code():
             code_varify.create_code()
 
-            if not settings.TESTING:
-                # send code to phone in request
-                print('this is code: ', code_varify.code)
+            # send code to phone in request
+            send_otp_code(request.data.get('phone'), code_varify.code)
 
             return Response({'message': 'you must verification ad phone number', 'code': 'send'}, status=status.HTTP_200_OK)
 
@@ -65,10 +77,9 @@ def cancel_create(request):
     cancel = request.query_params.get('cancel')
 
     if cancel == 'True':
-        code = request.user.codeverify.code
-        if code != 0:
-            request.user.codeverify.code = 0
-            request.user.codeverify.save()
+        code_varify = get_otp(request.user)
+        if code_varify.code != 0:
+            code_varify.cancel_code()
             return Response({'status': 'cancel'}, status=status.HTTP_200_OK)
 
         return Response(
@@ -77,3 +88,188 @@ def cancel_create(request):
         )
 
     return Response({'status': 'fail', 'message': 'send True for params cancel'}, status=status.HTTP_400_BAD_REQUEST)
+
+
+def active_ads_in_order(ad_ids):
+    """
+    Fetches the active ads with the given ids in one query, keeping the order of the ids.
+    Ids of ads that are not active anymore are skipped.
+    """
+    ad_ids = list(ad_ids)
+    ads = Ad.active_objs.select_related('author').prefetch_related('category').in_bulk(ad_ids)
+    return [ads[pk] for pk in ad_ids if pk in ads]
+
+
+def filter_ads_near(ads_list, latitude, longitude, radius_km):
+    """
+    Filters ads to those within radius_km of a point, nearest first.
+
+    The query is narrowed down by the geohash cells covering the circle, then the
+    exact distance of the remaining ads is checked.
+    """
+    cells_query = Q()
+    for cell in covering_cells(latitude, longitude, radius_km):
+        cells_query |= Q(geohash__startswith=cell)
+
+    ads_with_distance = []
+    for ad in ads_list.filter(cells_query):
+        distance = distance_km(latitude, longitude, ad.latitude, ad.longitude)
+        if distance <= radius_km:
+            ads_with_distance.append((distance, ad))
+
+    ads_with_distance.sort(key=lambda item: item[0])
+    return [ad for distance, ad in ads_with_distance]
+
+
+def bulk_update_ads(queryset, **fields):
+    """
+    Updates the ads of a queryset with one UPDATE and sends ads_bulk_updated once for the whole batch.
+
+    :return: The number of updated ads.
+    """
+    pks = list(queryset.values_list('pk', flat=True))
+    if not pks:
+        return 0
+
+    fields['datetime_modified'] = timezone.now()
+    count = queryset.filter(pk__in=pks).update(**fields)
+
+    ads_bulk_updated.send(sender=Ad, pks=pks, fields=fields)
+    return count
+
+
+def bulk_soft_delete_ads(queryset, reason):
+    return bulk_update_ads(queryset.filter(is_delete=False), is_delete=True, delete_with=reason,
+                           datetime_deleted=timezone.now())
+
+
+def bulk_unblock_ads(queryset):
+    """
+    Unblocks the ads and marks their reports as investigated, like saving a single ad in the admin does.
+    """
+    queryset = queryset.filter(is_block=True)
+    with transaction.atomic():
+        AdReport.objects.filter(ad__in=queryset, investigated=False).update(investigated=True)
+        return bulk_update_ads(queryset, is_block=False, count_reports=0)
+
+
+def resolve_categories(identifiers):
+    """
+    Finds the categories of many ads with one query. Like validate_categorise, an identifier
+    is looked up by name first and then by primary key.
+
+    :return: A dict from each found identifier to its Category.
+    """
+    identifiers = set(identifiers)
+    pks = [int(identifier) for identifier in identifiers if identifier.isdecimal()]
+    categories = Category.objects.filter(Q(name__in=identifiers) | Q(pk__in=pks))
+
+    by_pk = {str(category.pk): category for category in categories}
+    by_name = {category.name: category for category in categories}
+
+    found = {}
+    for identifier in identifiers:
+        category = by_name.get(identifier) or by_pk.get(identifier)
+        if category is not None:
+            found[identifier] = category
+
+    return found
+
+
+def unique_ad_slugs(titles):
+    """
+    Makes a unique slug for each title, unique among the existing ads and among the titles themselves.
+    Existing slugs are checked with one query per round of clashes, instead of one per ad.
+    """
+    bases = [slugify(title, allow_unicode=True) for title in titles]
+    slugs = list(bases)
+    suffixes = [0] * len(bases)
+    checked, taken = set(), set()
+
+    while not checked.issuperset(slugs):
+        unchecked = set(slugs) - checked
+        taken.update(Ad.objects.filter(slug__in=unchecked).values_list('slug', flat=True))
+        checked.update(unchecked)
+
+        used = set()
+        for index, base in enumerate(bases):
+            while slugs[index] in taken or slugs[index] in used:
+                suffixes[index] += 1
+                slugs[index] = f'{base}-{suffixes[index]}'
+            used.add(slugs[index])
+
+    return slugs
+
+
+def bulk_create_ads(author, ads_data, free_count):
+    """
+    Creates ads with one INSERT for the ads and one for their categories.
+
+    :param ads_data: Validated data of AdCreateOrUpdateSerializer, with the Category objects in 'category'.
+    :param free_count: The first free_count ads are free, the rest are created with ad tokens.
+    :return: The created ads.
+    """
+    ads, ads_categories = [], []
+    slugs = unique_ad_slugs(data['title'] for data in ads_data)
+
+    for index, (data, slug) in enumerate(zip(ads_data, slugs)):
+        data = dict(data)
+        ads_categories.append(data.pop('category', []))
+
+        ad = Ad(author=author, slug=slug, is_use_ad_token=index >= free_count, **data)
+        ad.set_computed_fields()
+        ads.append(ad)
+
+    AdCategory = Ad.category.through
+    with transaction.atomic():
+        ads = Ad.objects.bulk_create(ads)
+        AdCategory.objects.bulk_create([
+            AdCategory(ad_id=ad.pk, category_id=category.pk)
+            for ad, categories in zip(ads, ads_categories) for category in categories
+        ])
+
+        # bulk_create skips the post_save signal that counts free ads, the next read counts them again.
+        # Deleted after the commit, a read in between would cache the count without these ads.
+        transaction.on_commit(lambda: cache.delete_many(free_ad_quota_keys(author.pk)))
+
+    return ads
+
+
+def encode_cursor(ad):
+    """
+    Encodes the position of an ad in the moderation queue, ordered by (datetime_modified, id).
+    """
+    position = f'{ad.datetime_modified.isoformat()}|{ad.pk}'
+    return urlsafe_b64encode(position.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """
+    Decodes a cursor made by encode_cursor.
+
+    :return: A (datetime_modified, pk) tuple, or None if the cursor is invalid.
+    """
+    try:
+        datetime_modified, pk = urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(datetime_modified), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def claim_pending_ads(user, count):
+    """
+    Claims the oldest pending ads that nobody else is reviewing, for MODERATION_LEASE_MINUTE.
+
+    Rows locked by a concurrent claim are skipped, so two staff members never get the same ad.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        pks = Ad.pending_objs.filter(Q(claimed_by=None) | Q(claim_expires__lt=now)).order_by(
+            'datetime_modified', 'id').select_for_update(skip_locked=True).values_list('pk', flat=True)[:count]
+        pks = list(pks)
+
+        Ad.objects.filter(pk__in=pks).update(
+            claimed_by=user, claim_expires=now + timezone.timedelta(minutes=settings.MODERATION_LEASE_MINUTE))
+
+    return Ad.objects.filter(pk__in=pks).select_related('author', 'claimed_by').prefetch_related(
+        'category').order_by('datetime_modified', 'id')
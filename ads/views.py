@@ -1,30 +1,60 @@
+from django.conf import settings
+from django.db import transaction
 from django.db.models import Q
 from django.db.utils import IntegrityError
+from django.utils import timezone
 
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAuthenticated, IsAdminUser
 from rest_framework.parsers import MultiPartParser
 
+from config.pagination import estimated_count
+from config.idempotency import idempotent
+
 from .serializers import AdListSerializer, AdDetailSerializer, AdCreateOrUpdateSerializer,\
-    SearchSerializer, CategorySerializer, AdReportSerializer
-from .models import Ad, Category
+    SearchSerializer, CategorySerializer, AdReportSerializer, NearSerializer, ModerationAdSerializer,\
+    ModerationClaimSerializer, ModerationDecisionSerializer, BulkCreateAdSerializer
+from .models import Ad, Category, TrendingAd, SimilarAd
 from .permissions import IsAdOwner
-from .utils import phone_number_verification, cancel_create
+from .signals import ads_bulk_updated
+from .utils import phone_number_verification, cancel_create, active_ads_in_order, filter_ads_near,\
+    encode_cursor, decode_cursor, claim_pending_ads, resolve_categories, bulk_create_ads
+from .counters import record_view, get_viewer
 
 
 class AdsListAPI(APIView):
     serializer_class = AdListSerializer
+    use_read_replica = True
 
     def get(self, request):
         ads_list = Ad.active_objs.all().order_by('-datetime_modified')
+
+        province = request.query_params.get('province')
+        if province:
+            ads_list = ads_list.filter(province=province)
+
+        city = request.query_params.get('city')
+        if city:
+            ads_list = ads_list.filter(city=city)
+
+        if 'near' in request.query_params:
+            ser_near = NearSerializer(data=request.query_params)
+            if not ser_near.is_valid():
+                return Response(ser_near.errors, status=status.HTTP_400_BAD_REQUEST)
+
+            latitude, longitude = ser_near.validated_data['near']
+            radius = ser_near.validated_data.get('radius', settings.GEO_DEFAULT_RADIUS_KM)
+            ads_list = filter_ads_near(ads_list, latitude, longitude, radius)
+
         ser = AdListSerializer(ads_list, many=True)
         return Response(ser.data, status=status.HTTP_200_OK)
 
 
 class CategoryListAPI(APIView):
     serializer_class = CategorySerializer
+    use_read_replica = True
 
     def get(self, request):
         categories_list = Category.objects.all()
@@ -33,6 +63,8 @@ class CategoryListAPI(APIView):
 
 
 class AdsListWithCategoryAPI(APIView):
+    use_read_replica = True
+
     def get(self, request, pk):
         try:
             category = Category.objects.get(pk=pk)
@@ -44,8 +76,38 @@ class AdsListWithCategoryAPI(APIView):
         return Response(ser.data, status=status.HTTP_200_OK)
 
 
+class TrendingAdsAPI(APIView):
+    serializer_class = AdListSerializer
+    use_read_replica = True
+
+    def get(self, request):
+        category = request.query_params.get('category')
+        page = request.query_params.get('page', '1')
+
+        if not page.isdigit() or int(page) < 1:
+            return Response({'message': 'page must be a positive number'}, status=status.HTTP_400_BAD_REQUEST)
+
+        if category is not None and not category.isdigit():
+            return Response({'message': f'There is no category with this pk({category})'},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        page_size = settings.TRENDING_ADS_PAGE_SIZE
+        first_rank = (int(page) - 1) * page_size + 1
+
+        ad_ids = TrendingAd.objects.filter(
+            category=category, rank__gte=first_rank, rank__lt=first_rank + page_size,
+        ).values_list('ad_id', flat=True)
+
+        # The feed may hold ads that were deactivated after it was computed.
+        ads_list = active_ads_in_order(ad_ids)
+
+        ser = AdListSerializer(ads_list, many=True)
+        return Response(ser.data, status=status.HTTP_200_OK)
+
+
 class SearchAdAPI(APIView):
     serializer_class = SearchSerializer
+    use_read_replica = True
 
     def post(self, request):
         ser_search = SearchSerializer(data=request.data)
@@ -62,6 +124,7 @@ class SearchAdAPI(APIView):
 
 class AdDetailAPI(APIView):
     serializer_class = AdDetailSerializer
+    use_read_replica = True
 
     def get(self, request, pk):
         try:
@@ -69,10 +132,25 @@ class AdDetailAPI(APIView):
         except Ad.DoesNotExist:
             return Response({'message': f'There is no ad with this pk {pk}'}, status=status.HTTP_400_BAD_REQUEST)
 
+        record_view(ad.pk, get_viewer(request))
+
         ser = AdDetailSerializer(ad)
         return Response(ser.data, status=status.HTTP_200_OK)
 
 
+class SimilarAdsAPI(APIView):
+    serializer_class = AdListSerializer
+    use_read_replica = True
+
+    def get(self, request, pk):
+        if not Ad.active_objs.filter(pk=pk).exists():
+            return Response({'message': f'There is no ad with this pk {pk}'}, status=status.HTTP_400_BAD_REQUEST)
+
+        ad_ids = SimilarAd.objects.filter(ad=pk).values_list('similar_id', flat=True)
+        ser = AdListSerializer(active_ads_in_order(ad_ids), many=True)
+        return Response(ser.data, status=status.HTTP_200_OK)
+
+
 class ReportAdAPI(APIView):
     permission_classes = (IsAuthenticated, )
 
@@ -103,6 +181,7 @@ class CreateAdAPI(APIView):
     serializer_class = AdCreateOrUpdateSerializer
     parser_classes = (MultiPartParser, )
 
+    @idempotent
     def post(self, request):
         user = request.user
         double_check = request.query_params.get('use')
@@ -143,13 +222,26 @@ class CreateAdAPI(APIView):
                         return result
 
                 ser.validated_data['author'] = user
-
-                ser.save()
-
-                if is_use_ad_token:
-                    ser.validated_data['is_use_ad_token'] = True
-                    request.user.token_activated = False
-                    request.user.save()
+                ser.validated_data['is_use_ad_token'] = is_use_ad_token
+
+                with transaction.atomic():
+                    # The quota read above may be stale. Checked again with the row of the user locked until
+                    # the ad is inserted, concurrent requests can not all take the last free ad.
+                    if not is_use_ad_token:
+                        user.lock_ad_quota()
+                        if not user.has_free_ad_quota(refresh=True):
+                            return Response(
+                                {'message': 'You have reached your ad creation limit. '
+                                            'for use ad token send use=True in params of url'},
+                                status=status.HTTP_400_BAD_REQUEST,
+                            )
+
+                    ser.save()
+
+                    # The activated token is spent only if the ad is created.
+                    if is_use_ad_token and not user.consume_activated_token():
+                        transaction.set_rollback(True)
+                        return Response({'message': 'you have not ad token'}, status=status.HTTP_400_BAD_REQUEST)
 
                 data = {
                     'status': 'Wait for confirmation',
@@ -159,6 +251,104 @@ class CreateAdAPI(APIView):
             return Response(ser.errors, status.HTTP_400_BAD_REQUEST)
 
 
+class BulkCreateAdAPI(APIView):
+    """
+    Creates many ads of a seller in one request. Each ad is validated like in CreateAdAPI, the valid ads
+    are inserted together and the response has a result for each ad, in the order they were sent.
+    Ads beyond the free quota use ad tokens, which needs use=True in params of url.
+    """
+    permission_classes = (IsAuthenticated, )
+    serializer_class = BulkCreateAdSerializer
+    parser_classes = (MultiPartParser, )
+
+    @idempotent
+    def post(self, request):
+        user = request.user
+        ser_bulk = BulkCreateAdSerializer(data=request.data)
+        if not ser_bulk.is_valid():
+            return Response(ser_bulk.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        results = []
+        valid_ads = []
+        user_phone_e164 = user.phone_number.as_e164
+        for index, ad_data in enumerate(ser_bulk.validated_data['ads']):
+            image = request.FILES.get(f'image_{index}')
+            if image is not None:
+                ad_data['image'] = image
+
+            ser = AdCreateOrUpdateSerializer(data=ad_data)
+            if not ser.is_valid():
+                results.append({'index': index, 'status': 'fail', 'errors': ser.errors})
+
+            # There is no code verification for a batch, ads must use the phone of the user.
+            elif not ser.validated_data['phone'] == user_phone_e164:
+                errors = {'phone': ['Ads created in bulk must use the phone number of your account.']}
+                results.append({'index': index, 'status': 'fail', 'errors': errors})
+
+            else:
+                results.append(None)
+                valid_ads.append((index, ser.validated_data))
+
+        categories = resolve_categories(
+            identifier for index, data in valid_ads for identifier in data.get('category', []))
+
+        ads_data = []
+        for index, data in valid_ads:
+            unknown = [identifier for identifier in data.get('category', []) if identifier not in categories]
+            if unknown:
+                results[index] = {'index': index, 'status': 'fail',
+                                  'errors': {'category': [f'There is no category with this value ({unknown[0]})']}}
+            else:
+                data['category'] = [categories[identifier] for identifier in data.get('category', [])]
+                ads_data.append((index, data))
+
+        if not ads_data:
+            return Response({'results': results}, status=status.HTTP_400_BAD_REQUEST)
+
+        with transaction.atomic():
+            # The row of the user stays locked until the ads are inserted, see CustomUser.lock_ad_quota.
+            user.lock_ad_quota()
+            count, reset_time = user.free_ad_quota(refresh=True)
+            free_count = max(0, settings.FREE_ADS_MONTHLY_QUOTA - count)
+            token_count = max(0, len(ads_data) - free_count)
+
+            if token_count and not request.query_params.get('use') == 'True':
+                return Response(
+                    {'message': f'{token_count} of the ads are over your ad creation limit. '
+                                f'for use ad token send use=True in params of url'},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            if token_count and not user.use_ad_tokens(token_count):
+                return Response({'message': f'you have not {token_count} ad token'},
+                                status=status.HTTP_400_BAD_REQUEST)
+
+            ads = bulk_create_ads(user, [data for index, data in ads_data], free_count)
+
+        for (index, data), ad in zip(ads_data, ads):
+            results[index] = {'index': index, 'status': 'Wait for confirmation', 'id': ad.pk}
+
+        return Response({'results': results}, status=status.HTTP_201_CREATED)
+
+
+class AdQuotaAPI(APIView):
+    permission_classes = (IsAuthenticated, )
+
+    def get(self, request):
+        user = request.user
+        count, reset_time = user.free_ad_quota()
+        quota = settings.FREE_ADS_MONTHLY_QUOTA
+
+        data = {
+            'free_ads_quota': quota,
+            'free_ads_used': count,
+            'free_ads_remaining': max(0, quota - count),
+            'reset_time': reset_time,
+            'ad_token': user.ad_token,
+        }
+        return Response(data, status=status.HTTP_200_OK)
+
+
 class UpdateAdAPI(APIView):
     permission_classes = (IsAuthenticated, IsAdOwner)
     serializer_class = AdCreateOrUpdateSerializer
@@ -179,7 +369,7 @@ class UpdateAdAPI(APIView):
         if ser.is_valid():
             user_phone_e164 = request.user.phone_number.as_e164
             phone_validate = ser.validated_data['phone']
-            if not (phone_validate == user_phone_e164) and not (phone_validate == ad.phone):
+            if not (phone_validate == user_phone_e164) and not (phone_validate == ad.phone.as_e164):
                 result = phone_number_verification(request)
 
                 if result is not True:
@@ -233,3 +423,77 @@ class UserSignAdsListAPI(APIView):
         ads = Ad.active_objs.filter(sign=request.user.pk)
         ser = AdListSerializer(ads, many=True)
         return Response(ser.data, status=status.HTTP_200_OK)
+
+
+class ModerationQueueAPI(APIView):
+    permission_classes = (IsAdminUser, )
+    serializer_class = ModerationAdSerializer
+
+    def get(self, request):
+        # Like claim_pending_ads, the ads another staff member is reviewing are not listed until the lease expires.
+        ads_list = Ad.pending_objs.filter(
+            Q(claimed_by=request.user) | Q(claimed_by=None) | Q(claim_expires__lt=timezone.now())).select_related(
+            'author', 'claimed_by').prefetch_related('category').order_by('datetime_modified', 'id')
+
+        cursor = request.query_params.get('cursor')
+        if cursor:
+            position = decode_cursor(cursor)
+            if position is None:
+                return Response({'message': 'Invalid cursor.'}, status=status.HTTP_400_BAD_REQUEST)
+
+            datetime_modified, pk = position
+            ads_list = ads_list.filter(Q(datetime_modified__gt=datetime_modified) |
+                                       Q(datetime_modified=datetime_modified, pk__gt=pk))
+
+        page_size = settings.MODERATION_QUEUE_PAGE_SIZE
+        ads_list = list(ads_list[:page_size + 1])
+        next_cursor = encode_cursor(ads_list[page_size - 1]) if len(ads_list) > page_size else None
+
+        ser = ModerationAdSerializer(ads_list[:page_size], many=True)
+        data = {'count': estimated_count(Ad.pending_objs.all()), 'results': ser.data, 'next': next_cursor}
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ModerationClaimAPI(APIView):
+    permission_classes = (IsAdminUser, )
+    serializer_class = ModerationClaimSerializer
+
+    def post(self, request):
+        ser = ModerationClaimSerializer(data=request.data)
+
+        if ser.is_valid():
+            count = ser.validated_data.get('count', settings.MODERATION_MAX_CLAIM)
+            ads_list = claim_pending_ads(request.user, count)
+            return Response(ModerationAdSerializer(ads_list, many=True).data, status=status.HTTP_200_OK)
+
+        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+class ModerationDecisionAPI(APIView):
+    permission_classes = (IsAdminUser, )
+    serializer_class = ModerationDecisionSerializer
+
+    def post(self, request):
+        ser = ModerationDecisionSerializer(data=request.data)
+
+        if ser.is_valid():
+            now = timezone.now()
+            # Ads claimed by another staff member whose lease has not expired are left untouched.
+            ads_list = Ad.pending_objs.filter(pk__in=ser.validated_data['ads']).filter(
+                Q(claimed_by=request.user) | Q(claimed_by=None) | Q(claim_expires__lt=now))
+
+            if ser.validated_data['decision'] == 'confirm':
+                fields = {'confirmation': True}
+            else:
+                fields = {'is_delete': True, 'delete_with': 'staff', 'datetime_deleted': now}
+            fields.update(claimed_by=None, claim_expires=None, datetime_modified=now)
+
+            # One UPDATE, without the SELECT of bulk_update_ads. Pending ads are in no feed, the receivers
+            # get the requested pks, the ads claimed by another staff member among them are not changed.
+            count = ads_list.update(**fields)
+            if count:
+                ads_bulk_updated.send(sender=Ad, pks=ser.validated_data['ads'], fields=fields)
+
+            return Response({'status': 'Done', 'count': count}, status=status.HTTP_200_OK)
+
+        return Response(ser.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,48 @@
+import asyncio
+
+from asgiref.sync import sync_to_async
+
+from rest_framework.views import APIView
+
+
+class AsyncAPIView(APIView):
+    """
+    APIView with coroutine handlers, for views served under ASGI (config.asgi).
+
+    DRF dispatches synchronously. This dispatch runs the sync parts of DRF (authentication, permissions,
+    throttling) in a thread and awaits the handler, so the worker serves other requests while a handler
+    waits on the database or on a slow client. Handlers must use the async ORM interfaces
+    (aget, acount, async for) and load the relations the serializer reads with select_related and
+    prefetch_related, lazy loading a relation in a handler raises SynchronousOnlyOperation.
+
+    Usage:
+        class AsyncAdsListAPI(AsyncAPIView):
+            async def get(self, request):
+                ads_list = [ad async for ad in Ad.active_objs.select_related('author')]
+                ...
+    """
+
+    async def dispatch(self, request, *args, **kwargs):
+        self.args = args
+        self.kwargs = kwargs
+        request = self.initialize_request(request, *args, **kwargs)
+        self.request = request
+        self.headers = self.default_response_headers
+
+        try:
+            await sync_to_async(self.initial)(request, *args, **kwargs)
+
+            if request.method.lower() in self.http_method_names:
+                handler = getattr(self, request.method.lower(), self.http_method_not_allowed)
+            else:
+                handler = self.http_method_not_allowed
+
+            response = handler(request, *args, **kwargs)
+            if asyncio.iscoroutine(response):
+                response = await response
+
+        except Exception as exc:
+            response = self.handle_exception(exc)
+
+        self.response = self.finalize_response(request, response, *args, **kwargs)
+        return self.response
@@ -1,6 +1,8 @@
+import logging
 import os
 
 from celery import Celery
+from celery.signals import worker_process_shutdown
 
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
@@ -11,3 +13,10 @@ app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 
 app.autodiscover_tasks()
+
+
+@worker_process_shutdown.connect
+def log_connection_stats(**kwargs):
+    from config.db_metrics import connection_stats
+
+    logging.getLogger(__name__).info('Database connections of the worker process: %s', connection_stats.snapshot())
@@ -0,0 +1,114 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base
+
+from psycopg2 import extensions
+
+from config.db_metrics import connection_stats
+
+from .pool import ConnectionPool, PoolTimeout
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+# Pools inherited from the parent process of a fork (celery prefork workers). Their connections are sessions
+# of the parent, closing them here would end them for the parent too, so they are only kept referenced.
+_inherited_pools = []
+
+
+def pools_state():
+    return {
+        alias: {'size': pool.size, 'in_use': pool.in_use, 'idle': pool.idle_count()}
+        for (alias, *database), pool in _pools.items() if pool.pid == os.getpid()
+    }
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    The PostgreSQL backend, counting connection churn in config.db_metrics.connection_stats.
+
+    If the database settings have POOL = {'SIZE': ..., 'TIMEOUT': ..., 'CHECK_AFTER_SECONDS': ...},
+    connections are taken from a pool of the process, and returned to it instead of being closed.
+    Use CONN_MAX_AGE = 0 with a pool, so the connection goes back to the pool at the end of each request.
+    """
+
+    def get_pool(self):
+        pool_settings = self.settings_dict.get('POOL')
+        if not pool_settings:
+            return None
+
+        # The test runner switches the NAME of an alias, connections to the old database must not be reused.
+        key = (self.alias, self.settings_dict['NAME'], self.settings_dict['HOST'], self.settings_dict['PORT'],
+               self.settings_dict['USER'])
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is not None and pool.pid != os.getpid():
+                _inherited_pools.append(pool)
+                pool = None
+
+            if pool is None:
+                check_after = pool_settings.get('CHECK_AFTER_SECONDS', 30)
+                pool = ConnectionPool(
+                    size=pool_settings['SIZE'], timeout=pool_settings.get('TIMEOUT', 10),
+                    check=lambda connection, idle_seconds: is_pooled_connection_usable(
+                        connection, idle_seconds, check_after),
+                )
+                _pools[key] = pool
+
+        return pool
+
+    def get_new_connection(self, conn_params):
+        pool = self.get_pool()
+        if pool is None:
+            connection = super().get_new_connection(conn_params)
+            connection_stats.record_opened()
+            return connection
+
+        try:
+            connection = pool.getconn(lambda: super(DatabaseWrapper, self).get_new_connection(conn_params))
+        except PoolTimeout as e:
+            raise self.Database.OperationalError(str(e))
+
+        # super().get_new_connection sets the isolation level of the wrapper, only for new connections.
+        self.isolation_level = base.IsolationLevel(
+            self.settings_dict['OPTIONS'].get('isolation_level', base.IsolationLevel.READ_COMMITTED))
+        self._pool = pool
+        return connection
+
+    def _close(self):
+        pool = getattr(self, '_pool', None)
+        if pool is None:
+            if self.connection is not None:
+                super()._close()
+                connection_stats.record_closed()
+            return
+
+        connection, self._pool = self.connection, None
+        if connection is None or pool.pid != os.getpid():
+            return
+
+        # A connection closed in a transaction or after an error is not reused, the next one starts clean.
+        discard = self.in_atomic_block or connection.closed or \
+            connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE
+        pool.putconn(connection, discard=discard)
+
+
+def is_pooled_connection_usable(connection, idle_seconds, check_after):
+    """
+    Checks an idle connection of the pool before reuse. Connections idle for more than
+    check_after seconds run a query, the server may have closed them in the meantime.
+    """
+    if connection.closed or connection.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+        return False
+
+    if idle_seconds > check_after:
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            return False
+
+    return True
@@ -0,0 +1,86 @@
+import os
+import threading
+import time
+
+from config.db_metrics import connection_stats
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class ConnectionPool:
+    """
+    A pool of at most 'size' database connections, shared by the threads of a process.
+
+    A thread waits up to 'timeout' seconds for a free connection. Idle connections are reused most recently
+    used first, and checked with 'check(connection, idle_seconds)' before reuse. Connections that fail
+    the check are closed and replaced by new ones.
+    """
+
+    def __init__(self, size, timeout, check):
+        self.size = size
+        self.timeout = timeout
+        self.check = check
+        self.pid = os.getpid()
+        self.in_use = 0
+        self._idle = []  # (connection, time returned) pairs, the last one is the most recently used
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def getconn(self, connect):
+        """
+        :param connect: Opens a new connection, when there is no usable idle one.
+        """
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.timeout):
+            connection_stats.record_pool_timeout()
+            raise PoolTimeout(f'No free database connection in {self.timeout} seconds, all {self.size} are in use.')
+        connection_stats.record_pool_wait(time.monotonic() - start)
+
+        try:
+            connection = self._get_idle()
+            if connection is None:
+                connection = connect()
+                connection_stats.record_opened()
+        except BaseException:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self.in_use += 1
+        connection_stats.record_pool_taken()
+        return connection
+
+    def putconn(self, connection, discard=False):
+        with self._lock:
+            self.in_use -= 1
+            if not discard:
+                self._idle.append((connection, time.monotonic()))
+        connection_stats.record_pool_returned()
+
+        if discard:
+            self._close(connection)
+        self._slots.release()
+
+    def idle_count(self):
+        with self._lock:
+            return len(self._idle)
+
+    def _get_idle(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    return None
+                connection, returned_at = self._idle.pop()
+
+            if self.check(connection, time.monotonic() - returned_at):
+                return connection
+            self._close(connection)
+
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        connection_stats.record_closed()
@@ -0,0 +1,101 @@
+import threading
+
+from prometheus_client import Counter, Gauge
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from rest_framework import status
+
+
+# The same stats for /metrics. Counters and gauges of prometheus_client are kept in PROMETHEUS_MULTIPROC_DIR
+# when it is set, so /metrics reports the sum of all the processes.
+DB_CONNECTIONS_OPENED = Counter('db_connections_opened', 'Database connections opened')
+DB_CONNECTIONS_CLOSED = Counter('db_connections_closed', 'Database connections closed')
+DB_POOL_CHECKOUTS = Counter('db_pool_checkouts', 'Connections taken from the pool')
+DB_POOL_WAIT_SECONDS = Counter('db_pool_wait_seconds', 'Time spent waiting for a free pool connection')
+DB_POOL_WAIT_SECONDS_MAX = Gauge('db_pool_wait_seconds_max', 'Longest wait for a free pool connection',
+                                 multiprocess_mode='max')
+DB_POOL_TIMEOUTS = Counter('db_pool_timeouts', 'Waits for a pool connection that timed out')
+DB_POOL_IN_USE = Gauge('db_pool_connections_in_use', 'Pool connections taken by a thread',
+                       multiprocess_mode='livesum')
+
+
+class ConnectionStats:
+    """
+    Database connection churn and pool wait time of this process, since it started.
+    Filled by the config.db_backends.postgresql backend, and exported to /metrics.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.opened = 0
+            self.closed = 0
+            self.pool_checkouts = 0
+            self.pool_wait_seconds_total = 0.0
+            self.pool_wait_seconds_max = 0.0
+            self.pool_timeouts = 0
+
+    def record_opened(self):
+        with self._lock:
+            self.opened += 1
+        DB_CONNECTIONS_OPENED.inc()
+
+    def record_closed(self):
+        with self._lock:
+            self.closed += 1
+        DB_CONNECTIONS_CLOSED.inc()
+
+    def record_pool_wait(self, seconds):
+        with self._lock:
+            self.pool_checkouts += 1
+            self.pool_wait_seconds_total += seconds
+            self.pool_wait_seconds_max = max(self.pool_wait_seconds_max, seconds)
+            wait_seconds_max = self.pool_wait_seconds_max
+        DB_POOL_CHECKOUTS.inc()
+        DB_POOL_WAIT_SECONDS.inc(seconds)
+        DB_POOL_WAIT_SECONDS_MAX.set(wait_seconds_max)
+
+    def record_pool_taken(self):
+        DB_POOL_IN_USE.inc()
+
+    def record_pool_returned(self):
+        DB_POOL_IN_USE.dec()
+
+    def record_pool_timeout(self):
+        with self._lock:
+            self.pool_timeouts += 1
+        DB_POOL_TIMEOUTS.inc()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'opened': self.opened,
+                'closed': self.closed,
+                'pool_checkouts': self.pool_checkouts,
+                'pool_wait_seconds_total': round(self.pool_wait_seconds_total, 6),
+                'pool_wait_seconds_max': round(self.pool_wait_seconds_max, 6),
+                'pool_timeouts': self.pool_timeouts,
+            }
+
+
+connection_stats = ConnectionStats()
+
+
+class DatabaseConnectionsAPI(APIView):
+    """
+    Connection stats of the process serving the request, to size DB_POOL_SIZE for the worker count.
+    Many opened connections per request mean the connections are not reused, a high pool wait time
+    means the pool is too small for the threads of the process.
+    """
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request):
+        from config.db_backends.postgresql.base import pools_state
+
+        data = connection_stats.snapshot()
+        data['pools'] = pools_state()
+        return Response(data, status=status.HTTP_200_OK)
@@ -0,0 +1,108 @@
+from contextvars import ContextVar
+import hashlib
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from ads.counters import get_client_ip
+
+# State of the current request, set by ReplicaRoutingMiddleware.
+# Outside of requests (celery tasks, shell) every query goes to the primary.
+_use_replica = ContextVar('use_replica', default=False)
+_wrote_primary = ContextVar('wrote_primary', default=False)
+
+
+def sticky_key(request):
+    """
+    Cache key of the marker that keeps the reads of a client on the primary after it wrote.
+    A client is its Authorization header, its session cookie or its ip address, see ads.counters.get_client_ip.
+    """
+    client = request.META.get('HTTP_AUTHORIZATION') or request.COOKIES.get(settings.SESSION_COOKIE_NAME) or \
+        get_client_ip(request) or ''
+    return f'db_sticky:{hashlib.sha256(client.encode()).hexdigest()}'
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of read-only views to a random database of DATABASE_REPLICAS, everything else to default.
+
+    A view is read-only if it sets use_read_replica = True. Its reads stay on the primary if the request
+    already wrote, inside a transaction, or for REPLICA_STICKY_SECONDS after a write of the same client,
+    so a client always reads its own writes.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not settings.DATABASE_REPLICAS or not _use_replica.get() or _wrote_primary.get():
+            return 'default'
+
+        if connections['default'].in_atomic_block:
+            return 'default'
+
+        return random.choice(settings.DATABASE_REPLICAS)
+
+    def db_for_write(self, model, **hints):
+        _wrote_primary.set(True)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas have the same data as the primary.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Sets the state of ReplicaRouter for each request. Sync and async, like config.metrics.MetricsMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        use_replica_token = _use_replica.set(False)
+        wrote_primary_token = _wrote_primary.set(False)
+
+        try:
+            response = self.get_response(request)
+
+            if _wrote_primary.get():
+                cache.set(sticky_key(request), True, timeout=settings.REPLICA_STICKY_SECONDS)
+        finally:
+            _use_replica.reset(use_replica_token)
+            _wrote_primary.reset(wrote_primary_token)
+
+        return response
+
+    async def __acall__(self, request):
+        use_replica_token = _use_replica.set(False)
+        wrote_primary_token = _wrote_primary.set(False)
+
+        try:
+            response = await self.get_response(request)
+
+            # The writes of the view, run by sync_to_async, are copied back to this context.
+            if _wrote_primary.get():
+                await cache.aset(sticky_key(request), True, timeout=settings.REPLICA_STICKY_SECONDS)
+        finally:
+            _use_replica.reset(use_replica_token)
+            _wrote_primary.reset(wrote_primary_token)
+
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if settings.DATABASE_REPLICAS and getattr(view_class, 'use_read_replica', False):
+            _use_replica.set(not cache.get(sticky_key(request)))
@@ -0,0 +1,99 @@
+from functools import wraps
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.uploadedfile import UploadedFile
+from django.http import QueryDict
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+def idempotency_cache_key(request, key):
+    digest = hashlib.sha256(key.encode()).hexdigest()
+    return f'idempotency:{request.user.pk}:{request.method}:{request.path}:{digest}'
+
+
+def request_digest(request):
+    """
+    Returns a hash of the query parameters and the data of a request. It is computed from the parsed data,
+    so a retry hashes the same even if its multipart boundary is different. Files are hashed by their content.
+    """
+    digest = hashlib.sha256()
+
+    for source in (request.query_params, request.data):
+        if isinstance(source, QueryDict):
+            items = sorted(source.lists())
+        elif isinstance(source, dict):
+            items = sorted(source.items())
+        else:
+            items = [('', source)]
+
+        for name, values in items:
+            digest.update(json.dumps(name).encode())
+            for value in values if isinstance(source, QueryDict) else [values]:
+                if isinstance(value, UploadedFile):
+                    for chunk in value.chunks():
+                        digest.update(chunk)
+                    value.seek(0)
+                else:
+                    digest.update(json.dumps(value, sort_keys=True, default=str).encode())
+
+    return digest.hexdigest()
+
+
+def idempotent(view_method):
+    """
+    A decorator for APIView methods that replays the response of a request repeated with the
+    same Idempotency-Key header, instead of running the view again.
+
+    Successful responses are kept in the cache for IDEMPOTENCY_KEY_TTL_HOURS, with a hash of the
+    request. A repeat that arrives while the first request is still running gets 409 Conflict, and
+    a request that reuses a key with different data gets 422 Unprocessable Entity.
+
+    Usage:
+        class CreateAdAPI(APIView):
+            @idempotent
+            def post(self, request):
+                ...
+    """
+    @wraps(view_method)
+    def inner(self, request, *args, **kwargs):
+        key = request.headers.get('Idempotency-Key')
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > 255:
+            return Response({'message': 'Idempotency-Key is too long'}, status=status.HTTP_400_BAD_REQUEST)
+
+        cache_key = idempotency_cache_key(request, key)
+        digest = request_digest(request)
+        saved_response = cache.get(cache_key)
+        if saved_response is not None:
+            if saved_response['digest'] != digest:
+                return Response({'message': 'This Idempotency-Key was used with a different request'},
+                                status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+            response = Response(saved_response['data'], status=saved_response['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+
+        lock_key = f'{cache_key}:lock'
+        if not cache.add(lock_key, 1, timeout=settings.IDEMPOTENCY_LOCK_SECONDS):
+            return Response({'message': 'A request with this Idempotency-Key is in progress'},
+                            status=status.HTTP_409_CONFLICT)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+
+            if status.is_success(response.status_code):
+                cache.set(cache_key, {'status': response.status_code, 'data': response.data, 'digest': digest},
+                          timeout=settings.IDEMPOTENCY_KEY_TTL_HOURS * 60 * 60)
+        finally:
+            cache.delete(lock_key)
+
+        return response
+
+    return inner
@@ -0,0 +1,254 @@
+from collections import defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from functools import wraps
+import ipaddress
+import os
+import time
+
+from django.conf import settings
+from django.db import connections
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse, HttpResponseForbidden
+
+from celery.signals import task_prerun, task_postrun, worker_ready
+from prometheus_client import Counter, Histogram, CollectorRegistry, REGISTRY, CONTENT_TYPE_LATEST, \
+    generate_latest, multiprocess, start_http_server
+
+# The database connection metrics are exported by config.db_metrics.
+import config.db_metrics  # noqa: F401
+
+# With several processes (gunicorn or uvicorn workers, celery prefork) set PROMETHEUS_MULTIPROC_DIR to a
+# directory shared by the processes, before they start. /metrics then reports the sum of all of them.
+
+REQUEST_LATENCY = Histogram(
+    'http_request_duration_seconds', 'Time to respond to a request', ('view', 'method', 'status'))
+REQUEST_DB_QUERIES = Histogram(
+    'http_request_db_queries', 'Database queries run by a request', ('view', ),
+    buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200, 500))
+REQUEST_DB_TIME = Histogram(
+    'http_request_db_duration_seconds', 'Time a request spent in database queries', ('view', ))
+REQUEST_SERIALIZER_TIME = Histogram(
+    'http_request_serializer_duration_seconds', 'Time a request spent validating and serializing with DRF serializers',
+    ('view', ))
+RESPONSE_SIZE = Histogram(
+    'http_response_size_bytes', 'Size of the response body', ('view', ),
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304))
+
+TASK_DURATION = Histogram('celery_task_duration_seconds', 'Run time of a celery task', ('task', 'state'))
+TASK_ROWS_AFFECTED = Counter('celery_task_rows_affected', 'Rows updated or inserted by a task of ads.tasks', ('task', ))
+
+
+class RequestTimings:
+    """
+    Where the time of the current request goes: seconds per phase (db, serialize, auth, render)
+    and the query count.
+    """
+
+    def __init__(self):
+        self.seconds = defaultdict(float)
+        self.db_queries = 0
+        self.active_phases = set()
+
+
+_request_timings = ContextVar('request_timings', default=None)
+
+
+def current_timings():
+    """
+    :return: The RequestTimings of the current request, or None outside of requests.
+    """
+    return _request_timings.get()
+
+
+def time_query(execute, sql, params, many, context):
+    """
+    A connection.execute_wrapper, adding the query to the timings of the current request.
+    """
+    timings = _request_timings.get()
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if timings is not None:
+            timings.db_queries += 1
+            timings.seconds['db'] += time.perf_counter() - start
+
+
+def timed_phase(phase):
+    """
+    Adds the run time of the decorated function to a phase of the current request.
+    """
+    def decorator(function):
+        @wraps(function)
+        def inner(*args, **kwargs):
+            timings = _request_timings.get()
+            # Nested calls, like nested serializers, are timed with the outer one.
+            if timings is None or phase in timings.active_phases:
+                return function(*args, **kwargs)
+
+            timings.active_phases.add(phase)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                timings.seconds[phase] += time.perf_counter() - start
+                timings.active_phases.discard(phase)
+
+        inner.timed = True
+        return inner
+
+    return decorator
+
+
+def instrument_drf():
+    """
+    Times the DRF serializers, authentication and rendering. DRF has no hooks around them and the views
+    create serializers directly, so the methods every request goes through are wrapped once:
+    BaseSerializer.is_valid and .data, Request._authenticate and Response.rendered_content.
+    """
+    from rest_framework.serializers import BaseSerializer
+    from rest_framework.request import Request
+    from rest_framework.response import Response
+
+    if getattr(BaseSerializer.is_valid, 'timed', False):
+        return
+
+    BaseSerializer.is_valid = timed_phase('serialize')(BaseSerializer.is_valid)
+    BaseSerializer.data = property(timed_phase('serialize')(BaseSerializer.data.fget))
+    Request._authenticate = timed_phase('auth')(Request._authenticate)
+    Response.rendered_content = property(timed_phase('render')(Response.rendered_content.fget))
+
+
+def view_name(request):
+    resolver_match = getattr(request, 'resolver_match', None)
+    return resolver_match.view_name if resolver_match else 'unresolved'
+
+
+def timed_queries():
+    """
+    :return: A context manager that adds the queries of every database to the timings of the current request.
+    """
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(time_query))
+    return stack
+
+
+class MetricsMiddleware:
+    """
+    Records the latency, database queries and time, serializer time and response size of each request,
+    by the name of its view.
+
+    Sync and async, under ASGI the requests of the async views are not run in a thread for this middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        instrument_drf()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        try:
+            with timed_queries():
+                response = self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+
+        self.observe(request, response, timings, start)
+        return response
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+
+        try:
+            with timed_queries():
+                response = await self.get_response(request)
+        finally:
+            _request_timings.reset(token)
+
+        self.observe(request, response, timings, start)
+        return response
+
+    @staticmethod
+    def observe(request, response, timings, start):
+        view = view_name(request)
+        if view != 'metrics':
+            REQUEST_LATENCY.labels(view, request.method, response.status_code).observe(time.perf_counter() - start)
+            REQUEST_DB_QUERIES.labels(view).observe(timings.db_queries)
+            REQUEST_DB_TIME.labels(view).observe(timings.seconds['db'])
+            REQUEST_SERIALIZER_TIME.labels(view).observe(timings.seconds['serialize'])
+            if not response.streaming:
+                RESPONSE_SIZE.labels(view).observe(len(response.content))
+
+
+def metrics_registry():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+
+    return REGISTRY
+
+
+def can_read_metrics(request):
+    """
+    The metrics are for the Prometheus server at one of METRICS_ALLOWED_IPS, and for staff logged in to the admin.
+    """
+    if request.user.is_authenticated and request.user.is_staff:
+        return True
+
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS_ALLOWED_IPS)
+
+
+def metrics_view(request):
+    if not can_read_metrics(request):
+        return HttpResponseForbidden()
+
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
+
+
+# Celery tasks. This module is imported by the workers through CELERY_IMPORTS.
+
+_task_starts = {}
+
+
+@task_prerun.connect
+def start_task_timer(task_id=None, **kwargs):
+    _task_starts[task_id] = time.perf_counter()
+
+
+@task_postrun.connect
+def observe_task(task_id=None, task=None, retval=None, state=None, **kwargs):
+    start = _task_starts.pop(task_id, None)
+    if start is not None:
+        TASK_DURATION.labels(task.name, state or 'UNKNOWN').observe(time.perf_counter() - start)
+
+    # The tasks of ads.tasks return the number of rows they changed.
+    if task.name.startswith('ads.tasks.') and isinstance(retval, int) and not isinstance(retval, bool):
+        TASK_ROWS_AFFECTED.labels(task.name).inc(retval)
+
+
+@worker_ready.connect
+def start_worker_metrics_server(**kwargs):
+    port = os.environ.get('CELERY_METRICS_PORT')
+    if port:
+        start_http_server(int(port), registry=metrics_registry())
@@ -0,0 +1,76 @@
+import json
+
+from django.conf import settings
+from django.core.paginator import Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def table_estimate(queryset):
+    """
+    Returns the row count PostgreSQL keeps for the table of a queryset in pg_class.reltuples.
+    It is -1 for a table that was never vacuumed or analyzed.
+    """
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+                       [queryset.model._meta.db_table])
+        row = cursor.fetchone()
+
+    return row[0] if row else -1
+
+
+def explain_estimate(queryset):
+    """
+    Returns the number of rows the PostgreSQL planner expects a queryset to return.
+    """
+    sql, params = queryset.order_by().query.sql_with_params()
+    connection = connections[queryset.db]
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+
+    return plan[0]['Plan']['Plan Rows']
+
+
+def estimated_count(queryset, threshold=None):
+    """
+    Counts the rows of a queryset without a COUNT(*) when the count is large.
+
+    Only unfiltered querysets are estimated, with pg_class.reltuples, or with the row estimate of
+    EXPLAIN when they are distinct. The estimates of filtered querysets can be far off, like the
+    results of an admin search, so they are always counted exactly. When the estimate is below the
+    threshold (ESTIMATED_COUNT_THRESHOLD by default), or the database is not PostgreSQL, the exact
+    COUNT(*) is returned too.
+    """
+    if threshold is None:
+        threshold = settings.ESTIMATED_COUNT_THRESHOLD
+
+    if connections[queryset.db].vendor != 'postgresql' or queryset.query.where:
+        return queryset.count()
+
+    if queryset.query.distinct:
+        estimate = explain_estimate(queryset)
+    else:
+        estimate = table_estimate(queryset)
+
+    if estimate < threshold:
+        return queryset.count()
+
+    return estimate
+
+
+class EstimatedCountPaginator(Paginator):
+    """
+    A paginator whose count is estimated on large querysets, see estimated_count.
+    """
+
+    @cached_property
+    def count(self):
+        if hasattr(self.object_list, 'query'):
+            return estimated_count(self.object_list)
+
+        return super().count
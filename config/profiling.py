@@ -0,0 +1,230 @@
+from contextlib import ExitStack
+import cProfile
+import io
+import marshal
+import pstats
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.http import HttpResponse
+from django.utils import timezone
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAdminUser
+from rest_framework.exceptions import APIException
+from rest_framework import status
+
+from accounts.authentication import CachedJWTAuthentication
+from config.metrics import current_timings, view_name
+
+# Phases of RequestTimings reported in the Server-Timing header
+SERVER_TIMING_PHASES = ('auth', 'db', 'serialize', 'render')
+
+
+def profile_key(profile_id):
+    return f'profile:{profile_id}'
+
+
+def requested_profile(request):
+    """
+    :return: 'timing', 'cprofile' or None, from the X-Profile header or the profile query parameter.
+    """
+    mode = request.headers.get('X-Profile') or request.GET.get('profile')
+    if not mode:
+        return None
+
+    return 'cprofile' if mode == 'cprofile' else 'timing'
+
+
+def is_staff_request(request):
+    """
+    Profiling is only for staff. The middleware runs before AuthenticationMiddleware and DRF authenticates in
+    the view, so the JWT of the request is checked here.
+    """
+    try:
+        result = CachedJWTAuthentication().authenticate(request)
+    except APIException:
+        return False
+
+    return result is not None and result[0].is_staff
+
+
+def server_timing(timings, total_seconds):
+    entries = []
+    for phase in SERVER_TIMING_PHASES:
+        description = f';desc="{timings.db_queries} queries"' if phase == 'db' else ''
+        entries.append(f'{phase};dur={timings.seconds[phase] * 1000:.1f}{description}')
+
+    entries.append(f'total;dur={total_seconds * 1000:.1f}')
+    return ', '.join(entries)
+
+
+class RequestProfile:
+    """
+    The profile of one request: its time, and with cProfile its profile and SQL queries while the context is open.
+    """
+
+    def __init__(self, mode):
+        self.queries = []
+        self.profiler = cProfile.Profile() if mode == 'cprofile' else None
+        self.stack = ExitStack()
+        self.start = self.total_seconds = None
+
+    def record_query(self, execute, sql, params, many, context):
+        query_start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append({
+                'alias': context['connection'].alias,
+                'sql': sql,
+                'params': repr(params),
+                'duration_ms': round((time.perf_counter() - query_start) * 1000, 3),
+            })
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        if self.profiler is not None:
+            for connection in connections.all():
+                self.stack.enter_context(connection.execute_wrapper(self.record_query))
+            self.profiler.enable()
+            self.stack.callback(self.profiler.disable)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stack.close()
+        self.total_seconds = time.perf_counter() - self.start
+
+    def finish(self, request, response, timings):
+        """
+        Adds the Server-Timing header, and with cProfile stores the profile and adds its X-Profile-Id.
+        """
+        if timings is not None:
+            response['Server-Timing'] = server_timing(timings, self.total_seconds)
+
+        if self.profiler is not None:
+            profile_id = uuid.uuid4().hex
+            self.profiler.create_stats()
+            cache.set(profile_key(profile_id), {
+                'method': request.method,
+                'path': request.get_full_path(),
+                'view': view_name(request),
+                'status': response.status_code,
+                'datetime': timezone.now().isoformat(),
+                'total_ms': round(self.total_seconds * 1000, 3),
+                'phases_ms': {phase: round(timings.seconds[phase] * 1000, 3) for phase in SERVER_TIMING_PHASES}
+                if timings is not None else {},
+                'queries': self.queries,
+                'profile': marshal.dumps(self.profiler.stats),
+            }, timeout=settings.PROFILE_TTL_HOURS * 60 * 60)
+            response['X-Profile-Id'] = profile_id
+
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Profiles the requests of staff that send X-Profile: timing (or ?profile=timing) with a Server-Timing header
+    of the auth, db, serialize and render phases.
+
+    With X-Profile: cprofile the request also runs under cProfile, and the profile and every SQL query with its
+    time are stored for PROFILE_TTL_HOURS. The X-Profile-Id header of the response is the id to download them
+    from /api/profiles/<id>/. cProfile only sees its own thread: under ASGI the code that sync_to_async runs in
+    other threads, like the sync views, is not in the profile, only its queries are.
+
+    Needs config.metrics.MetricsMiddleware before it, which collects the timings of the phases.
+    Sync and async, like MetricsMiddleware.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        mode = requested_profile(request)
+        if mode is None or not is_staff_request(request):
+            return self.get_response(request)
+
+        with RequestProfile(mode) as profile:
+            response = self.get_response(request)
+
+        return profile.finish(request, response, current_timings())
+
+    async def __acall__(self, request):
+        mode = requested_profile(request)
+        # The JWT may load the user and the profile is stored in the cache, both are sync.
+        if mode is None or not await sync_to_async(is_staff_request)(request):
+            return await self.get_response(request)
+
+        with RequestProfile(mode) as profile:
+            response = await self.get_response(request)
+
+        return await sync_to_async(profile.finish)(request, response, current_timings())
+
+
+class StoredProfile:
+    """
+    The stats of a stored profile, in the form pstats.Stats loads from a cProfile.Profile.
+    """
+
+    def __init__(self, data):
+        self.stats = marshal.loads(data)
+
+    def create_stats(self):
+        pass
+
+
+def load_profile(profile_id):
+    profile = cache.get(profile_key(profile_id))
+    if profile is None:
+        return None, Response({'message': f'There is no profile with this id {profile_id}'},
+                              status=status.HTTP_404_NOT_FOUND)
+
+    return profile, None
+
+
+class ProfileDetailAPI(APIView):
+    """
+    The SQL queries and the slowest functions, by cumulative time, of a profiled request.
+    """
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request, profile_id):
+        profile, error = load_profile(profile_id)
+        if error is not None:
+            return error
+
+        stream = io.StringIO()
+        stats = pstats.Stats(StoredProfile(profile['profile']), stream=stream)
+        stats.sort_stats('cumulative').print_stats(settings.PROFILE_TOP_FUNCTIONS)
+
+        data = {key: value for key, value in profile.items() if key != 'profile'}
+        data['top_functions'] = stream.getvalue()
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class ProfileDownloadAPI(APIView):
+    """
+    The cProfile profile of a profiled request, to open with pstats or snakeviz.
+    """
+    permission_classes = (IsAdminUser, )
+
+    def get(self, request, profile_id):
+        profile, error = load_profile(profile_id)
+        if error is not None:
+            return error
+
+        response = HttpResponse(profile['profile'], content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="{profile_id}.prof"'
+        return response
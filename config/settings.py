@@ -63,6 +63,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Records the latency, database and serializer time of each view for /metrics, see config.metrics.
+    'config.metrics.MetricsMiddleware',
+    # Server-Timing header and cProfile of the requests of staff that ask for it, see config.profiling.
+    'config.profiling.ProfilingMiddleware',
     # Default middlewares
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -73,6 +77,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     # Middleware for enhanced security and protection against brute-force login attempts using Django Axes.
     'axes.middleware.AxesMiddleware',
+    # Sends the reads of read-only views to the read replicas, see config.db_router.
+    'config.db_router.ReplicaRoutingMiddleware',
 ]
 
 ROOT_URLCONF = 'config.urls'
@@ -100,17 +106,45 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.postgresql',
+        # django.db.backends.postgresql counting connection churn, with an optional pool, see below
+        'ENGINE': 'config.db_backends.postgresql',
         'NAME': 'postgres',
         'USER': 'postgres',
         'PASSWORD': 'postgres',
         'HOST': 'db',
-        'PORT': 5432
+        'PORT': 5432,
+        # Keep connections open between requests and tasks, and check them before reuse. For WSGI and celery only:
+        # under ASGI the sync code of each request runs in a thread of its own, set DB_CONN_MAX_AGE=0 there.
+        'CONN_MAX_AGE': env.int('DB_CONN_MAX_AGE', default=60),
+        'CONN_HEALTH_CHECKS': True,
         # 'ENGINE': 'django.db.backends.sqlite3',
         # 'NAME': BASE_DIR / 'db.sqlite3',
     }
 }
 
+# config database connection pool, see config.db_backends.postgresql
+# With DB_POOL_SIZE, each web and celery process takes its connections from a pool of at most this many
+# connections, returned at the end of each request or task. Size it to the threads of a process.
+DB_POOL_SIZE = env.int('DB_POOL_SIZE', default=0)
+if DB_POOL_SIZE:
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+    DATABASES['default']['POOL'] = {
+        'SIZE': DB_POOL_SIZE,
+        'TIMEOUT': env.int('DB_POOL_TIMEOUT', default=10),  # Seconds a thread waits for a free connection
+        'CHECK_AFTER_SECONDS': 30,  # Idle connections older than this run a query before reuse
+    }
+
+# config read replicas, see config.db_router
+# Hosts of the read replicas of the default database, e.g. DATABASE_REPLICA_HOSTS=replica1,replica2
+DATABASE_REPLICAS = []
+for number, host in enumerate(env.list('DATABASE_REPLICA_HOSTS', default=[]), start=1):
+    DATABASES[f'replica_{number}'] = {**DATABASES['default'], 'HOST': host}
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['config.db_router.ReplicaRouter']
+# Time the reads of a client stay on the primary after it wrote, longer than the replica lag
+REPLICA_STICKY_SECONDS = 10
+
 # Password validation
 # https://docs.djangoproject.com/en/4.0/ref/settings/#auth-password-validators
 
@@ -158,7 +192,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # config rest django
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
 }
@@ -167,7 +201,21 @@ REST_FRAMEWORK = {
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(days=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=40),
+    "TOKEN_REFRESH_SERIALIZER": "accounts.serializers.RevocableTokenRefreshSerializer",
 }
+# Verified access tokens are kept in each process for a short time, see accounts.authentication.
+JWT_VERIFIED_TOKEN_CACHE_SECONDS = 60
+JWT_VERIFIED_TOKEN_CACHE_SIZE = 10000
+
+# config token revocation, see accounts.revocation
+# 'accounts.revocation.RedisRevocationList' keeps the revoked tokens in Redis and publishes them to the processes.
+TOKEN_REVOCATION_BACKEND = 'accounts.revocation.RedisRevocationList'
+TOKEN_REVOCATION_REDIS_URL = 'redis://redis:6379/1'
+TOKEN_REVOCATION_REDIS_TIMEOUT = 0.5  # Seconds to connect to Redis or wait for a reply, then the check fails open
+TOKEN_REVOCATION_CHANNEL = 'revoked_tokens'
+TOKEN_REVOCATION_BLOOM_CAPACITY = 100000  # Revoked tokens the Bloom filter of a process is sized for
+TOKEN_REVOCATION_BLOOM_ERROR_RATE = 0.001  # False positives, checked in Redis
+TOKEN_REVOCATION_REBUILD_SECONDS = 300  # The filter is built again to drop the expired revocations
 
 # config spectacular
 SPECTACULAR_SETTINGS = {
@@ -182,6 +230,7 @@ SPECTACULAR_SETTINGS = {
 AUTH_USER_MODEL = 'accounts.CustomUser'
 LOGOUT_REDIRECT_URL = 'home'
 
+# Successful logins are counted in the cache, see accounts.throttling.login_lockout.
 MAX_LOGIN = 3
 LOGIN_SUCCESS_CHECK_PERIOD_MINUTE = 20
 BLOCK_TIME_MAX_LOGIN_MINUTE = 60
@@ -208,6 +257,11 @@ AXES_RESET_COOL_OFF_ON_FAILURE_DURING_LOCKOUT = False  # Don't reset cool-off ti
 AXES_PASSWORD_FORM_FIELD = 'code'  # Using 'code' as the password-equivalent field for rate limiting.
 AXES_USERNAME_FORM_FIELD = 'phone_number'  # Name of the form field for the username or identifier.
 AXES_LOCKOUT_CALLABLE = 'accounts.utils.custom_lockout_response'
+# The failures are counted in sliding windows in the cache, by phone number and by IP address. No access
+# attempts are written to the database.
+AXES_HANDLER = 'accounts.throttling.AxesSlidingWindowHandler'
+AXES_LOCKOUT_PARAMETERS = ['username', 'ip_address']
+AXES_USERNAME_CALLABLE = 'accounts.throttling.get_client_phone_number'
 
 # crispy form
 CRISPY_TEMPLATE_PACK = 'bootstrap5'
@@ -221,10 +275,71 @@ MESSAGE_TAGS = {
 MAX_OTP_TRY = 2
 RESET_TIME_OTP_MINUTE = 4
 LIMIT_TIME_MAX_OTP = 1
+# Where the OTP codes and their limits are kept, see accounts.otp.
+# 'accounts.otp.CacheOTP' keeps them in Redis with TTLs, 'accounts.otp.DatabaseOTP' in the CodeVerify rows.
+OTP_BACKEND = 'accounts.otp.CacheOTP'
+
+# config phone numbers
+PHONE_NUMBER_CACHE_SIZE = 10000  # Parsed phone numbers kept by accounts.phone.normalize_phone_number
+
+# config sms, see accounts.sms
+# The class that sends the messages: 'accounts.sms.ConsoleSMSProvider' writes them to the log of the
+# celery worker, 'accounts.sms.FileSMSProvider' appends them to SMS_FILE_PATH.
+SMS_PROVIDER = env('SMS_PROVIDER', default='accounts.sms.ConsoleSMSProvider')
+SMS_FILE_PATH = BASE_DIR / 'sms.log'
+SMS_BATCH_SIZE = 100  # Messages sent at once to providers that support it
 
 # config ads
 FREE_ADS_MONTHLY_QUOTA = 3  # Limit create ads
+FREE_AD_QUOTA_CACHE_SECONDS = 60 * 60  # Maximum time the free ads count of a user stays cached
 MIN_REPORTS_TO_BLOCK_AD = 5  # Minimum reports to block an ad
+BULK_CREATE_ADS_MAX = 50  # Maximum ads in one request to the bulk create API
+
+# config ad views
+AD_VIEW_DEDUP_WINDOW_MINUTE = 30  # Repeat views of an ad by the same viewer within this window count once
+AD_VIEW_FLUSH_BATCH_SIZE = 1000  # Number of ads read from the cache and updated per UPDATE statement
+AD_VIEW_COUNTER_TTL_HOURS = 24  # Time a view counter stays in the cache after the last flush that read it
+# Addresses of the reverse proxies in front of the app. X-Forwarded-For is only read from them.
+TRUSTED_PROXY_IPS = env.list('TRUSTED_PROXY_IPS', default=[])
+
+# config trending ads
+TRENDING_ADS_SIZE = 200  # Number of ads kept in the trending feed of each category
+TRENDING_ADS_PAGE_SIZE = 20
+TRENDING_SIGN_WEIGHT = 5  # A sign counts as this many views
+TRENDING_GRAVITY = 1.5  # How fast the score of an ad decays with its age
+
+# config idempotency keys, see config.idempotency
+IDEMPOTENCY_KEY_TTL_HOURS = 24  # Time a response is replayed for repeats with the same Idempotency-Key
+IDEMPOTENCY_LOCK_SECONDS = 60  # Maximum time a request holds its Idempotency-Key while it runs
+
+# config metrics, see config.metrics
+# Addresses or networks that can read /metrics without logging in, like the Prometheus server. Staff can too.
+METRICS_ALLOWED_IPS = env.list('METRICS_ALLOWED_IPS', default=['127.0.0.1', '::1'])
+
+# config profiling, see config.profiling
+PROFILE_TTL_HOURS = 24  # Time the profile of a request stays available for download
+PROFILE_TOP_FUNCTIONS = 40  # Number of functions listed by the profile API
+
+# Above this number of rows, paginated lists report the row estimate of PostgreSQL
+# instead of running an exact COUNT(*). See config.pagination.estimated_count.
+ESTIMATED_COUNT_THRESHOLD = 10_000
+
+# config moderation
+MODERATION_QUEUE_PAGE_SIZE = 20
+MODERATION_MAX_CLAIM = 20  # Maximum ads a staff member can claim at once
+MODERATION_LEASE_MINUTE = 15  # Time a staff member has to review the claimed ads
+
+# config location search
+GEO_DEFAULT_RADIUS_KM = 10  # Radius of the near search when the client does not send one
+GEO_MAX_RADIUS_KM = 100
+
+# config similar ads
+SIMILAR_ADS_COUNT = 10  # Number of similar ads stored for each ad
+SIMILAR_ADS_CATEGORY_WEIGHT = 0.5  # Weight of shared categories against shared words
+SIMILAR_ADS_PRICE_SIGMA = 0.5  # Spread of the price closeness factor, in natural log of the price ratio
+# Number of ads compared against all others at a time, a chunk holds up to SIMILAR_ADS_CHUNK_SIZE x ads similarities
+SIMILAR_ADS_CHUNK_SIZE = 500
+SIMILAR_ADS_MAX_WORD_FREQUENCY = 0.05  # Words in more than this part of the ads are dropped, like stop words
 
 # price ad token for one
 AD_TOKEN_PRICE = env.int('AD_TOKEN_PRICE')
@@ -245,6 +360,12 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_DEFAULT_QUEUE = 'default'
+# The SMS of login codes have a queue of their own, for a worker that only sends them.
+CELERY_TASK_ROUTES = {
+    'accounts.tasks.send_sms': {'queue': 'sms'},
+    'accounts.tasks.send_sms_bulk': {'queue': 'sms'},
+}
+CELERY_IMPORTS = ['config.metrics']  # Records the duration and rows affected of the tasks
 
 CELERY_BEAT_SCHEDULE = {
     'remove_ads_expired': {
@@ -255,7 +376,49 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'ads.tasks.check_reports_of_ads',
         'schedule': crontab(minute='0', hour='1'),
     },
+    'flush_ad_views': {
+        'task': 'ads.tasks.flush_ad_views',
+        'schedule': crontab(minute='*/5'),
+    },
+    'compute_trending_ads': {
+        'task': 'ads.tasks.compute_trending_ads',
+        'schedule': crontab(minute='*/15'),
+    },
+    'compute_similar_ads': {
+        'task': 'ads.tasks.compute_similar_ads',
+        'schedule': crontab(minute='30', hour='2'),
+    },
 }
 
 # Setting to detect if the app is running tests
 TESTING = len(sys.argv) > 1 and sys.argv[1] == 'test'
+
+# config cache
+# Redis holds short-lived counters and markers shared between the web and celery processes.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://redis:6379/1',
+    }
+}
+
+if TESTING:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+    # A replica simulated by a second alias of the test database. Tests of the replica routing
+    # use it with override_settings(DATABASE_REPLICAS=['replica']).
+    DATABASES['replica'] = {**DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS = []
+
+    # The tests of the login views read the codes from CodeVerify, CacheOTP has tests of its own.
+    OTP_BACKEND = 'accounts.otp.DatabaseOTP'
+
+    # Tasks run in the test process, the SMS are kept in accounts.sms.outbox.
+    CELERY_TASK_ALWAYS_EAGER = True
+    SMS_PROVIDER = 'accounts.sms.LocmemSMSProvider'
+
+    TOKEN_REVOCATION_BACKEND = 'accounts.revocation.LocmemRevocationList'
@@ -21,6 +21,10 @@ from django.views.generic import TemplateView
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
 
+from .db_metrics import DatabaseConnectionsAPI
+from .metrics import metrics_view
+from .profiling import ProfileDetailAPI, ProfileDownloadAPI
+
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -30,4 +34,8 @@ urlpatterns = [
     path('home/', TemplateView.as_view(template_name='home.html'), name='home'),
     path('ads/', include('ads.urls')),
     path('payment/', include('payment.urls')),
+    path('api/db/connections/', DatabaseConnectionsAPI.as_view(), name='db_connections'),
+    path('metrics', metrics_view, name='metrics'),
+    path('api/profiles/<str:profile_id>/', ProfileDetailAPI.as_view(), name='profile_detail'),
+    path('api/profiles/<str:profile_id>/download/', ProfileDownloadAPI.as_view(), name='profile_download'),
 ] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
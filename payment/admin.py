@@ -1,5 +1,7 @@
 from django.contrib import admin, messages
 
+from config.pagination import EstimatedCountPaginator
+
 from .models import Order, PackageAdToken
 from .forms import PackageAdTokenForm, OrderForm
 
@@ -12,6 +14,9 @@ class PackageAdTokenAdmin(admin.ModelAdmin):
     list_filter = ('is_delete', 'confirmation')
     search_fields = ('token_quantity', 'name', 'price')
     form = PackageAdTokenForm
+    # Avoid exact COUNT(*) queries over the whole table on every changelist page.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     # Defines the fields to be displayed and editable in the admin panel.
     # The displayed fields 'is_delete' and 'datetime_deleted' depend on the object's status (is_delete).
@@ -96,6 +101,9 @@ class OrderAdmin(admin.ModelAdmin):
     form = OrderForm
     search_fields = ('transaction', 'phone', 'customer__username')
     list_filter = ('discount', 'completed')
+    # Avoid exact COUNT(*) queries over the whole table on every changelist page.
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
 
     def get_fieldsets(self, request, obj=None):
         if obj:  # Editing an existing order
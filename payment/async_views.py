@@ -0,0 +1,21 @@
+from rest_framework.response import Response
+from rest_framework import status
+
+from config.async_views import AsyncAPIView
+
+from .models import PackageAdToken
+from .serializers import PackageAdTokenSerializer
+
+
+# Async versions of the hot read endpoints of payment.views, served under ASGI. See config.async_views.AsyncAPIView.
+
+
+class AsyncPackageAdTokenListAPI(AsyncAPIView):
+    use_read_replica = True
+
+    async def get(self, request):
+        packages_list = [package async for package in PackageAdToken.active_objs.all()]
+
+        ser = PackageAdTokenSerializer(packages_list, many=True)
+
+        return Response(ser.data, status=status.HTTP_200_OK)
@@ -1,6 +1,6 @@
 import uuid
 
-from django.db import models
+from django.db import models, transaction
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.db.models.functions import Upper
@@ -163,9 +163,26 @@ class Order(models.Model):
         self.save()
 
     def close_order(self):
-        self.set_package()
-        self.customer.ad_token += self.token_quantity
-        self.customer.save()
-        self.datetime_paid = timezone.now()
-        self.completed = True
-        self.save()
+        """
+        Completes the order and adds the tokens of its package to the customer.
+
+        The order is completed with a conditional UPDATE, so a payment callback that runs twice
+        does not add the tokens twice.
+
+        :return: False if the order was already completed.
+        """
+        package = self.package
+        with transaction.atomic():
+            closed = Order.objects.filter(pk=self.pk, completed=False).update(
+                price=package.price,
+                discount=package.discount,
+                discount_price=package.discount_price,
+                token_quantity=package.token_quantity,
+                datetime_paid=timezone.now(),
+                completed=True,
+            )
+            if closed:
+                self.refresh_from_db()
+                self.customer.add_ad_tokens(self.token_quantity, reason='purchase', order=self)
+
+        return bool(closed)
@@ -3,4 +3,4 @@ from rest_framework.permissions import BasePermission
 
 class IsUserOrderOwner(BasePermission):
     def has_object_permission(self, request, view, obj):
-        return obj.customer == request.user
+        return obj.customer_id == request.user.pk
@@ -1,6 +1,6 @@
 from rest_framework import serializers
 
-from phonenumber_field.serializerfields import PhoneNumberField
+from accounts.phone import PhoneNumberField
 
 from .models import PackageAdToken, Order
 
@@ -1,5 +1,6 @@
 from django.urls import reverse
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 
 from rest_framework import status
 from rest_framework.test import APITestCase
@@ -24,6 +25,10 @@ class OrderAPIViewsTest(APITestCase):
             confirmation=False
         )
 
+    def setUp(self):
+        # Idempotency keys are cached, the cache is not rolled back with the database between tests.
+        cache.clear()
+
     # Test for OrderRegistrationAPI
     def test_create_order(self):
         data = {
@@ -50,6 +55,28 @@ class OrderAPIViewsTest(APITestCase):
         self.assertEqual(order_created.created_by, self.user1)
         self.assertEqual(response.data['status'], 'Done')
 
+    # Test for OrderRegistrationAPI
+    def test_create_order_with_idempotency_key(self):
+        data = {
+            'package': self.package1.pk,
+            'first_name': 'John',
+            'last_name': 'Doe',
+            'email': 'johndoe@gmail.com',
+            'phone': '9390125991',
+        }
+
+        self.client.force_authenticate(user=self.user1)
+        response = self.client.post(reverse('payment:order_registration'), data, format='json',
+                                    HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # a retry gets the same order instead of the open order error
+        replay = self.client.post(reverse('payment:order_registration'), data, format='json',
+                                  HTTP_IDEMPOTENCY_KEY='order-1')
+        self.assertEqual(replay.status_code, status.HTTP_200_OK)
+        self.assertEqual(replay.data, response.data)
+        self.assertEqual(Order.objects.count(), 1)
+
     # Test for OrderRegistrationAPI
     def test_create_order_with_invalid_data(self):
         data = {
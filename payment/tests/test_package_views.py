@@ -68,3 +68,9 @@ class PackageAdTokenAPIViewsTest(APITestCase):
         packages_conf_false = PackageAdToken.objects.filter(confirmation=False, is_delete=True)
         serializer = PackageAdTokenSerializer(packages_conf_false, many=True)
         self.assertNotEqual(response.data, serializer.data)
+
+    # Test for AsyncPackageAdTokenListAPI
+    def test_get_active_packages_async(self):
+        response = self.client.get(reverse('payment:async_packages_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data, self.client.get(reverse('payment:packages_list')).data)
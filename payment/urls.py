@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import views, async_views
 
 app_name = 'payment'
 
@@ -12,4 +12,7 @@ urlpatterns = [
     path('order/list/', views.UserOrdersListAPI.as_view(), name='orders_list'),
     path('order/<int:pk>/', views.OrderDetailAPI.as_view(), name='order_detail'),
     path('order/update/<int:pk>/', views.UpdateOrderAPI.as_view(), name='update_order'),
+
+    # async versions for ASGI, see config.async_views
+    path('async/package/list/', async_views.AsyncPackageAdTokenListAPI.as_view(), name='async_packages_list'),
 ]
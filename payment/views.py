@@ -8,6 +8,8 @@ from rest_framework import status
 import requests
 import json
 
+from config.idempotency import idempotent
+
 from .models import PackageAdToken, Order
 from .serializers import PackageAdTokenSerializer, OrderCreateOrUpdateSerializer, OrderReadSerializer
 from .permissions import IsUserOrderOwner
@@ -15,6 +17,8 @@ from .zarinpal import zarin_errors
 
 
 class PackageAdTokenListAPI(APIView):
+    use_read_replica = True
+
     def get(self, request):
         packages_list = PackageAdToken.active_objs.all()
 
@@ -26,6 +30,7 @@ class PackageAdTokenListAPI(APIView):
 class OrderRegistrationAPI(APIView):
     permission_classes = (IsAuthenticated,)
 
+    @idempotent
     def post(self, request):
         try:
             order = Order.objects.get(customer=request.user.pk, completed=False)
@@ -176,7 +181,9 @@ class SandBoxCallPaymentAPI(APIView):
             payment_code = data['Status']
 
             if payment_code == 100:
-                order.close_order()
+                if not order.close_order():
+                    return Response({'message': 'This order was already completed'})
+
                 return Response({'status': 'Done', 'number of ad token bought': order.token_quantity})
 
             return Response({'message': zarin_errors(payment_code)})